@@ -0,0 +1,55 @@
+"""Run scan campaigns without the GUI.
+
+    campaign my_campaign.json
+
+Every event of the campaign is printed as a line of JSON, so the output can be
+followed by other programs. Qt is never imported, so the runner works on
+servers without a display.
+"""
+import argparse
+import json
+import sys
+
+from solar.model.campaign import load_campaign, run_campaign
+
+
+def print_event(event):
+    """Print an event as a line of JSON.
+
+    Args:
+        event (dict): the event
+    """
+    print(json.dumps(event), flush=True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run an unattended scan campaign.")
+    parser.add_argument("campaign", help="JSON file describing the campaign")
+    parser.add_argument(
+        "--archive", help="directory in which the scans are stored, overrides the file"
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=1.0,
+        help="least number of seconds between progress events (default: 1)",
+    )
+    args = parser.parse_args(args)
+
+    try:
+        campaign = load_campaign(args.campaign)
+    except (OSError, ValueError, TypeError) as err:
+        parser.error(f"invalid campaign {args.campaign}: {err}")
+    if args.archive:
+        campaign = campaign._replace(archive=args.archive)
+
+    try:
+        failed = run_campaign(campaign, print_event, args.progress_interval)
+    except KeyboardInterrupt:
+        print_event({"event": "campaign_stopped"})
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
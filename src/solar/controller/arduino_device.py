@@ -1,21 +1,116 @@
 # This is the controller class. We communicate with the device and return to model class.
 
-try:
-    from nsp2visasim import sim_pyvisa as pyvisa
-except ModuleNotFoundError:
-    import pyvisa
+import os
+import time
+
+import numpy as np
+
+from solar.controller.calibration import calibration_for
+from solar.controller.telemetry import default_telemetry
+
+
+def load_visa(simulator=None):
+    """Import the VISA library when it is first needed, it is slow to import.
+
+    The Qt applications call this once in the GUI thread when they start.
+    PySide6 hooks imports, and importing the VISA library for the first time
+    in a worker thread, like that of the DeviceRegistry or the ScanExecutor,
+    can crash the application.
+
+    Real hardware is used unless the simulator is enabled, see the README.
+
+    Args:
+        simulator (bool, optional): use the bundled simulator, which also
+            lists the simulated devices. Defaults to True when the environment
+            variable SOLAR_SIMULATOR is set to 1, like the tests do, and to
+            pyvisa otherwise.
+
+    Returns:
+        module: pyvisa or sim_pyvisa
+    """
+    if simulator is None:
+        simulator = os.environ.get("SOLAR_SIMULATOR") == "1"
+    if simulator:
+        from solar.sims import sim_pyvisa as pyvisa
+    else:
+        import pyvisa
+    return pyvisa
+
+
+# Number of queries written before their responses are read. The serial input
+# buffer of an Arduino holds 64 bytes, which fits six "MEAS:CHx?" commands.
+PIPELINE_DEPTH = 6
+
+# whether the firmware on a port supports MEAS:BLK?. An unknown command can
+# take a full VISA timeout on real boards, so every port is only probed once.
+block_support = {}
+
+
+def _transport_options(transport):
+    # pyvisa sets unknown options as attributes of the resource, so the
+    # transport of the simulator is only passed when it is given
+    return {} if transport is None else {"transport": transport}
 
 
 class ArduinoVISADevice:
     """Control class used to send queries to the arduino."""
 
-    def __init__(self, port):
-        # Connect with device
-        rm = pyvisa.ResourceManager("@py")
-        self.device = rm.open_resource(
-            port, read_termination="\r\n", write_termination="\n"
+    def __init__(
+        self,
+        port,
+        resource_manager=None,
+        telemetry=None,
+        calibration=None,
+        transport=None,
+    ):
+        """Connect with the device.
+
+        Args:
+            port (str): port of the device
+            resource_manager (ResourceManager, optional): ResourceManager used
+                to open the device. Defaults to a new ResourceManager.
+            telemetry (Telemetry, optional): records the query times.
+                Defaults to default_telemetry.
+            calibration (DeviceCalibration, optional): conversion between
+                digital values and voltages. Defaults to the stored
+                calibration of the port.
+            transport (TransportModel, optional): timing and noise of a
+                simulated device, only used with the simulator. Defaults to
+                the default transport of the simulator.
+        """
+        self.telemetry = default_telemetry if telemetry is None else telemetry
+        self.calibration = calibration_for(port) if calibration is None else calibration
+        if resource_manager is None:
+            resource_manager = load_visa().ResourceManager("@py")
+        self.port = port
+        self.device = resource_manager.open_resource(
+            port,
+            read_termination="\r\n",
+            write_termination="\n",
+            **_transport_options(transport),
         )
 
+        # How several input values are measured: "compound" if the firmware
+        # supports the MEAS:BLK? command, otherwise "pipelined" or "query".
+        # "auto" detects the mode on the first measurement.
+        self.measure_mode = "auto"
+
+    def query(self, query):
+        """Send a query to the device and record its duration.
+
+        Args:
+            query (str): the query
+
+        Returns:
+            str: the response of the device
+        """
+        if not self.telemetry.enabled:
+            return self.device.query(query)
+        start = time.perf_counter()
+        response = self.device.query(query)
+        self.telemetry.record_query(time.perf_counter() - start)
+        return response
+
     # Different functions to send queries to device
     def get_indentification(self):
         """Get the port identification of the device.
@@ -23,7 +118,7 @@ class ArduinoVISADevice:
         Returns:
             string: port identification of the device
         """
-        return self.device.query("*IDN?")
+        return self.query("*IDN?")
 
     def set_output_value(self, value):
         """Set the output value of the device on channel 0.
@@ -31,7 +126,7 @@ class ArduinoVISADevice:
         Args:
             value (int): value that is set on channel 0
         """
-        self.device.query(f"OUT:CH0 {value}")
+        self.query(f"OUT:CH0 {value}")
 
     def get_output_value(self):
         """Get the current output value on channel 0.
@@ -39,7 +134,7 @@ class ArduinoVISADevice:
         Returns:
             int: the current output value on channel 0
         """
-        return int(self.device.query(f"OUT:CH0?"))
+        return int(self.query(f"OUT:CH0?"))
 
     def get_input_value(self, channel):
         """Get the input value on the given channel.
@@ -50,7 +145,82 @@ class ArduinoVISADevice:
         Returns:
             int: the current input value on the given channel
         """
-        return int(self.device.query(f"MEAS:CH{channel}?"))
+        return int(self.query(f"MEAS:CH{channel}?"))
+
+    def get_input_values(self, channels, samples=1):
+        """Get several samples of the input values on several channels.
+
+        The values are measured with as few round trips to the device as
+        possible, see measure_mode.
+
+        Args:
+            channels (tuple): the channels for which the input values are called
+            samples (int, optional): number of samples for each channel.
+                Defaults to 1.
+
+        Raises:
+            VisaIOError: when a response did not arrive. In pipelined mode
+                the responses that were not read yet are discarded.
+
+        Returns:
+            np.ndarray: integer array with shape (samples, len(channels))
+        """
+        if self.measure_mode == "auto":
+            self.measure_mode = self._detect_measure_mode()
+
+        if self.measure_mode == "compound":
+            channel_list = ",".join(str(channel) for channel in channels)
+            response = self.query(f"MEAS:BLK? {samples},{channel_list}")
+            values = np.array(response.split(","), dtype=int)
+        elif self.measure_mode == "pipelined":
+            queries = [
+                f"MEAS:CH{channel}?" for _ in range(samples) for channel in channels
+            ]
+            values = np.empty(len(queries), dtype=int)
+            for start in range(0, len(queries), PIPELINE_DEPTH):
+                chunk = queries[start : start + PIPELINE_DEPTH]
+                chunk_start = time.perf_counter()
+                for query in chunk:
+                    self.device.write(query)
+                try:
+                    for i in range(start, start + len(chunk)):
+                        values[i] = int(self.device.read())
+                except (ValueError, load_visa().errors.VisaIOError):
+                    # the unread responses of the chunk would be read as the
+                    # responses of the next queries
+                    self.device.clear()
+                    raise
+                if self.telemetry.enabled:
+                    # the queries of a chunk share their round trip
+                    chunk_time = time.perf_counter() - chunk_start
+                    self.telemetry.record_query(chunk_time / len(chunk), len(chunk))
+        else:
+            values = np.array(
+                [
+                    self.get_input_value(channel)
+                    for _ in range(samples)
+                    for channel in channels
+                ]
+            )
+        return values.reshape(samples, len(channels))
+
+    def _detect_measure_mode(self):
+        """Find out how the firmware can measure several input values.
+
+        Returns:
+            str: "compound", "pipelined" or "query"
+        """
+        if self.port not in block_support:
+            try:
+                int(self.query("MEAS:BLK? 1,1"))
+                block_support[self.port] = True
+            except (TypeError, ValueError, load_visa().errors.VisaIOError):
+                block_support[self.port] = False
+        if block_support[self.port]:
+            return "compound"
+        if all(hasattr(self.device, name) for name in ("write", "read", "clear")):
+            return "pipelined"
+        return "query"
 
     def get_input_voltage(self, channel):
         """Get the input voltage on the given channel.
@@ -61,7 +231,20 @@ class ArduinoVISADevice:
         Returns:
             float: the current input voltage on the given channel
         """
-        return float(self.get_input_value(channel) * (3.3 / 1023))
+        return float(self.calibration.to_voltages(self.get_input_value(channel)))
+
+    def get_input_voltages(self, channels, samples=1):
+        """Get several samples of the input voltages on several channels.
+
+        Args:
+            channels (tuple): the channels for which the input voltages are called
+            samples (int, optional): number of samples for each channel.
+                Defaults to 1.
+
+        Returns:
+            np.ndarray: array with shape (samples, len(channels))
+        """
+        return self.calibration.to_voltages(self.get_input_values(channels, samples))
 
     def analog_to_digital(self, voltage):
         """Convert given voltage to digital integer value.
@@ -72,7 +255,7 @@ class ArduinoVISADevice:
         Returns:
             int: the corresponding digital value
         """
-        return round(voltage / 3.3 * 1023)
+        return int(self.calibration.output_value(voltage))
 
     def digital_to_analog(self, value):
         """Convert given digital integer to analog voltage.
@@ -83,15 +266,16 @@ class ArduinoVISADevice:
         Returns:
             float: the corresponding analog voltage
         """
-        return value / 1023 * 3.3
+        return float(self.calibration.output_voltage(value))
 
     def close_device(self):
+        """Close the connection with the device."""
         self.device.close()
 
 
 # List devices out of class to know which port to use
 def list_devices():
-    rm = pyvisa.ResourceManager("@py")
+    rm = load_visa().ResourceManager("@py")
     return rm.list_resources()
 
 
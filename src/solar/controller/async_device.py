@@ -0,0 +1,271 @@
+"""Asynchronous control of the Arduino devices.
+
+AsyncArduinoDevice has the same commands as ArduinoVISADevice, but they are
+coroutines, so one event loop can drive many devices at the same time.
+Resources that can wait for a response on the event loop, like the simulated
+devices, do not use any threads. Other VISA resources, like real serial ports,
+only have a blocking query. It runs in a thread of the device, so every such
+device adds a thread, but a slow device never delays the others.
+
+DevicePool.acquire_async hands out an AsyncArduinoDevice that shares the open
+resource of the pool, so the port is not opened again for every scan.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from solar.controller.arduino_device import (
+    _transport_options,
+    block_support,
+    load_visa,
+)
+from solar.controller.calibration import calibration_for
+from solar.controller.telemetry import default_telemetry
+
+# Time in seconds after which a query fails
+DEFAULT_TIMEOUT = 5.0
+
+
+def _idle():
+    # submitted to the thread of a device to wait until it is free
+    pass
+
+
+class AsyncArduinoDevice:
+    """Asynchronous control class used to send queries to the arduino."""
+
+    def __init__(
+        self,
+        port,
+        resource_manager=None,
+        timeout=DEFAULT_TIMEOUT,
+        telemetry=None,
+        calibration=None,
+        transport=None,
+        resource=None,
+    ):
+        """Connect with the device.
+
+        Args:
+            port (str): port of the device
+            resource_manager (ResourceManager, optional): ResourceManager used
+                to open the device. Defaults to a new ResourceManager.
+            timeout (float, optional): time in seconds after which a query
+                fails. Defaults to DEFAULT_TIMEOUT.
+            telemetry (Telemetry, optional): records the query times.
+                Defaults to default_telemetry.
+            calibration (DeviceCalibration, optional): conversion between
+                digital values and voltages. Defaults to the stored
+                calibration of the port.
+            transport (TransportModel, optional): timing and noise of a
+                simulated device, only used with the simulator. Defaults to
+                the default transport of the simulator.
+            resource (Resource, optional): the open VISA resource of the port,
+                used instead of opening the port. Defaults to opening it.
+        """
+        self.telemetry = default_telemetry if telemetry is None else telemetry
+        self.calibration = calibration_for(port) if calibration is None else calibration
+        self.port = port
+        self.timeout = timeout
+        if resource is None:
+            if resource_manager is None:
+                resource_manager = load_visa().ResourceManager("@py")
+            resource = resource_manager.open_resource(
+                port,
+                read_termination="\r\n",
+                write_termination="\n",
+                **_transport_options(transport),
+            )
+        self.device = resource
+        # queries of one device are answered in order, so they never overlap
+        self._lock = asyncio.Lock()
+        # runs the blocking queries of resources without query_async
+        self._blocking_io = None
+
+        # "compound" if the firmware supports the MEAS:BLK? command, otherwise
+        # "query". "auto" detects the mode on the first measurement.
+        self.measure_mode = "auto"
+
+    async def query(self, query, timeout=None):
+        """Send a query to the device and wait for the response.
+
+        After a timeout the state of the connection is unknown, the device
+        should be closed. A blocking query keeps the device until the resource
+        returns, the next query waits for it.
+
+        Args:
+            query (str): the query
+            timeout (float, optional): time in seconds after which the query
+                fails. Defaults to the timeout of the device.
+
+        Raises:
+            TimeoutError: when the response did not arrive in time
+
+        Returns:
+            str: the response of the device
+        """
+        async with self._lock:
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self._query(query), self.timeout if timeout is None else timeout
+                )
+            except BaseException:
+                if self._blocking_io is not None:
+                    # the thread of the device is free once the resource
+                    # has returned from the abandoned query
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._blocking_io, _idle
+                    )
+                raise
+            if self.telemetry.enabled:
+                self.telemetry.record_query(time.perf_counter() - start)
+            return response
+
+    def _query(self, query):
+        query_async = getattr(self.device, "query_async", None)
+        if query_async is not None:
+            return query_async(query)
+        if self._blocking_io is None:
+            self._blocking_io = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"visa-io-{self.port}"
+            )
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._blocking_io, self.device.query, query)
+
+    async def get_indentification(self):
+        """Get the port identification of the device.
+
+        Returns:
+            string: port identification of the device
+        """
+        return await self.query("*IDN?")
+
+    async def set_output_value(self, value):
+        """Set the output value of the device on channel 0.
+
+        Args:
+            value (int): value that is set on channel 0
+        """
+        await self.query(f"OUT:CH0 {value}")
+
+    async def get_output_value(self):
+        """Get the current output value on channel 0.
+
+        Returns:
+            int: the current output value on channel 0
+        """
+        return int(await self.query("OUT:CH0?"))
+
+    async def get_input_value(self, channel):
+        """Get the input value on the given channel.
+
+        Args:
+            channel (int): the channel for which the input value is called
+
+        Returns:
+            int: the current input value on the given channel
+        """
+        return int(await self.query(f"MEAS:CH{channel}?"))
+
+    async def get_input_values(self, channels, samples=1):
+        """Get several samples of the input values on several channels.
+
+        Args:
+            channels (tuple): the channels for which the input values are called
+            samples (int, optional): number of samples for each channel.
+                Defaults to 1.
+
+        Returns:
+            np.ndarray: integer array with shape (samples, len(channels))
+        """
+        if self.measure_mode == "auto":
+            self.measure_mode = await self._detect_measure_mode()
+
+        if self.measure_mode == "compound":
+            channel_list = ",".join(str(channel) for channel in channels)
+            response = await self.query(f"MEAS:BLK? {samples},{channel_list}")
+            values = np.array(response.split(","), dtype=int)
+        else:
+            values = np.array(
+                [
+                    await self.get_input_value(channel)
+                    for _ in range(samples)
+                    for channel in channels
+                ]
+            )
+        return values.reshape(samples, len(channels))
+
+    async def _detect_measure_mode(self):
+        """Find out if the firmware can measure several input values at once.
+
+        Returns:
+            str: "compound" or "query"
+        """
+        if self.port not in block_support:
+            try:
+                int(await self.query("MEAS:BLK? 1,1"))
+                block_support[self.port] = True
+            except (TypeError, ValueError, load_visa().errors.VisaIOError):
+                block_support[self.port] = False
+        return "compound" if block_support[self.port] else "query"
+
+    async def get_input_voltage(self, channel):
+        """Get the input voltage on the given channel.
+
+        Args:
+            channel (int): the channel for which the input voltage is called
+
+        Returns:
+            float: the current input voltage on the given channel
+        """
+        return float(self.calibration.to_voltages(await self.get_input_value(channel)))
+
+    async def get_input_voltages(self, channels, samples=1):
+        """Get several samples of the input voltages on several channels.
+
+        Args:
+            channels (tuple): the channels for which the input voltages are called
+            samples (int, optional): number of samples for each channel.
+                Defaults to 1.
+
+        Returns:
+            np.ndarray: array with shape (samples, len(channels))
+        """
+        values = await self.get_input_values(channels, samples)
+        return self.calibration.to_voltages(values)
+
+    def analog_to_digital(self, voltage):
+        """Convert given voltage to digital integer value.
+
+        Args:
+            voltage (float): the given analog voltage
+
+        Returns:
+            int: the corresponding digital value
+        """
+        return int(self.calibration.output_value(voltage))
+
+    def digital_to_analog(self, value):
+        """Convert given digital integer to analog voltage.
+
+        Args:
+            value (int): the given digital value
+
+        Returns:
+            float: the corresponding analog voltage
+        """
+        return float(self.calibration.output_voltage(value))
+
+    def stop_io(self):
+        """Stop the thread of the blocking queries, the resource stays open."""
+        if self._blocking_io is not None:
+            self._blocking_io.shutdown()
+            self._blocking_io = None
+
+    def close_device(self):
+        """Close the connection with the device."""
+        self.stop_io()
+        self.device.close()
@@ -0,0 +1,228 @@
+"""Calibration of the ADC and DAC of the devices.
+
+The conversion between digital values and voltages of every device is described
+by a gain, an offset and an optional integral nonlinearity (INL) table for the
+inputs and the output. The conversions are precomputed into lookup tables with
+an entry for every digital value, so whole sample arrays are converted with a
+single numpy indexing operation.
+
+Calibrations are stored per port in a JSON file, by default
+~/.solar/calibration.json or the file in the environment variable
+SOLAR_CALIBRATION. Devices without a stored calibration use the ideal
+3.3 V / 1023 conversion.
+
+The raw counts of a scan are converted in two steps: value_lut corrects the
+counts of a device to those of an ideal ADC, after which the Calibration of
+the experiment converts them to physical quantities.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Reference voltage and highest digital value of the Arduino ADC and DAC
+ADC_REFERENCE = 3.3
+ADC_MAX = 1023
+
+
+def calibration_file():
+    """Path of the calibration file.
+
+    Returns:
+        Path: the file in SOLAR_CALIBRATION, or ~/.solar/calibration.json
+    """
+    path = os.environ.get("SOLAR_CALIBRATION")
+    if path:
+        return Path(path)
+    return Path.home() / ".solar" / "calibration.json"
+
+
+class DeviceCalibration:
+    """Conversion between digital values and voltages of a device."""
+
+    def __init__(
+        self,
+        input_gain=1.0,
+        input_offset=0.0,
+        input_inl=None,
+        output_gain=1.0,
+        output_offset=0.0,
+        output_inl=None,
+    ):
+        """Build the lookup tables.
+
+        A digital value d corresponds to the voltage
+        (d + inl[d]) * ADC_REFERENCE / ADC_MAX * gain + offset.
+
+        Args:
+            input_gain (float, optional): gain of the ADC. Defaults to 1.0.
+            input_offset (float, optional): offset of the ADC in volts.
+                Defaults to 0.0.
+            input_inl (list, optional): deviation of every ADC value from the
+                straight line in LSB. Defaults to None, no deviation.
+            output_gain (float, optional): gain of the DAC. Defaults to 1.0.
+            output_offset (float, optional): offset of the DAC in volts.
+                Defaults to 0.0.
+            output_inl (list, optional): deviation of every DAC value from the
+                straight line in LSB. Defaults to None, no deviation.
+        """
+        self.input_gain = input_gain
+        self.input_offset = input_offset
+        self.input_inl = None if input_inl is None else list(input_inl)
+        self.output_gain = output_gain
+        self.output_offset = output_offset
+        self.output_inl = None if output_inl is None else list(output_inl)
+
+        # the ADC values corrected for the nonlinearity, gain and offset,
+        # expressed in values of an ideal ADC
+        self.input_values = self._corrected_values(input_gain, input_offset, input_inl)
+        self.input_lut = self.input_values * (ADC_REFERENCE / ADC_MAX)
+        self.input_lut.flags.writeable = False
+        self.output_lut = self._corrected_values(
+            output_gain, output_offset, output_inl
+        ) * (ADC_REFERENCE / ADC_MAX)
+        self.output_lut.flags.writeable = False
+        # output_lut sorted, to find the digital value of a voltage
+        self._output_order = np.argsort(self.output_lut, kind="stable")
+        self._sorted_output = self.output_lut[self._output_order]
+
+    @staticmethod
+    def _corrected_values(gain, offset, inl):
+        values = np.arange(ADC_MAX + 1, dtype=np.float64)
+        if inl is not None:
+            if len(inl) != ADC_MAX + 1:
+                raise ValueError(f"The INL table needs {ADC_MAX + 1} values")
+            values += inl
+        if gain != 1.0 or offset != 0.0:
+            values = values * gain + offset * (ADC_MAX / ADC_REFERENCE)
+        return values
+
+    @property
+    def value_lut(self):
+        """np.ndarray: input_values, None when the ADC is ideal and the counts
+        need no correction"""
+        return None if self.is_ideal else self.input_values
+
+    @property
+    def is_ideal(self):
+        """bool: True when the conversion is the ideal linear conversion"""
+        return (
+            self.input_gain == 1.0
+            and self.input_offset == 0.0
+            and self.input_inl is None
+            and self.output_gain == 1.0
+            and self.output_offset == 0.0
+            and self.output_inl is None
+        )
+
+    def to_voltages(self, values):
+        """Convert ADC values to voltages.
+
+        Args:
+            values (int or np.ndarray): digital input values
+
+        Returns:
+            np.ndarray: the voltages, with the shape of values
+        """
+        return self.input_lut[values]
+
+    def output_voltage(self, value):
+        """Convert a DAC value to its output voltage.
+
+        Args:
+            value (int or np.ndarray): digital output value
+
+        Returns:
+            np.ndarray: the output voltage
+        """
+        return self.output_lut[value]
+
+    def output_value(self, voltage):
+        """Find the DAC value whose output voltage is closest to a voltage.
+
+        Args:
+            voltage (float or np.ndarray): the wanted output voltage
+
+        Returns:
+            np.ndarray: the digital output value
+        """
+        voltage = np.asarray(voltage, dtype=np.float64)
+        right = np.clip(np.searchsorted(self._sorted_output, voltage), 1, ADC_MAX)
+        left = right - 1
+        nearest = np.where(
+            voltage - self._sorted_output[left]
+            <= self._sorted_output[right] - voltage,
+            left,
+            right,
+        )
+        return self._output_order[nearest]
+
+    def to_dict(self):
+        """Describe the calibration for the calibration file.
+
+        Returns:
+            dict: the arguments of DeviceCalibration
+        """
+        return {
+            "input_gain": self.input_gain,
+            "input_offset": self.input_offset,
+            "input_inl": self.input_inl,
+            "output_gain": self.output_gain,
+            "output_offset": self.output_offset,
+            "output_inl": self.output_inl,
+        }
+
+
+IDEAL_CALIBRATION = DeviceCalibration()
+
+
+def load_calibrations(path=None):
+    """Load the calibrations of all devices.
+
+    Args:
+        path (str or Path, optional): the calibration file. Defaults to
+            calibration_file().
+
+    Returns:
+        dict: DeviceCalibration for every port, empty when there is no file
+    """
+    path = calibration_file() if path is None else Path(path)
+    try:
+        with open(path) as file:
+            profiles = json.load(file)
+    except FileNotFoundError:
+        return {}
+    return {port: DeviceCalibration(**profile) for port, profile in profiles.items()}
+
+
+def save_calibrations(calibrations, path=None):
+    """Store the calibrations of all devices.
+
+    Args:
+        calibrations (dict): DeviceCalibration for every port
+        path (str or Path, optional): the calibration file. Defaults to
+            calibration_file().
+    """
+    path = calibration_file() if path is None else Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(
+            {port: calibration.to_dict() for port, calibration in calibrations.items()},
+            file,
+            indent=2,
+        )
+
+
+def calibration_for(port, path=None):
+    """Get the calibration of a device.
+
+    Args:
+        port (str): port of the device
+        path (str or Path, optional): the calibration file. Defaults to
+            calibration_file().
+
+    Returns:
+        DeviceCalibration: the stored calibration, or IDEAL_CALIBRATION
+    """
+    return load_calibrations(path).get(port, IDEAL_CALIBRATION)
@@ -0,0 +1,270 @@
+"""Pool of open devices.
+
+Opening a serial port is slow and resets some Arduino boards. The pool keeps a
+single ResourceManager and the opened devices alive, so they can be reused for
+every query. Each port has its own lock, only one user at a time can send
+queries to a device. The port locks are not reentrant: a thread that holds a
+port and asks for it again gets an error instead of a second handle.
+
+Coroutines get the devices with acquire_async, which waits for the port and
+opens the device without blocking the event loop.
+"""
+import asyncio
+import atexit
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from solar.controller.arduino_device import ArduinoVISADevice, load_visa
+from solar.controller.async_device import AsyncArduinoDevice
+
+
+def _connection_errors():
+    """The errors after which the state of a connection is unknown.
+
+    Returns:
+        tuple: the exception classes
+    """
+    return (OSError, asyncio.TimeoutError, load_visa().errors.Error)
+
+
+class _PortLock:
+    """Lock of a port that records the thread holding it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # thread identifier of the holder, None when the port is free
+        self.owner = None
+        # event loops and callbacks of the coroutines waiting for the port
+        self._waiters = []
+        self._waiters_lock = threading.Lock()
+
+    def acquire(self, blocking=True):
+        """Acquire the lock.
+
+        Args:
+            blocking (bool, optional): wait until the port is free. Defaults
+                to True.
+
+        Raises:
+            RuntimeError: when waiting in the thread that holds the port,
+                which would never return
+
+        Returns:
+            bool: True when the lock is acquired
+        """
+        if blocking and self.owner == threading.get_ident():
+            raise RuntimeError("The port is already in use by this thread")
+        if not self._lock.acquire(blocking):
+            return False
+        self.owner = threading.get_ident()
+        return True
+
+    def release(self):
+        """Release the lock and wake up the waiting coroutines."""
+        self.owner = None
+        self._lock.release()
+        with self._waiters_lock:
+            waiters = list(self._waiters)
+        for loop, callback in waiters:
+            loop.call_soon_threadsafe(callback)
+
+    async def acquire_async(self):
+        """Wait for the lock without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            released = asyncio.Event()
+            waiter = (loop, released.set)
+            with self._waiters_lock:
+                self._waiters.append(waiter)
+            try:
+                # checked after registering, so a release is never missed
+                if self.acquire(blocking=False):
+                    return
+                await released.wait()
+            finally:
+                with self._waiters_lock:
+                    self._waiters.remove(waiter)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class DevicePool:
+    """Hands out open ArduinoVISADevices, one user per port at a time."""
+
+    def __init__(self, transport=None):
+        """Create an empty pool.
+
+        Args:
+            transport (TransportModel, optional): timing and noise of the
+                simulated devices opened by the pool. Defaults to the default
+                transport of the simulator.
+        """
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._resource_manager = None
+        self._devices = {}
+        self._port_locks = {}
+
+    @property
+    def resource_manager(self):
+        """The ResourceManager shared by all devices in the pool."""
+        with self._lock:
+            if self._resource_manager is None:
+                self._resource_manager = load_visa().ResourceManager("@py")
+            return self._resource_manager
+
+    def _port_lock(self, port):
+        with self._lock:
+            return self._port_locks.setdefault(port, _PortLock())
+
+    @contextmanager
+    def acquire(self, port):
+        """Get exclusive access to the device on the given port.
+
+        The device is opened the first time it is requested. If the
+        connection fails while using the device, it is closed and removed from
+        the pool so it is reopened the next time. Other errors keep it open.
+
+        Args:
+            port (str): port of the device
+
+        Raises:
+            RuntimeError: when the calling thread already uses the port
+
+        Yields:
+            ArduinoVISADevice: the open device
+        """
+        with self._port_lock(port):
+            device = self._open(port)
+            try:
+                yield device
+            except _connection_errors():
+                self._discard(port)
+                raise
+
+    @asynccontextmanager
+    async def acquire_async(self, port, timeout=None):
+        """Get exclusive access to the device on the given port in a coroutine.
+
+        Like acquire, but the event loop keeps running while the port is in
+        use and while the device is opened. The device shares the open
+        resource of the pool.
+
+        Args:
+            port (str): port of the device
+            timeout (float, optional): time in seconds after which a query
+                fails. Defaults to the timeout of AsyncArduinoDevice.
+
+        Yields:
+            AsyncArduinoDevice: the open device, only valid inside the block
+        """
+        lock = self._port_lock(port)
+        await lock.acquire_async()
+        # opening a serial port can take seconds
+        opening = asyncio.get_running_loop().run_in_executor(None, self._open, port)
+        try:
+            device = await asyncio.shield(opening)
+        except BaseException:
+            # a cancelled coroutine does not stop the thread, the port is
+            # only released when it is done with the device
+            opening.add_done_callback(lambda _: lock.release())
+            raise
+        try:
+            options = {} if timeout is None else {"timeout": timeout}
+            async_device = AsyncArduinoDevice(
+                port,
+                telemetry=device.telemetry,
+                calibration=device.calibration,
+                resource=device.device,
+                **options,
+            )
+            try:
+                yield async_device
+            except _connection_errors():
+                self._discard(port)
+                raise
+            finally:
+                async_device.stop_io()
+        finally:
+            lock.release()
+
+    def _open(self, port):
+        # the port lock must be held
+        device = self._devices.get(port)
+        if device is None:
+            device = ArduinoVISADevice(
+                port, self.resource_manager, transport=self.transport
+            )
+            self._devices[port] = device
+        return device
+
+    @contextmanager
+    def reserve(self, port):
+        """Keep other users away from a port that is not open in the pool.
+
+        Used to open the port without the pool, for example to identify the
+        device. Nothing waits: a port that is in use is not reserved.
+
+        Args:
+            port (str): the port
+
+        Yields:
+            bool: True when the port is reserved, False when it is in use or
+                open in the pool
+        """
+        lock = self._port_lock(port)
+        if not lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            yield port not in self._devices
+        finally:
+            lock.release()
+
+    def _discard(self, port):
+        device = self._devices.pop(port, None)
+        if device is not None:
+            try:
+                device.close_device()
+            except Exception:
+                # the device is already broken, nothing left to close
+                pass
+
+    def is_open(self, port):
+        """Check if the device on the given port is kept open by the pool.
+
+        Args:
+            port (str): port of the device
+
+        Returns:
+            bool: True when the device is open
+        """
+        return port in self._devices
+
+    def close(self, port):
+        """Close the device on the given port.
+
+        Args:
+            port (str): port of the device
+        """
+        with self._port_lock(port):
+            self._discard(port)
+
+    def close_all(self):
+        """Close all devices and the ResourceManager."""
+        for port in list(self._devices):
+            self.close(port)
+        with self._lock:
+            if self._resource_manager is not None:
+                self._resource_manager.close()
+                self._resource_manager = None
+
+
+# Pool shared by the whole application, closed when Python exits
+default_pool = DevicePool()
+atexit.register(default_pool.close_all)
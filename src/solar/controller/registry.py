@@ -0,0 +1,173 @@
+"""Registry of the connected devices.
+
+Enumerating the VISA resources and asking every device for its identification
+can take seconds on serial ports. The registry does this in a background thread
+and keeps the results for a while, so callers get the last known devices at
+once. Listeners are called with the new device list after every refresh.
+
+Opening a port resets some Arduino boards, so every device is only asked for
+its identification once, when its port first appears.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from solar.controller.pool import default_pool
+
+# Seconds after which the device list is refreshed
+DEFAULT_TTL = 30.0
+# Seconds to wait for the identification of a device
+PROBE_TIMEOUT = 1.0
+# Returned by DeviceRegistry._identify for a port that was in use
+_IN_USE = object()
+
+
+class DeviceInfo(NamedTuple):
+    """A connected device."""
+
+    port: str
+    # response to *IDN?, None when the device did not answer
+    identification: str = None
+
+
+class DeviceRegistry:
+    """Keeps the list of connected devices up to date in the background."""
+
+    def __init__(self, pool=None, ttl=DEFAULT_TTL, probe=True):
+        """Create the registry, the devices are not listed yet.
+
+        Args:
+            pool (DevicePool, optional): pool whose ResourceManager is used and
+                whose open devices are not probed. Defaults to default_pool.
+            ttl (float, optional): seconds after which the device list is
+                refreshed. Defaults to DEFAULT_TTL.
+            probe (bool, optional): ask every device for its identification.
+                Defaults to True.
+        """
+        self.pool = default_pool if pool is None else pool
+        self.ttl = ttl
+        self.probe = probe
+        # called in the background thread with the list of DeviceInfo
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._devices = []
+        # identification of every probed port, None when it did not answer
+        self._identified = {}
+        self._updated = None
+        self._thread = None
+
+    def devices(self):
+        """Get the last known devices, and refresh them when they are too old.
+
+        Returns:
+            list: DeviceInfo of every device, empty before the first refresh
+        """
+        with self._lock:
+            age = None if self._updated is None else time.monotonic() - self._updated
+            devices = list(self._devices)
+        stale = age is None or age > self.ttl
+        if stale:
+            self.refresh()
+        return devices
+
+    def ports(self):
+        """Get the ports of the last known devices.
+
+        Returns:
+            list: the ports
+        """
+        return [device.port for device in self.devices()]
+
+    def refresh(self):
+        """Enumerate the devices in a background thread.
+
+        Nothing happens when a refresh is already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._refresh, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """Wait until a running refresh is done.
+
+        Args:
+            timeout (float, optional): maximum time to wait in seconds.
+                Defaults to wait until the refresh is done.
+
+        Returns:
+            bool: True when no refresh is running anymore
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _refresh(self):
+        try:
+            ports = self.pool.resource_manager.list_resources()
+        except Exception:
+            # no VISA backend or the enumeration failed, try again after ttl
+            with self._lock:
+                self._updated = time.monotonic()
+            return
+        with self._lock:
+            # ports that disappeared are probed again when they come back
+            identified = {
+                port: self._identified[port]
+                for port in ports
+                if port in self._identified
+            }
+        new_ports = [port for port in ports if port not in identified]
+        if self.probe and new_ports:
+            with ThreadPoolExecutor(max_workers=len(new_ports)) as executor:
+                probed = executor.map(self._identify, new_ports)
+                for port, identification in zip(new_ports, probed):
+                    # a port in use is probed in a later refresh
+                    if identification is not _IN_USE:
+                        identified[port] = identification
+        devices = [DeviceInfo(port, identified.get(port)) for port in ports]
+
+        with self._lock:
+            changed = devices != self._devices
+            self._devices = devices
+            self._identified = identified
+            self._updated = time.monotonic()
+        if changed:
+            for listener in self.listeners:
+                listener(devices)
+
+    def _identify(self, port):
+        """Ask the device on a port for its identification.
+
+        The port is reserved in the pool while it is probed, so nothing else
+        opens it at the same time.
+
+        Returns:
+            str: the identification, None when the device did not answer and
+                _IN_USE when the port is in use
+        """
+        with self.pool.reserve(port) as reserved:
+            if not reserved:
+                return _IN_USE
+            try:
+                resource = self.pool.resource_manager.open_resource(
+                    port,
+                    read_termination="\r\n",
+                    write_termination="\n",
+                    timeout=PROBE_TIMEOUT * 1000,
+                )
+                try:
+                    return resource.query("*IDN?")
+                finally:
+                    resource.close()
+            except Exception:
+                # not a device that answers to *IDN?
+                return None
+
+
+# Registry used by the applications
+default_registry = DeviceRegistry()
@@ -0,0 +1,215 @@
+"""Timing telemetry of the acquisition loop.
+
+Records how long device queries take and how the time of every setpoint of a
+scan is spent: waiting for the device, computing results, other Python code and
+waiting for the GIL while other threads (like the GUI) run. Telemetry is
+disabled by default; the hooks then only check the enabled flag. Set the
+environment variable SOLAR_TELEMETRY=1 to enable the default telemetry.
+"""
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+
+# Bin edges of the latency histograms: 1 us to 10 s, four bins per decade
+HISTOGRAM_EDGES = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+
+
+class LatencyHistogram:
+    """Histogram of durations with logarithmic bins."""
+
+    def __init__(self):
+        # the first bin is below the first edge, the last above the last edge
+        self.counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, n=1):
+        """Add n durations of the given length.
+
+        Args:
+            seconds (float): the duration
+            n (int, optional): number of durations. Defaults to 1.
+        """
+        self.counts[bisect_right(HISTOGRAM_EDGES, seconds)] += n
+        self.n += n
+        self.total += seconds * n
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Estimate a percentile from the histogram.
+
+        Args:
+            q (float): percentile between 0 and 100
+
+        Returns:
+            float: upper edge of the bin containing the percentile, in seconds
+        """
+        if self.n == 0:
+            return math.nan
+        rank = q / 100 * self.n
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return HISTOGRAM_EDGES[i] if i < len(HISTOGRAM_EDGES) else self.max
+        return self.max
+
+    def summary(self):
+        """Summarize the histogram.
+
+        Returns:
+            dict: number, mean, median, 99th percentile and maximum in seconds
+        """
+        return {
+            "n": self.n,
+            "mean": self.total / self.n if self.n else math.nan,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class SetpointTimer:
+    """Measures the time of the setpoints of one scan."""
+
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+        self._last_done = None
+
+    def start(self):
+        """Call when the setpoint starts."""
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def io_done(self):
+        """Call when all device I/O of the setpoint is done."""
+        self._io_wall = time.perf_counter()
+        self._io_cpu = time.thread_time()
+
+    def done(self, samples):
+        """Call when the results of the setpoint are stored.
+
+        Args:
+            samples (int): number of samples taken at the setpoint
+        """
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        # the loop between two setpoints counts for the next setpoint
+        previous = self._wall if self._last_done is None else self._last_done
+        self._last_done = wall
+        self.telemetry.record_setpoint(
+            wall=wall - previous,
+            io=self._io_wall - self._wall,
+            processing=wall - self._io_wall,
+            other=self._wall - previous,
+            # time after the I/O in which this thread did not run
+            waiting=max(0.0, (wall - self._io_wall) - (cpu - self._io_cpu)),
+            samples=samples,
+        )
+
+
+class Telemetry:
+    """Collects timing of device queries and scan setpoints."""
+
+    def __init__(self, enabled=False):
+        """Create the telemetry.
+
+        Args:
+            enabled (bool, optional): record timings. Defaults to False.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded timings."""
+        with self._lock:
+            self.queries = LatencyHistogram()
+            self.setpoints = LatencyHistogram()
+            self.io_time = 0.0
+            self.processing_time = 0.0
+            self.other_time = 0.0
+            self.waiting_time = 0.0
+            self.samples = 0
+
+    def record_query(self, seconds, n=1):
+        """Record the duration of device queries.
+
+        Args:
+            seconds (float): duration of a single query
+            n (int, optional): number of queries. Defaults to 1.
+        """
+        with self._lock:
+            self.queries.add(seconds, n)
+
+    def timer(self):
+        """Get a timer for the setpoints of a scan.
+
+        Returns:
+            SetpointTimer: the timer, or None when telemetry is disabled
+        """
+        return SetpointTimer(self) if self.enabled else None
+
+    def record_setpoint(self, wall, io, processing, other, waiting, samples):
+        """Record the timing of a setpoint.
+
+        Args:
+            wall (float): total time of the setpoint in seconds
+            io (float): time spent on device I/O
+            processing (float): time spent computing and storing the results
+            other (float): time spent in the scan loop and by the consumer of
+                the results before the setpoint started
+            waiting (float): part of the processing time in which the thread
+                was waiting, mostly for the GIL
+            samples (int): number of samples taken
+        """
+        with self._lock:
+            self.setpoints.add(wall)
+            self.io_time += io
+            self.processing_time += processing
+            self.other_time += other
+            self.waiting_time += waiting
+            self.samples += samples
+
+    def summary(self):
+        """Summarize all recorded timings.
+
+        Returns:
+            dict: query and setpoint statistics, times in seconds
+        """
+        with self._lock:
+            total = self.setpoints.total
+            return {
+                "queries": self.queries.summary(),
+                "setpoints": self.setpoints.summary(),
+                "samples": self.samples,
+                "samples_per_s": self.samples / total if total else math.nan,
+                "io_time": self.io_time,
+                "processing_time": self.processing_time,
+                "waiting_time": self.waiting_time,
+                "other_time": self.other_time,
+            }
+
+    def status_text(self):
+        """Short summary for a status bar.
+
+        Returns:
+            str: samples per second, median query time and I/O share
+        """
+        summary = self.summary()
+        total = self.setpoints.total
+        if not total:
+            return "no telemetry"
+        return (
+            f"{summary['samples_per_s']:.0f} samples/s, "
+            f"query p50 {summary['queries']['p50'] * 1e3:.2g} ms, "
+            f"I/O {summary['io_time'] / total:.0%}, "
+            f"waiting {summary['waiting_time'] / total:.0%}"
+        )
+
+
+# Telemetry used by devices and experiments unless they get their own
+default_telemetry = Telemetry(enabled=os.environ.get("SOLAR_TELEMETRY") == "1")
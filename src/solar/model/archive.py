@@ -0,0 +1,246 @@
+"""Browsing and loading of stored scans.
+
+An archive is a directory with scan directories written by ScanWriter. The
+metadata of all scans is cached in index.json, so an archive with hundreds of
+scans is listed without opening them. The records of a scan are only
+memory-mapped when its results are used.
+"""
+import datetime
+import json
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+from solar.model.results import ResultViews, ScanResults
+from solar.controller.calibration import DeviceCalibration
+from solar.model.statistics import Calibration, process_raw
+from solar.model.storage import _write_json, file_size, load_scan, read_metadata
+
+INDEX_FILE = "index.json"
+
+
+def port_slug(port):
+    """Turn a port into a name that is safe to use in a path.
+
+    Args:
+        port (string): port of the device
+
+    Returns:
+        str: the port with every run of other characters than letters and
+            digits replaced by a dash
+    """
+    return re.sub(r"[^A-Za-z0-9]+", "-", port).strip("-")
+
+
+class ScanInfo(NamedTuple):
+    """Metadata of a stored scan."""
+
+    # name of the scan directory in the archive
+    name: str
+    port: str
+    created: str
+    start: float
+    stop: float
+    sample_size: int
+    # None when the scan is not complete
+    p_max: float
+    n_setpoints: int
+    complete: bool
+
+
+def _scan_info(name, metadata):
+    return ScanInfo(
+        name=name,
+        port=metadata.get("port"),
+        created=metadata.get("created"),
+        start=metadata.get("start"),
+        stop=metadata.get("stop"),
+        sample_size=metadata.get("sample_size"),
+        p_max=metadata.get("p_max"),
+        n_setpoints=metadata["n_setpoints"],
+        complete=metadata.get("complete", False),
+    )
+
+
+class ArchivedScan(ResultViews):
+    """A stored scan with the result attributes of a SolarExperiment.
+
+    The records are memory-mapped when they are first used, the result
+    attributes are read-only views on the file.
+    """
+
+    def __init__(self, path, info=None):
+        """Create the scan.
+
+        Args:
+            path (str or Path): the scan directory
+            info (ScanInfo, optional): metadata of the scan. Defaults to reading
+                it from the scan directory.
+        """
+        self.path = Path(path)
+        if info is None:
+            info = _scan_info(self.path.name, read_metadata(self.path))
+        self.info = info
+        self._stored = None
+        self._results = None
+
+    @property
+    def stored(self):
+        """StoredScan: the memory-mapped metadata, results and samples"""
+        if self._stored is None:
+            self._stored = load_scan(self.path)
+        return self._stored
+
+    @property
+    def results(self):
+        """ScanResults: the results of the scan, backed by the file"""
+        if self._results is None:
+            self._results = ScanResults.from_records(self.stored.results)
+        return self._results
+
+    @property
+    def p_max(self):
+        """float: maximum power of the scan, None when it is not complete"""
+        return self.info.p_max
+
+    def reprocess(self, calibration=None):
+        """Compute the quantities again from the stored raw counts.
+
+        Args:
+            calibration (Calibration, optional): conversion of the counts.
+                Defaults to the calibration the scan was measured with.
+
+        Returns:
+            dict: array for every name in QUANTITIES
+        """
+        metadata = self.stored.metadata
+        if calibration is None:
+            calibration = Calibration(**metadata["calibration"])
+        value_lut = None
+        if metadata.get("device_calibration"):
+            value_lut = DeviceCalibration(**metadata["device_calibration"]).value_lut
+        samples = self.stored.samples
+        return process_raw(
+            samples["samples"], samples["count"], calibration, value_lut
+        )
+
+    def close(self):
+        """Release the memory-mapped records, they are mapped again when used."""
+        self._stored = None
+        self._results = None
+
+
+class ScanArchive:
+    """A directory with stored scans."""
+
+    def __init__(self, path):
+        """Open the archive, the directory is created when it does not exist.
+
+        Args:
+            path (str or Path): the archive directory
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._index = None
+
+    def new_scan_path(self, port):
+        """Path for a new scan of a device.
+
+        Args:
+            port (string): port of the device
+
+        Returns:
+            Path: scan directory that does not exist yet
+        """
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f"{stamp}_{port_slug(port)}"
+        path = self.path / name
+        number = 1
+        while path.exists():
+            number += 1
+            path = self.path / f"{name}_{number}"
+        return path
+
+    def refresh(self):
+        """Update the index with the scan directories in the archive.
+
+        Only scans whose files changed since the last refresh are opened. A
+        scan whose record files were never created is listed without
+        setpoints and as not complete.
+
+        Returns:
+            list: ScanInfo of all scans, oldest first
+        """
+        cached = self._read_index()
+        index = {}
+        for path in sorted(self.path.iterdir()):
+            if not (path / "meta.json").is_file():
+                continue
+            stamp = [
+                (path / "meta.json").stat().st_mtime_ns,
+                file_size(path / "results.bin"),
+            ]
+            entry = cached.get(path.name)
+            if entry is None or entry["stamp"] != stamp:
+                entry = {
+                    "stamp": stamp,
+                    "info": _scan_info(path.name, read_metadata(path))._asdict(),
+                }
+            index[path.name] = entry
+        if index != cached:
+            _write_json(self.path / INDEX_FILE, index)
+        self._index = {
+            name: ScanInfo(**entry["info"]) for name, entry in index.items()
+        }
+        return self.scans()
+
+    def _read_index(self):
+        try:
+            with open(self.path / INDEX_FILE) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def scans(self, port=None, complete=None):
+        """List the scans in the archive.
+
+        Args:
+            port (string, optional): only scans of this device. Defaults to all.
+            complete (bool, optional): only finished (True) or unfinished
+                (False) scans. Defaults to all.
+
+        Returns:
+            list: ScanInfo of the scans, oldest first
+        """
+        if self._index is None:
+            self.refresh()
+        return sorted(
+            (
+                info
+                for info in self._index.values()
+                if (port is None or info.port == port)
+                and (complete is None or info.complete == complete)
+            ),
+            key=lambda info: (info.created or "", info.name),
+        )
+
+    def open(self, name):
+        """Open a scan of the archive.
+
+        Args:
+            name (str or ScanInfo): name of the scan directory
+
+        Returns:
+            ArchivedScan: the scan, its records are mapped when used
+        """
+        if isinstance(name, ScanInfo):
+            return ArchivedScan(self.path / name.name, name)
+        if self._index is not None and name in self._index:
+            return ArchivedScan(self.path / name, self._index[name])
+        return ArchivedScan(self.path / name)
+
+    def __iter__(self):
+        return iter(self.scans())
+
+    def __len__(self):
+        return len(self.scans())
@@ -0,0 +1,188 @@
+"""Unattended scan campaigns.
+
+A campaign is a JSON file with the scans to run and how often to run them:
+
+    {
+        "archive": "scans",
+        "repetitions": 12,
+        "interval": 3600,
+        "sample_size": 10,
+        "scans": [
+            {"port": "ASRL::SIMPV::INSTR", "start": 0, "stop": 3.3},
+            {"port": "ASRL::SIMLED::INSTR", "start": 0, "stop": 2.0, "sample_size": 5}
+        ]
+    }
+
+Every repetition is a round in which all scans run one after another. Rounds
+start interval seconds apart, or at once when the previous round took longer.
+Scan settings at the top level are the defaults of every scan. The setpoints
+of every scan are stored in the archive while it runs, so nothing is lost when
+a campaign is stopped, and a failed scan does not stop the campaign.
+"""
+import datetime
+import json
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from solar.model.archive import ScanArchive
+from solar.model.solar_experiment import SolarExperiment
+
+
+class CampaignScan(NamedTuple):
+    """Settings of a scan in a campaign, the arguments of SolarExperiment.scan."""
+
+    port: str
+    start: float
+    stop: float
+    sample_size: int
+    target_rel_err: float = None
+    min_samples: int = 2
+
+
+class Campaign(NamedTuple):
+    """Scans that are repeated in rounds."""
+
+    # list of CampaignScan
+    scans: list
+    repetitions: int = 1
+    # seconds between the starts of the rounds
+    interval: float = 0.0
+    # directory in which the scans are stored
+    archive: str = "scans"
+
+
+def load_campaign(path):
+    """Read a campaign file.
+
+    Args:
+        path (str or Path): the JSON campaign file
+
+    Raises:
+        ValueError: when the file does not describe a valid campaign
+
+    Returns:
+        Campaign: the campaign, a relative archive is relative to the file
+    """
+    path = Path(path)
+    settings = json.loads(path.read_text())
+    scan_fields = set(CampaignScan._fields)
+    campaign_fields = set(Campaign._fields) - {"scans"}
+    unknown = set(settings) - scan_fields - campaign_fields - {"scans"}
+    if unknown:
+        raise ValueError(f"Unknown campaign settings: {', '.join(sorted(unknown))}")
+    if not settings.get("scans"):
+        raise ValueError("The campaign has no scans")
+
+    defaults = {key: value for key, value in settings.items() if key in scan_fields}
+    scans = []
+    for number, scan in enumerate(settings["scans"], start=1):
+        scan = {**defaults, **scan}
+        unknown = set(scan) - scan_fields
+        missing = {
+            field
+            for field in scan_fields - set(scan)
+            if field not in CampaignScan._field_defaults
+        }
+        if unknown or missing:
+            raise ValueError(
+                f"Scan {number} has unknown settings {sorted(unknown)} "
+                f"and misses settings {sorted(missing)}"
+            )
+        scans.append(CampaignScan(**scan))
+
+    options = {key: settings[key] for key in campaign_fields if key in settings}
+    campaign = Campaign(scans, **options)
+    if campaign.repetitions < 1 or campaign.interval < 0:
+        raise ValueError("repetitions must be positive and interval not negative")
+    return campaign._replace(archive=str(path.parent / campaign.archive))
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def run_campaign(campaign, report=print, progress_interval=1.0, experiment=None):
+    """Run all rounds of a campaign.
+
+    Progress is reported as events, dicts with an "event" key:
+    "scan_started", "progress" (at most every progress_interval seconds and
+    when a scan is done), "scan_finished", "scan_failed", "waiting" and
+    "campaign_finished". Every event has the time at which it happened.
+
+    Args:
+        campaign (Campaign): the campaign
+        report (callable, optional): called with every event. Defaults to
+            print.
+        progress_interval (float, optional): least number of seconds between
+            progress events of a scan. Defaults to 1.0.
+        experiment (SolarExperiment, optional): performs the scans. Defaults
+            to a new experiment without progress bar.
+
+    Returns:
+        int: number of failed scans
+    """
+    if experiment is None:
+        experiment = SolarExperiment(show_progress=False)
+    archive = ScanArchive(campaign.archive)
+    failed = 0
+    round_start = time.monotonic()
+    for repetition in range(1, campaign.repetitions + 1):
+        if repetition > 1:
+            wait = round_start + campaign.interval - time.monotonic()
+            if wait > 0:
+                report({"event": "waiting", "time": _now(), "seconds": wait})
+                time.sleep(wait)
+            round_start = time.monotonic()
+
+        for number, scan in enumerate(campaign.scans, start=1):
+            path = archive.new_scan_path(scan.port)
+            event = {"repetition": repetition, "scan": number, "port": scan.port}
+            report(
+                {"event": "scan_started", "time": _now(), **event, "path": str(path)}
+            )
+            try:
+                _run_scan(experiment, scan, path, event, report, progress_interval)
+            except Exception as err:
+                failed += 1
+                report(
+                    {"event": "scan_failed", "time": _now(), **event, "error": str(err)}
+                )
+            else:
+                report(
+                    {
+                        "event": "scan_finished",
+                        "time": _now(),
+                        **event,
+                        "setpoints": len(experiment.results),
+                        "p_max": float(experiment.p_max),
+                    }
+                )
+    report({"event": "campaign_finished", "time": _now(), "failed": failed})
+    return failed
+
+
+def _run_scan(experiment, scan, path, event, report, progress_interval):
+    points = experiment.iter_scan(
+        scan.port,
+        scan.start,
+        scan.stop,
+        scan.sample_size,
+        target_rel_err=scan.target_rel_err,
+        min_samples=scan.min_samples,
+        path=path,
+    )
+    last_report = time.monotonic()
+    for done, _ in enumerate(points, start=1):
+        total = experiment.results.capacity
+        if done == total or time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            report(
+                {
+                    "event": "progress",
+                    "time": _now(),
+                    **event,
+                    "done": done,
+                    "total": total,
+                }
+            )
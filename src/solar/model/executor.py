@@ -0,0 +1,130 @@
+"""Execution of scans in a worker thread.
+
+Only one scan of an experiment can run at a time. A running scan can be
+paused, resumed and cancelled; it stops after the setpoint it is measuring.
+Readers take snapshots of the results with ScanResults.snapshot, which never
+returns columns of different lengths, so no locks are needed while plotting.
+"""
+import threading
+
+
+class ScanExecutor:
+    """Runs the scans of an experiment in a worker thread."""
+
+    def __init__(self, experiment):
+        """Create the executor.
+
+        Args:
+            experiment (SolarExperiment): the experiment which performs the scans
+        """
+        self.experiment = experiment
+        # called in the worker thread with the number of finished and total
+        # setpoints and the ScanPoint of every finished setpoint
+        self.progress_callbacks = []
+        # called in the worker thread with the error, or None, after a scan
+        self.finished_callbacks = []
+        # number of finished and total setpoints of the last scan
+        self.progress = (0, 0)
+        # exception that stopped the last scan, None if it didn't fail
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cancelled = threading.Event()
+        # cleared while the scan is paused
+        self._resumed = threading.Event()
+
+    def start(self, port, start, stop, sample_size, **kwargs):
+        """Start a scan in a worker thread.
+
+        Args:
+            port (string): port of the device controlling the experiment
+            start (float): analog voltage at which the experiment starts.
+            stop (float): analog voltage at which the experiment stops.
+            sample_size (int): number of samples to take at each voltage level.
+            **kwargs: other arguments of SolarExperiment.scan
+
+        Raises:
+            RuntimeError: when a scan is already running
+        """
+        with self._lock:
+            if self.is_running():
+                raise RuntimeError("A scan is already running")
+            # already mark as scanning, so readers don't miss the start. This
+            # also refuses the scan while the experiment scans outside the
+            # executor, like with scan_async.
+            self.experiment._begin_scan()
+            self._cancelled.clear()
+            self._resumed.set()
+            self.error = None
+            self.progress = (0, 0)
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(port, start, stop, sample_size),
+                kwargs=kwargs,
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self, port, start, stop, sample_size, **kwargs):
+        # the scan is already marked by start
+        points = self.experiment._iter_scan(port, start, stop, sample_size, **kwargs)
+        try:
+            for done, point in enumerate(points, start=1):
+                self.progress = (done, self.experiment.results.capacity)
+                for callback in self.progress_callbacks:
+                    callback(*self.progress, point)
+                self._resumed.wait()
+                if self._cancelled.is_set():
+                    break
+        except Exception as err:
+            # the device pool already closed the device if its connection failed
+            self.error = err
+        finally:
+            # releases the device
+            points.close()
+            self.experiment.is_scanning.clear()
+            for callback in self.finished_callbacks:
+                callback(self.error)
+
+    def is_running(self):
+        """Check if a scan is running.
+
+        Returns:
+            bool: True while the worker thread is alive
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        """Check if the scan is paused.
+
+        Returns:
+            bool: True when a running scan is paused
+        """
+        return self.is_running() and not self._resumed.is_set()
+
+    def pause(self):
+        """Pause the scan after the current setpoint."""
+        self._resumed.clear()
+
+    def resume(self):
+        """Resume a paused scan."""
+        self._resumed.set()
+
+    def cancel(self):
+        """Stop the scan after the current setpoint."""
+        self._cancelled.set()
+        self._resumed.set()
+
+    def wait(self, timeout=None):
+        """Wait until the scan is finished.
+
+        Args:
+            timeout (float, optional): maximum time to wait in seconds.
+                Defaults to wait until the scan is finished.
+
+        Returns:
+            bool: True when no scan is running anymore
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
@@ -0,0 +1,92 @@
+"""Maximum power point tracking.
+
+Instead of measuring every output value, the power is measured on a coarse grid
+first. The maximum is then refined with a golden-section search in the
+interval around the best coarse point. This only takes a fraction of the
+setpoints of a full scan.
+"""
+from typing import NamedTuple
+
+# 1 / golden ratio
+INV_PHI = (5**0.5 - 1) / 2
+
+
+class MaximumPowerPoint(NamedTuple):
+    """Result of the maximum power point tracking."""
+
+    setting: int
+    voltage: float
+    voltage_err: float
+    current: float
+    current_err: float
+    power: float
+    power_err: float
+    resistance: float
+    resistance_err: float
+
+
+def golden_section_search(f, a, b):
+    """Find the integer maximum of a unimodal function.
+
+    The interior point that remains inside the new interval is reused, so every
+    step of the search measures only one new value.
+
+    Args:
+        f (callable): function of an integer, it is called at most once for
+            each value when it caches its results
+        a (int): lowest value of the interval
+        b (int): highest value of the interval
+
+    Returns:
+        int: the value in [a, b] with the highest f
+    """
+    # interior points c < d and their values, None when not measured yet
+    c = a + round((b - a) * (1 - INV_PHI))
+    d = _mirror(a, b, c)
+    fc = fd = None
+    while b - a > 4:
+        if fc is None:
+            fc = f(c)
+        if fd is None:
+            fd = f(d)
+        if fc >= fd:
+            b = d
+            d, fd = c, fc
+            c, fc = _mirror(a, b, d), None
+        else:
+            a = c
+            c, fc = d, fd
+            d, fd = _mirror(a, b, c), None
+        if c > d:
+            (c, fc), (d, fd) = (d, fd), (c, fc)
+    return max(range(a, b + 1), key=f)
+
+
+def _mirror(a, b, point):
+    # the point on the other side of the middle of [a, b], the golden ratio
+    # of the interval is kept up to rounding
+    mirrored = a + b - point
+    return point - 1 if mirrored == point else mirrored
+
+
+def find_maximum(f, start, stop, coarse_points=20):
+    """Find the integer maximum with a coarse sweep and a golden-section search.
+
+    Args:
+        f (callable): function of an integer
+        start (int): lowest value
+        stop (int): highest value
+        coarse_points (int, optional): number of points in the coarse sweep.
+            Defaults to 20.
+
+    Raises:
+        ValueError: when start exceeds stop
+
+    Returns:
+        int: the value in [start, stop] with the highest f
+    """
+    if start > stop:
+        raise ValueError("start must not exceed stop")
+    step = max(1, (stop - start) // max(1, coarse_points - 1))
+    best = max(range(start, stop + 1, step), key=f)
+    return golden_section_search(f, max(start, best - step), min(stop, best + step))
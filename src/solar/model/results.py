@@ -0,0 +1,231 @@
+"""Result store of the solar experiment.
+
+All results of a scan live in a single preallocated structured numpy array with
+one record per setpoint. Readers get read-only views of the filled part of the
+array, so no data is copied, and a version number that changes whenever the
+results change so they can skip work when nothing happened.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from solar.model.statistics import QUANTITIES
+
+RESULT_DTYPE = np.dtype(
+    [("setting", np.int32)] + [(name, np.float64) for name in QUANTITIES]
+)
+
+
+class ScanPoint(NamedTuple):
+    """Results of a single setpoint, in the order of RESULT_DTYPE."""
+
+    setting: int
+    pv_voltage: float
+    pv_voltage_err: float
+    I_voltage: float
+    I_voltage_err: float
+    fet_voltage: float
+    fet_voltage_err: float
+    current: float
+    current_err: float
+    pv_power: float
+    pv_power_err: float
+    fet_R: float
+    fet_R_err: float
+
+
+class ScanResults:
+    """Columnar store for the results of a scan."""
+
+    def __init__(self, capacity=0):
+        """Allocate the store.
+
+        Args:
+            capacity (int, optional): number of setpoints to reserve room for.
+                Defaults to 0, the store grows when needed.
+        """
+        self.version = 0
+        self.reset(capacity)
+
+    @classmethod
+    def from_records(cls, records):
+        """Wrap existing records without copying them.
+
+        Used for results that are not measured, like a memory-mapped stored
+        scan. The records must not be changed.
+
+        Args:
+            records (np.ndarray): structured array with RESULT_DTYPE
+
+        Returns:
+            ScanResults: store with all records filled
+        """
+        results = cls()
+        results._data = records
+        results.n = len(records)
+        return results
+
+    def reset(self, capacity=0):
+        """Remove all results and reserve room for a new scan.
+
+        Args:
+            capacity (int, optional): number of setpoints to reserve room for.
+                Defaults to 0.
+        """
+        # n is cleared before the buffer is replaced, so a reader that sees
+        # the new buffer never sees a length of the old one
+        self.n = 0
+        self._data = np.zeros(capacity, dtype=RESULT_DTYPE)
+        self.version += 1
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def __len__(self):
+        return self.n
+
+    def append(self, setting, quantities):
+        """Add the results of one setpoint.
+
+        Args:
+            setting (int): the digital output value of the setpoint
+            quantities (dict): value for every name in QUANTITIES
+        """
+        if self.n == self.capacity:
+            # Grow the store, views handed out earlier keep the old buffer
+            data = np.zeros(max(2 * self.capacity, 16), dtype=RESULT_DTYPE)
+            data[: self.n] = self._data[: self.n]
+            self._data = data
+
+        record = self._data[self.n]
+        record["setting"] = setting
+        for name in QUANTITIES:
+            record[name] = quantities[name]
+
+        # only publish the record after it has been completely written
+        self.n += 1
+        self.version += 1
+
+    def extend(self, settings, quantities):
+        """Add the results of several setpoints at once.
+
+        Args:
+            settings (np.ndarray): the digital output values of the setpoints
+            quantities (dict): array with a value for every setpoint for every
+                name in QUANTITIES
+        """
+        n = self.n + len(settings)
+        if n > self.capacity:
+            data = np.zeros(n, dtype=RESULT_DTYPE)
+            data[: self.n] = self._data[: self.n]
+            self._data = data
+
+        records = self._data[self.n : n]
+        records["setting"] = settings
+        for name in QUANTITIES:
+            records[name] = quantities[name]
+
+        self.n = n
+        self.version += 1
+
+    def point(self, index):
+        """Get the results of a single setpoint.
+
+        Args:
+            index (int): index of the setpoint in the store
+
+        Returns:
+            ScanPoint: the results of the setpoint
+        """
+        if not -self.n <= index < self.n:
+            raise IndexError("setpoint index out of range")
+        return ScanPoint(*self._data[index % self.n].tolist())
+
+    def view(self, name, n=None):
+        """Get a read-only view of a column of the filled part of the store.
+
+        Args:
+            name (str): "setting" or one of the names in QUANTITIES
+            n (int, optional): number of records in the view. Defaults to all
+                filled records.
+
+        Returns:
+            np.ndarray: read-only view, no data is copied
+        """
+        if n is None:
+            n = self.n
+        column = self._data[name][:n]
+        column.flags.writeable = False
+        return column
+
+    def records(self, start=0, stop=None):
+        """Get a read-only view of filled records.
+
+        Args:
+            start (int, optional): index of the first record. Defaults to 0.
+            stop (int, optional): index after the last record. Defaults to all
+                filled records.
+
+        Returns:
+            np.ndarray: structured array with RESULT_DTYPE
+        """
+        records = self._data[start : self.n if stop is None else min(stop, self.n)]
+        records.flags.writeable = False
+        return records
+
+    def to_array(self):
+        """Copy the filled records.
+
+        Returns:
+            np.ndarray: structured array with RESULT_DTYPE
+        """
+        return self._data[: self.n].copy()
+
+    def snapshot(self):
+        """Get consistent views of all columns.
+
+        All views have the same length and come from the same buffer, even
+        when a scan is adding results or resetting the store while the
+        snapshot is taken.
+
+        Returns:
+            tuple: the version and a dict with a read-only view for every column
+        """
+        while True:
+            version = self.version
+            # the buffer is read before its length, see reset
+            data = self._data
+            n = self.n
+            # a buffer that grew after it was read is full, a larger n belongs
+            # to the new buffer
+            if version == self.version and n <= len(data):
+                break
+        columns = {}
+        for name in RESULT_DTYPE.names:
+            column = data[name][:n]
+            column.flags.writeable = False
+            columns[name] = column
+        return version, columns
+
+
+def _result_view(name):
+    """Property giving a read-only view of a result column."""
+    return property(lambda self: self.results.view(name))
+
+
+class ResultViews:
+    """Result columns as attributes, for classes with a ScanResults in results."""
+
+    pv_voltages = _result_view("pv_voltages")
+    pv_voltages_err = _result_view("pv_voltages_err")
+    currents = _result_view("currents")
+    currents_err = _result_view("currents_err")
+    fet_voltages = _result_view("fet_voltages")
+    fet_voltages_err = _result_view("fet_voltages_err")
+    pv_powers = _result_view("pv_powers")
+    pv_powers_err = _result_view("pv_powers_err")
+    I_voltages = _result_view("I_voltages")
+    I_voltages_err = _result_view("I_voltages_err")
+    fet_R = _result_view("fet_R")
+    fet_R_err = _result_view("fet_R_err")
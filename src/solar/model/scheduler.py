@@ -0,0 +1,100 @@
+"""Scans on several devices at the same time.
+
+Every port gets its own SolarExperiment and the scans run concurrently, in
+threads or in separate processes. Processes also run the numpy work of the
+scans in parallel, threads share the device pool of the application.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from solar.model.archive import port_slug
+from solar.model.solar_experiment import SolarExperiment
+
+
+class DeviceScan(NamedTuple):
+    """Results of the scan on one device."""
+
+    port: str
+    # structured array with RESULT_DTYPE
+    results: np.ndarray
+    p_max: float
+    # exception that stopped the scan, None if it didn't fail
+    error: Exception = None
+
+
+def scan_device(port, start, stop, sample_size, **kwargs):
+    """Scan a single device.
+
+    This is a module level function so it can run in another process.
+
+    Args:
+        port (string): port of the device controlling the experiment
+        start (float): analog voltage at which the experiment starts.
+        stop (float): analog voltage at which the experiment stops.
+        sample_size (int): number of samples to take at each voltage level.
+        **kwargs: other arguments of SolarExperiment.scan
+
+    Returns:
+        DeviceScan: the results of the scan
+    """
+    experiment = SolarExperiment(show_progress=False)
+    try:
+        experiment.scan(port, start, stop, sample_size, **kwargs)
+    except Exception as err:
+        return DeviceScan(port, experiment.results.to_array(), experiment.p_max, err)
+    return DeviceScan(port, experiment.results.to_array(), experiment.p_max)
+
+
+class MultiDeviceScheduler:
+    """Runs a scan on every given port at the same time."""
+
+    def __init__(self, ports, use_processes=False, max_workers=None):
+        """Create the scheduler.
+
+        Args:
+            ports (list): the ports of the devices
+            use_processes (bool, optional): run every scan in a separate
+                process instead of a thread. Defaults to False.
+            max_workers (int, optional): maximum number of scans running at the
+                same time. Defaults to one for every port.
+        """
+        self.ports = list(ports)
+        self.use_processes = use_processes
+        self.max_workers = max_workers or max(1, len(self.ports))
+
+    def run(self, start, stop, sample_size, **kwargs):
+        """Scan all devices and wait for the results.
+
+        Args:
+            start (float): analog voltage at which the experiments start.
+            stop (float): analog voltage at which the experiments stop.
+            sample_size (int): number of samples to take at each voltage level.
+            **kwargs: other arguments of SolarExperiment.scan. A path is the
+                directory in which every port stores its scan in a
+                subdirectory named after the port.
+
+        Returns:
+            dict: DeviceScan for every port
+        """
+        path = kwargs.pop("path", None)
+        if self.use_processes:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        with executor:
+            futures = {
+                port: executor.submit(
+                    scan_device,
+                    port,
+                    start,
+                    stop,
+                    sample_size,
+                    path=None if path is None else Path(path) / port_slug(port),
+                    **kwargs,
+                )
+                for port in self.ports
+            }
+            return {port: future.result() for port, future in futures.items()}
@@ -12,96 +12,567 @@ measure channel 2 and
     >> subtract the channel 2 from channel 1 to get MOSFET voltage
     >> Use this to the MOSFET resistance or PV power
 """
-from solar.controller.arduino_device import ArduinoVISADevice, list_devices
+from solar.controller.arduino_device import list_devices
+from solar.controller.pool import default_pool
+from solar.controller.telemetry import default_telemetry
+from solar.model.executor import ScanExecutor
+from solar.model.mppt import MaximumPowerPoint, find_maximum
+from solar.model.results import ResultViews, ScanResults
+from solar.model.statistics import (
+    DEFAULT_CALIBRATION,
+    RunningStats,
+    ScanStatistics,
+)
+from solar.model.storage import ScanWriter
 import numpy as np
-from rich.progress import track
 import threading
+from contextlib import contextmanager
 
+# marks the end of the points of an asynchronous scan
+_SCAN_DONE = object()
 
-class SolarExperiment:
-    def __init__(self) -> None:
+
+class SolarExperiment(ResultViews):
+    def __init__(self, pool=None, show_progress=True, telemetry=None) -> None:
+        # open devices are shared through a pool instead of reopened each time
+        self.pool = default_pool if pool is None else pool
+        # show a progress bar in the terminal while scanning
+        self.show_progress = show_progress
+        # records the timing of the scan loop when enabled
+        self.telemetry = default_telemetry if telemetry is None else telemetry
+        # converts the raw counts of new scans to physical quantities
+        self.calibration = DEFAULT_CALIBRATION
+        self.results = ScanResults()
+        self.executor = ScanExecutor(self)
         self.clear()
 
         # create a threading event to keep track of trackin status
         self.is_scanning = threading.Event()
+        # makes checking and setting is_scanning a single step
+        self._scanning_lock = threading.Lock()
 
     def get_connected_devices(self):
         return list_devices()
 
     def get_resistance(self, port):
-        device = ArduinoVISADevice(port)
-        U_tot = device.get_input_voltage(channel=1) * 3
-        U2 = device.get_input_voltage(channel=2)
+        with self.pool.acquire(port) as device:
+            U_tot = device.get_input_voltage(channel=1) * 3
+            U2 = device.get_input_voltage(channel=2)
         U_r = U_tot - U2
 
-    def scan(self, port, start, stop, sample_size) -> None:
+    def scan(
+        self,
+        port,
+        start,
+        stop,
+        sample_size,
+        target_rel_err=None,
+        min_samples=2,
+        path=None,
+    ) -> None:
+        """Measure the results at every output value between start and stop.
+
+        Args:
+            port (string): port of the device controlling the experiment
+            start (float): analog voltage at which the experiment starts.
+            stop (float): analog voltage at which the experiment stops.
+            sample_size (int): number of samples to take at each voltage level,
+                the maximum number of samples when target_rel_err is given.
+            target_rel_err (float, optional): stop sampling a voltage level as
+                soon as the relative standard error of both measured voltages
+                is below this target. Defaults to always take sample_size
+                samples.
+            min_samples (int, optional): least number of samples when
+                target_rel_err is given. Defaults to 2.
+            path (str or Path, optional): directory in which every setpoint,
+                including its raw samples, is stored as soon as it is done.
+                Defaults to not storing the scan.
+
+        Raises:
+            RuntimeError: when a scan of the experiment is already running
+            ValueError: when target_rel_err is not positive or min_samples is
+                less than 1
+        """
+        points = self.iter_scan(
+            port,
+            start,
+            stop,
+            sample_size,
+            target_rel_err=target_rel_err,
+            min_samples=min_samples,
+            path=path,
+        )
+        for _ in points:
+            pass
+
+    def iter_scan(self, port, start, stop, sample_size, **kwargs):
+        """Scan and yield the results of every setpoint as soon as it is done.
+
+        The scan only continues when the next point is requested, so a slow
+        consumer is never flooded with results. The arguments are the same as
+        for scan.
+
+        Raises:
+            RuntimeError: when a scan of the experiment is already running
+
+        Yields:
+            ScanPoint: the results of the setpoint
+        """
+        self._begin_scan()
+        try:
+            yield from self._iter_scan(port, start, stop, sample_size, **kwargs)
+        finally:
+            self.is_scanning.clear()
+
+    def _iter_scan(self, port, start, stop, sample_size, **kwargs):
+        """Like iter_scan, for a scan that is already marked with _begin_scan."""
         # connect to controller and convert inputs
-        self.device = ArduinoVISADevice(port)
-        start = self.device.analog_to_digital(start)
-        stop = self.device.analog_to_digital(stop)
+        with self.pool.acquire(port) as self.device:
+            yield from self._scan(start, stop, sample_size, **kwargs)
 
-        # Update scanning Event
-        self.is_scanning.set()
+    def _begin_scan(self):
+        """Mark the experiment as scanning, only one scan can run at a time.
+
+        Every scan must clear is_scanning when it ends.
+
+        Raises:
+            RuntimeError: when a scan of the experiment is already running
+        """
+        with self._scanning_lock:
+            if self.is_scanning.is_set():
+                raise RuntimeError("A scan is already running")
+            self.is_scanning.set()
+
+    async def ascan(self, port, start, stop, sample_size, buffer=16, **kwargs):
+        """Scan in a worker thread and yield the results of every setpoint.
+
+        At most buffer points are measured ahead of the consumer, after that
+        the scan waits until the consumer catches up. The other arguments are
+        the same as for scan.
+
+        Yields:
+            ScanPoint: the results of the setpoint
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=buffer)
+        stopped = threading.Event()
+
+        def produce():
+            points = self.iter_scan(port, start, stop, sample_size, **kwargs)
+            try:
+                for point in points:
+                    if stopped.is_set():
+                        return
+                    # blocks while the queue is full
+                    asyncio.run_coroutine_threadsafe(queue.put(point), loop).result()
+            except Exception as err:
+                item = err
+            else:
+                item = _SCAN_DONE
+            finally:
+                points.close()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while (item := await queue.get()) is not _SCAN_DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # stop the scan and make room in the queue so the worker can finish
+            stopped.set()
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({producer}, timeout=0.01)
+
+    async def scan_async(
+        self,
+        port,
+        start,
+        stop,
+        sample_size,
+        target_rel_err=None,
+        min_samples=2,
+        device=None,
+        path=None,
+    ):
+        """Scan on the event loop with an asynchronous device.
+
+        Many experiments can scan at the same time in one event loop, for
+        example with asyncio.gather. The results are stored like those of
+        scan. Only the queries are recorded by the telemetry, setpoints are
+        not timed because the timings of concurrent scans would include each
+        other.
+
+        Args:
+            port (string): port of the device controlling the experiment
+            start (float): analog voltage at which the experiment starts.
+            stop (float): analog voltage at which the experiment stops.
+            sample_size (int): number of samples to take at each voltage level,
+                the maximum number of samples when target_rel_err is given.
+            target_rel_err (float, optional): stop sampling a voltage level as
+                soon as the relative standard error of both measured voltages
+                is below this target. Defaults to always take sample_size
+                samples.
+            min_samples (int, optional): least number of samples when
+                target_rel_err is given. Defaults to 2.
+            device (AsyncArduinoDevice, optional): the device to use, it is not
+                closed after the scan. Defaults to the device of the port in
+                the pool, which is kept from other users while scanning.
+            path (str or Path, optional): directory in which the scan is stored
+                while it runs. Defaults to None, the scan is not stored.
+
+        Raises:
+            RuntimeError: when a scan of the experiment is already running
+            ValueError: when target_rel_err is not positive or min_samples is
+                less than 1
+        """
+        # already mark as scanning while waiting for the device
+        self._begin_scan()
+        settings = (start, stop, sample_size, target_rel_err, min_samples, path)
+        try:
+            if device is None:
+                async with self.pool.acquire_async(port) as device:
+                    await self._scan_async(device, *settings)
+            else:
+                await self._scan_async(device, *settings)
+        finally:
+            self.is_scanning.clear()
+
+    async def _scan_async(
+        self, device, start, stop, sample_size, target_rel_err, min_samples, path
+    ):
+        settings, writer = self._prepare_scan(
+            device, start, stop, sample_size, target_rel_err, min_samples, path
+        )
+        with self._storing(writer):
+            for row, value in enumerate(settings):
+                await device.set_output_value(value)
+                samples = self.statistics.raw[row]
+                if target_rel_err is None:
+                    samples[:] = await device.get_input_values((1, 2), sample_size)
+                else:
+                    n = 0
+                    for block in _sample_blocks(samples, target_rel_err, min_samples):
+                        block[:] = await device.get_input_values((1, 2), len(block))
+                        n += len(block)
+                    self.statistics.counts[row] = n
+                self._add_result(value, self.statistics.add_row(row))
+                if writer:
+                    writer.append(
+                        self.results.records(row, row + 1),
+                        samples,
+                        self.statistics.counts[row],
+                    )
+
+    def _scan(
+        self, start, stop, sample_size, target_rel_err=None, min_samples=2, path=None
+    ):
+        settings, writer = self._prepare_scan(
+            self.device, start, stop, sample_size, target_rel_err, min_samples, path
+        )
 
-        # Clear old results
-        self.clear()
-        
         # scan over the requested range
-        for value in track(range(start, stop + 1)):
-            self.device.set_output_value(value)
-            pv_volt = []
-            I_volt = []
-            fet_voltage = []
-            current = []
-            pv_power = []
-            for _ in range(sample_size):
-                # Remember to multiply with three for the total voltage
-                pv_volt.append(self.device.get_input_voltage(channel=1) * 3)
-                I_volt.append(self.device.get_input_voltage(channel=2))
-
-            # Add results
-            self.pv_voltages.append(np.mean(pv_volt))
-            self.pv_voltages_err.append(np.std(pv_volt) / np.sqrt(sample_size))
-
-            self.I_voltages.append(np.mean(I_volt))
-            self.I_voltages_err.append(np.std(I_volt) / np.sqrt(sample_size))
-
-            self.fet_voltages.append(np.mean(pv_volt) - np.mean(I_volt))
-            self.fet_voltages_err.append(
-                (
-                    (np.std(pv_volt) / np.sqrt(sample_size)) ** 2
-                    + (np.std(I_volt) / np.sqrt(sample_size)) ** 2
-                )**0.5
+        if self.show_progress:
+            # rich is slow to import and only needed in the terminal
+            from rich.progress import track
+
+            settings = track(settings)
+        timer = self.telemetry.timer()
+        with self._storing(writer):
+            for row, value in enumerate(settings):
+                if timer:
+                    timer.start()
+                samples = self.statistics.raw[row]
+                if target_rel_err is None:
+                    self._measure_setpoint(value, samples)
+                else:
+                    self.statistics.counts[row] = self._measure_adaptive(
+                        value, samples, target_rel_err, min_samples
+                    )
+                if timer:
+                    timer.io_done()
+                self._add_result(value, self.statistics.add_row(row))
+                if writer:
+                    writer.append(
+                        self.results.records(row, row + 1),
+                        samples,
+                        self.statistics.counts[row],
+                    )
+                if timer:
+                    timer.done(self.statistics.counts[row])
+                yield self.results.point(row)
+
+    def _prepare_scan(
+        self, device, start, stop, sample_size, target_rel_err, min_samples, path
+    ):
+        """Make room for the results of a new scan and start storing it.
+
+        Args:
+            device (ArduinoVISADevice or AsyncArduinoDevice): the open device
+            start (float): analog voltage at which the scan starts.
+            stop (float): analog voltage at which the scan stops.
+            sample_size (int): the maximum number of samples of a setpoint
+            target_rel_err (float): the target of adaptive sampling, None
+                when every setpoint has sample_size samples
+            min_samples (int): least number of samples of adaptive sampling
+            path (str or Path): directory in which the scan is stored, None
+                when it is not stored
+
+        Raises:
+            ValueError: when target_rel_err is not positive or min_samples is
+                less than 1
+
+        Returns:
+            tuple: the digital output values of the setpoints, empty when start
+                exceeds stop, and the ScanWriter, None when path is None
+        """
+        if target_rel_err is not None and target_rel_err <= 0:
+            raise ValueError("target_rel_err must be positive")
+        if min_samples < 1:
+            raise ValueError("min_samples must be at least 1")
+        settings = range(
+            device.analog_to_digital(start), device.analog_to_digital(stop) + 1
+        )
+
+        # Clear old results and make room for the new ones
+        self.clear()
+        self.results.reset(len(settings))
+
+        # collect the raw counts of the scan in one preallocated array, the
+        # counts of a calibrated device are corrected while processing
+        device_calibration = device.calibration
+        self.statistics = ScanStatistics(
+            len(settings),
+            sample_size,
+            self.calibration,
+            device_calibration.value_lut,
+        )
+
+        # store the setpoints while scanning
+        writer = None
+        if path is not None:
+            writer = ScanWriter(
+                path,
+                sample_size,
+                {
+                    "port": device.port,
+                    "start": start,
+                    "stop": stop,
+                    "target_rel_err": target_rel_err,
+                    "calibration": self.calibration._asdict(),
+                    "device_calibration": device_calibration.to_dict(),
+                },
             )
+        return settings, writer
 
-            self.currents.append(np.mean(I_volt) / 4.7)
-            self.currents_err.append((np.std(I_volt) / np.sqrt(sample_size)) / 4.7)
+    @contextmanager
+    def _storing(self, writer):
+        """Finish the stored scan when the block ends, also when it fails.
 
-            self.pv_powers.append(self.pv_voltages[-1] * self.currents[-1])
-            self.pv_powers_err.append(((self.currents[-1]*self.pv_voltages_err[-1])**2+(self.pv_voltages[-1]*self.currents_err[-1])**2)**0.5)
-            if self.pv_powers[-1] > self.p_max:
-                self.p_max = self.pv_powers[-1]
-            self.fet_R.append(self.fet_voltages[-1] / (self.currents[-1]))
-            self.fet_R_err.append(((self.fet_voltages_err[-1]/(self.currents[-1]))**2+(self.fet_voltages[-1] * np.log(self.currents[-1]+0.000001) * self.currents_err[-1])**2)**0.5)
+        Args:
+            writer (ScanWriter): the writer of the scan, None when the scan is
+                not stored
+        """
+        try:
+            yield
+        except BaseException as err:
+            if writer:
+                self._close_writer(writer, err)
+            raise
+        else:
+            if writer:
+                self._close_writer(writer)
 
-            # self.pv_powers.append(pv_power)
+    def _close_writer(self, writer, error=None):
+        """Finish the stored scan.
 
-        self.device.close_device()
-        self.is_scanning.clear()
+        Args:
+            writer (ScanWriter): the writer of the scan
+            error (BaseException, optional): the exception that stopped the
+                scan. GeneratorExit means the scan was cancelled. Defaults to
+                None, the scan finished.
+        """
+        # a scan that is cancelled after its last setpoint is still complete
+        if error is None or (
+            isinstance(error, GeneratorExit) and writer.n == self.results.capacity
+        ):
+            writer.close(p_max=self.p_max)
+        # the maximum of an unfinished scan is not known
+        elif isinstance(error, GeneratorExit):
+            writer.close(complete=False, p_max=None, error="cancelled")
+        else:
+            writer.close(complete=False, p_max=None, error=str(error))
+
+    def _measure_setpoint(self, value, samples):
+        """Set the output value and measure the samples.
+
+        Args:
+            value (int): digital output value
+            samples (np.ndarray): array with shape (sample_size, 2) in which the
+                raw counts of the PV voltage and the resistor voltage are stored
+        """
+        self.device.set_output_value(value)
+        samples[:] = self.device.get_input_values((1, 2), len(samples))
+
+    def _measure_adaptive(self, value, samples, target_rel_err, min_samples):
+        """Set the output value and measure until the results are precise enough.
+
+        Args:
+            value (int): digital output value
+            samples (np.ndarray): array with shape (max_samples, 2) in which the
+                raw counts of the PV voltage and the resistor voltage are stored
+            target_rel_err (float): relative standard error at which sampling
+                stops
+            min_samples (int): least number of samples
+
+        Returns:
+            int: number of samples taken
+        """
+        self.device.set_output_value(value)
+        n = 0
+        for block in _sample_blocks(samples, target_rel_err, min_samples):
+            block[:] = self.device.get_input_values((1, 2), len(block))
+            n += len(block)
+        return n
+
+    def _add_result(self, value, quantities):
+        """Add the results of a setpoint and keep track of the maximum power.
+
+        Args:
+            value (int): digital output value
+            quantities (dict): the results of the setpoint
+        """
+        self.results.append(value, quantities)
+        if quantities["pv_powers"] > self.p_max:
+            self.p_max = quantities["pv_powers"]
+
+    def track_mpp(self, port, start, stop, sample_size, coarse_points=20):
+        """Find the maximum power point without scanning the complete range.
+
+        The power is measured on a coarse grid, after which the maximum is
+        refined with a golden-section search. All measured setpoints are added
+        to the results.
+
+        Args:
+            port (string): port of the device controlling the experiment
+            start (float): analog voltage at which the search starts.
+            stop (float): analog voltage at which the search stops.
+            sample_size (int): number of samples to take at each voltage level.
+            coarse_points (int, optional): number of setpoints in the coarse
+                sweep. Defaults to 20.
+
+        Raises:
+            RuntimeError: when a scan of the experiment is already running
+            ValueError: when start exceeds stop
+
+        Returns:
+            MaximumPowerPoint: the results at the maximum power point
+        """
+        if start > stop:
+            raise ValueError("start must not exceed stop")
+        self._begin_scan()
+        try:
+            measured, setting = self._track_mpp(
+                port, start, stop, sample_size, coarse_points
+            )
+        finally:
+            self.is_scanning.clear()
+
+        quantities = measured[setting]
+        return MaximumPowerPoint(
+            setting,
+            quantities["pv_voltages"],
+            quantities["pv_voltages_err"],
+            quantities["currents"],
+            quantities["currents_err"],
+            quantities["pv_powers"],
+            quantities["pv_powers_err"],
+            quantities["fet_R"],
+            quantities["fet_R_err"],
+        )
+
+    def _track_mpp(self, port, start, stop, sample_size, coarse_points):
+        """Measure the setpoints of track_mpp on a marked experiment.
+
+        Returns:
+            tuple: the results of every measured setpoint by its digital output
+                value, and the digital output value of the maximum
+        """
+        with self.pool.acquire(port) as self.device:
+            start = self.device.analog_to_digital(start)
+            stop = self.device.analog_to_digital(stop)
+            self.clear()
+
+            # the raw counts are kept in the order of the results, so they
+            # can be recalibrated like those of a scan. At most every setpoint
+            # in the range is measured.
+            self.statistics = ScanStatistics(
+                stop - start + 1,
+                sample_size,
+                self.calibration,
+                self.device.calibration.value_lut,
+            )
+            measured = {}
+
+            def power(value):
+                # every setpoint is measured only once
+                if value not in measured:
+                    row = len(measured)
+                    self._measure_setpoint(value, self.statistics.raw[row])
+                    measured[value] = self.statistics.add_row(row)
+                    self._add_result(value, measured[value])
+                return measured[value]["pv_powers"]
+
+            return measured, find_maximum(power, start, stop, coarse_points)
+
+    def recalibrate(self, calibration):
+        """Recompute the results of the last scan with another calibration.
+
+        The raw counts are kept, so nothing is measured again. This also
+        works for the setpoints measured by track_mpp. New scans also use the
+        calibration.
 
-    def start_scan(self, port, start, stop, N):
+        Args:
+            calibration (Calibration): the new conversion of the counts
+
+        Raises:
+            RuntimeError: when a scan is running
+        """
+        if self.is_scanning.is_set():
+            raise RuntimeError("Cannot recalibrate while scanning")
+        self.calibration = calibration
+        if self.statistics is None:
+            # nothing was measured yet
+            return
+        settings = self.results.view("setting").copy()
+        quantities = self.statistics.compute(len(settings), calibration)
+        self.statistics.calibration = calibration
+        self.results.reset(len(settings))
+        self.results.extend(settings, quantities)
+        # like _add_result, NaN powers are ignored
+        self.p_max = float(np.fmax.reduce(quantities["pv_powers"], initial=0))
+
+    def start_scan(self, port, start, stop, N, **kwargs):
         """Function that runs the scan method as a seperate thread
 
+        Use self.executor to follow, pause or cancel the scan.
+
         Args:
             port (string): port of the device controlling the experiment
             start (float, optional): analog voltage at which the experiment starts.
             stop (float, optional): analog voltage at which the experiment stops.
             N (int, optional): number of samples to take at each volatage level.
+            **kwargs: other arguments of scan, like target_rel_err and path
+
+        Raises:
+            RuntimeError: when a scan is already running
         """
-        self._scan_thread = threading.Thread(
-            target=self.scan, args=(port, start, stop, N)
-        )
-        self._scan_thread.start()
+        self.executor.start(port, start, stop, N, **kwargs)
 
     def get_identification(self, port):
         """Get the identification of the device.
@@ -109,25 +580,45 @@ class SolarExperiment:
         Returns:
             string: the identification string
         """
-        device = ArduinoVISADevice(port)
-        return device.get_indentification()
+        with self.pool.acquire(port) as device:
+            return device.get_indentification()
 
     def close(self, port):
         """Close device"""
-        device = ArduinoVISADevice(port)
-        device.close_device()
+        self.pool.close(port)
 
     def clear(self):
-        self.pv_voltages = []
-        self.pv_voltages_err = []
-        self.currents = []
-        self.currents_err = []
-        self.fet_voltages = []
-        self.fet_voltages_err = []
-        self.pv_powers = []
-        self.pv_powers_err = []
-        self.I_voltages = []
-        self.I_voltages_err = []
-        self.fet_R = []
-        self.fet_R_err = []
-        self.p_max = 0
\ No newline at end of file
+        self.results.reset()
+        self.statistics = None
+        self.p_max = 0
+
+
+def _sample_blocks(samples, target_rel_err, min_samples):
+    """Yield the blocks of samples to measure until the results are precise enough.
+
+    Every block must be filled with samples before the next block is
+    requested.
+
+    Args:
+        samples (np.ndarray): array with shape (max_samples, 2) for the raw
+            counts of the PV voltage and the resistor voltage
+        target_rel_err (float): relative standard error at which sampling
+            stops
+        min_samples (int): least number of samples
+
+    Yields:
+        np.ndarray: the next block of samples, a view on samples
+    """
+    running = RunningStats()
+    n = 0
+    block_size = min(min_samples, len(samples))
+    while n < len(samples):
+        block = samples[n : n + block_size]
+        yield block
+        # the relative error of the counts equals that of the voltages
+        running.update(block)
+        n += len(block)
+        if running.converged(target_rel_err):
+            return
+        # after the first samples check convergence after every sample
+        block_size = 1
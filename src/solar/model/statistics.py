@@ -0,0 +1,303 @@
+"""Vectorized statistics for the solar experiment.
+
+The raw ADC counts of a scan are collected in one preallocated uint16 array
+with shape (n_setpoints, sample_size, 2). The last axis holds the counts of the
+PV voltage (channel 1, behind the 3:1 divider) and of the voltage over the
+4.7 ohm resistor (channel 2). A Calibration converts the counts to physical
+quantities; all derived quantities and their errors are computed with numpy
+over whole rows at once, so a scan can be reprocessed with another
+calibration without measuring it again.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from solar.controller.calibration import ADC_MAX, ADC_REFERENCE
+
+# Resistor used to measure the current through the PV cell
+SHUNT_RESISTANCE = 4.7
+# The PV voltage is measured behind a 3:1 voltage divider
+DIVIDER_RATIO = 3.0
+# Variance in counts^2 of the rounding of the ADC, a uniform error of 1 LSB
+QUANTIZATION_VARIANCE = 1 / 12
+
+# Names of the derived quantities, these match the result attributes of
+# SolarExperiment
+QUANTITIES = (
+    "pv_voltages",
+    "pv_voltages_err",
+    "I_voltages",
+    "I_voltages_err",
+    "fet_voltages",
+    "fet_voltages_err",
+    "currents",
+    "currents_err",
+    "pv_powers",
+    "pv_powers_err",
+    "fet_R",
+    "fet_R_err",
+)
+
+
+class Calibration(NamedTuple):
+    """Constants to convert raw ADC counts to physical quantities.
+
+    The counts are those of an ideal ADC, the corrections of a device are
+    applied before with the value_lut of its DeviceCalibration.
+    """
+
+    adc_reference: float = ADC_REFERENCE
+    adc_max: int = ADC_MAX
+    divider_ratio: float = DIVIDER_RATIO
+    shunt_resistance: float = SHUNT_RESISTANCE
+
+    @property
+    def scale(self):
+        """np.ndarray: volts per count of the PV and the resistor channel"""
+        volts_per_count = self.adc_reference / self.adc_max
+        return np.array([volts_per_count * self.divider_ratio, volts_per_count])
+
+    def to_voltages(self, raw):
+        """Convert raw counts to voltages.
+
+        Args:
+            raw (np.ndarray): counts with shape (..., 2)
+
+        Returns:
+            np.ndarray: the PV voltage and the resistor voltage, shape (..., 2)
+        """
+        return raw * self.scale
+
+
+DEFAULT_CALIBRATION = Calibration()
+
+
+def sample_means(samples, counts=None):
+    """Compute the means of the samples and their standard errors.
+
+    Args:
+        samples (np.ndarray): array with shape (..., sample_size, 2)
+        counts (np.ndarray, optional): number of valid samples for each
+            setpoint, with shape (...). Defaults to all samples are valid.
+
+    Returns:
+        tuple: means and standard errors, both with shape (..., 2)
+    """
+    if counts is None:
+        sample_size = samples.shape[-2]
+        means = samples.mean(axis=-2)
+        errors = samples.std(axis=-2) / np.sqrt(sample_size)
+    else:
+        # only use the first counts samples of every setpoint
+        counts = np.asarray(counts)[..., np.newaxis]
+        sample_idx = np.arange(samples.shape[-2])[:, np.newaxis]
+        valid = sample_idx < counts[..., np.newaxis]
+        means = np.where(valid, samples, 0).sum(axis=-2) / counts
+        deviations = np.where(valid, samples - means[..., np.newaxis, :], 0)
+        errors = np.sqrt((deviations**2).sum(axis=-2) / counts) / np.sqrt(counts)
+    return means, errors
+
+
+def process_raw(raw, counts=None, calibration=DEFAULT_CALIBRATION, value_lut=None):
+    """Compute all derived quantities for a block of raw counts.
+
+    The conversion to voltages is linear, so it is applied to the means and
+    errors instead of to every sample.
+
+    Args:
+        raw (np.ndarray): counts with shape (..., sample_size, 2)
+        counts (np.ndarray, optional): number of valid samples for each
+            setpoint, with shape (...). Defaults to all samples are valid.
+        calibration (Calibration, optional): conversion of the counts.
+            Defaults to DEFAULT_CALIBRATION.
+        value_lut (np.ndarray, optional): the corrected count of every raw
+            count of a calibrated ADC, see DeviceCalibration.input_values.
+            Defaults to None, the counts are used as they are.
+
+    Returns:
+        dict: arrays with shape (...) for every name in QUANTITIES
+    """
+    if value_lut is not None:
+        raw = value_lut[raw]
+    means, errors = sample_means(raw, counts)
+    scale = calibration.scale
+    return propagate_errors(
+        means * scale, errors * scale, calibration.shunt_resistance
+    )
+
+
+def propagate_errors(means, errors, shunt_resistance=SHUNT_RESISTANCE):
+    """Compute all derived quantities from the mean voltages.
+
+    Args:
+        means (np.ndarray): array with shape (..., 2) with the mean PV voltage
+            and the mean resistor voltage
+        errors (np.ndarray): standard errors of the means, same shape as means
+        shunt_resistance (float, optional): resistance in ohm used to measure
+            the current. Defaults to SHUNT_RESISTANCE.
+
+    Returns:
+        dict: arrays with shape (...) for every name in QUANTITIES
+    """
+    pv_volt, I_volt = means[..., 0], means[..., 1]
+    pv_volt_err, I_volt_err = errors[..., 0], errors[..., 1]
+
+    fet_volt = pv_volt - I_volt
+    fet_volt_err = np.hypot(pv_volt_err, I_volt_err)
+
+    current = I_volt / shunt_resistance
+    current_err = I_volt_err / shunt_resistance
+
+    power = pv_volt * current
+    power_err = np.hypot(current * pv_volt_err, pv_volt * current_err)
+
+    # at zero current the resistance of the MOSFET is infinite
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fet_R = fet_volt / current
+        fet_R_err = np.hypot(
+            fet_volt_err / current,
+            fet_volt * np.log(current + 0.000001) * current_err,
+        )
+
+    return dict(
+        zip(
+            QUANTITIES,
+            (
+                pv_volt,
+                pv_volt_err,
+                I_volt,
+                I_volt_err,
+                fet_volt,
+                fet_volt_err,
+                current,
+                current_err,
+                power,
+                power_err,
+                fet_R,
+                fet_R_err,
+            ),
+        )
+    )
+
+
+class RunningStats:
+    """Online mean and variance of the raw counts of both channels.
+
+    Uses Welford's algorithm, extended to add blocks of samples at once.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = np.zeros(2)
+        self.m2 = np.zeros(2)
+
+    def update(self, samples):
+        """Add a block of samples.
+
+        Args:
+            samples (np.ndarray): array with shape (k, 2)
+        """
+        n_new = len(samples)
+        mean_new = samples.mean(axis=0)
+        m2_new = ((samples - mean_new) ** 2).sum(axis=0)
+
+        n = self.n + n_new
+        delta = mean_new - self.mean
+        self.mean = self.mean + delta * n_new / n
+        self.m2 = self.m2 + m2_new + delta**2 * self.n * n_new / n
+        self.n = n
+
+    @property
+    def std_err(self):
+        """Standard error of the means, in the same way as sample_means."""
+        return np.sqrt(self.m2 / self.n) / np.sqrt(self.n)
+
+    def converged(self, target_rel_err):
+        """Check if the relative standard error of both means is small enough.
+
+        Args:
+            target_rel_err (float): highest allowed relative standard error
+
+        Returns:
+            bool: True when both channels reached the target
+        """
+        # identical counts only show that the noise is below the resolution of
+        # the ADC, so the variance is never taken smaller than its rounding
+        variance = np.maximum(self.m2 / self.n, QUANTIZATION_VARIANCE)
+        std_err = np.sqrt(variance / self.n)
+        with np.errstate(divide="ignore"):
+            rel_err = std_err / np.abs(self.mean)
+        return bool(np.all(rel_err <= target_rel_err))
+
+
+class ScanStatistics:
+    """Collects the raw counts of a scan and computes the derived quantities."""
+
+    def __init__(
+        self, n_setpoints, sample_size, calibration=DEFAULT_CALIBRATION, value_lut=None
+    ):
+        """Preallocate the count array.
+
+        Args:
+            n_setpoints (int): number of output values in the scan
+            sample_size (int): number of samples taken at each output value
+            calibration (Calibration, optional): conversion of the counts.
+                Defaults to DEFAULT_CALIBRATION.
+            value_lut (np.ndarray, optional): corrected count of every raw
+                count, see process_raw. Defaults to None.
+        """
+        self.raw = np.zeros((n_setpoints, sample_size, 2), dtype=np.uint16)
+        # number of samples taken at each setpoint, less than sample_size
+        # when sampling stopped early
+        self.counts = np.full(n_setpoints, sample_size)
+        self.calibration = calibration
+        self.value_lut = value_lut
+
+    @property
+    def n_setpoints(self):
+        return self.raw.shape[0]
+
+    @property
+    def sample_size(self):
+        return self.raw.shape[1]
+
+    @property
+    def samples(self):
+        """np.ndarray: the samples converted to voltages, a new array"""
+        if self.value_lut is None:
+            return self.calibration.to_voltages(self.raw)
+        return self.calibration.to_voltages(self.value_lut[self.raw])
+
+    def add_row(self, row):
+        """Compute the quantities of a single, completely filled row.
+
+        Args:
+            row (int): index of the setpoint
+
+        Returns:
+            dict: float value for every name in QUANTITIES
+        """
+        quantities = process_raw(
+            self.raw[row, : self.counts[row]],
+            calibration=self.calibration,
+            value_lut=self.value_lut,
+        )
+        return {name: float(value) for name, value in quantities.items()}
+
+    def compute(self, n_rows=None, calibration=None):
+        """Compute the quantities of all rows in one batched pass.
+
+        Args:
+            n_rows (int, optional): only use the first n_rows setpoints.
+                Defaults to all setpoints.
+            calibration (Calibration, optional): conversion of the counts.
+                Defaults to the calibration of the scan.
+
+        Returns:
+            dict: array for every name in QUANTITIES
+        """
+        calibration = calibration or self.calibration
+        counts = self.counts[:n_rows]
+        if np.all(counts == self.sample_size):
+            counts = None
+        return process_raw(self.raw[:n_rows], counts, calibration, self.value_lut)
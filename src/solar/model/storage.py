@@ -0,0 +1,209 @@
+"""Streaming binary storage of scans.
+
+Every scan is stored in its own directory:
+
+    meta.json    description of the scan and the record types
+    results.bin  one RESULT_DTYPE record for every setpoint
+    samples.bin  the raw ADC counts of every setpoint
+
+Records are appended and flushed as soon as a setpoint is done, so a crash only
+loses the setpoint being measured. The binary files have no header; their
+records are described in meta.json, so they can be memory-mapped directly.
+"""
+import datetime
+import json
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from solar.model.results import RESULT_DTYPE
+
+# version of the layout of the scan directories
+FORMAT_VERSION = 2
+
+
+def sample_dtype(sample_size):
+    """Record type of the samples of a setpoint.
+
+    Args:
+        sample_size (int): (maximum) number of samples of a setpoint
+
+    Returns:
+        np.dtype: number of valid samples and the raw counts of the PV and
+            resistor voltages
+    """
+    return np.dtype([("count", np.int32), ("samples", np.uint16, (sample_size, 2))])
+
+
+def _write_json(path, data):
+    """Replace a JSON file in one step, it is never half written."""
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temporary, path)
+
+
+class ScanWriter:
+    """Appends the setpoints of a scan to a scan directory."""
+
+    def __init__(self, path, sample_size, metadata=None, sync=False):
+        """Create the scan directory.
+
+        Args:
+            path (str or Path): the scan directory, it must not exist yet
+            sample_size (int): (maximum) number of samples of a setpoint
+            metadata (dict, optional): extra information about the scan, like
+                the port, the range and the calibration. Defaults to None.
+            sync (bool, optional): force every setpoint to disk instead of only
+                flushing it to the operating system. Defaults to False.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True)
+        self.sync = sync
+        self.samples_dtype = sample_dtype(sample_size)
+        self.metadata = {
+            "format": FORMAT_VERSION,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "sample_size": sample_size,
+            "results_dtype": np.lib.format.dtype_to_descr(RESULT_DTYPE),
+            "samples_dtype": np.lib.format.dtype_to_descr(self.samples_dtype),
+            "complete": False,
+            **(metadata or {}),
+        }
+        _write_json(self.path / "meta.json", self.metadata)
+        self._results = open(self.path / "results.bin", "ab")
+        self._samples = open(self.path / "samples.bin", "ab")
+        self.n = 0
+
+    def append(self, record, samples, count=None):
+        """Store a setpoint.
+
+        Args:
+            record (np.ndarray): RESULT_DTYPE record of the setpoint
+            samples (np.ndarray): raw counts with shape (sample_size, 2)
+            count (int, optional): number of valid samples. Defaults to all.
+        """
+        sample_record = np.zeros(1, dtype=self.samples_dtype)
+        sample_record["count"] = len(samples) if count is None else count
+        sample_record["samples"] = samples
+
+        # the samples go first, a setpoint is only complete when its result
+        # record is written
+        self._samples.write(sample_record.tobytes())
+        self._results.write(np.asarray(record, dtype=RESULT_DTYPE).tobytes())
+        for file in (self._samples, self._results):
+            file.flush()
+            if self.sync:
+                os.fsync(file.fileno())
+        self.n += 1
+
+    def close(self, complete=True, **metadata):
+        """Finish the scan.
+
+        Args:
+            complete (bool, optional): every setpoint of the scan was stored.
+                Defaults to True.
+            **metadata: extra information to store, like p_max, or the error
+                that stopped the scan
+        """
+        self._results.close()
+        self._samples.close()
+        self.metadata.update(metadata, n_setpoints=self.n, complete=complete)
+        _write_json(self.path / "meta.json", self.metadata)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.close(complete=False, error=str(exc_value))
+
+
+class StoredScan(NamedTuple):
+    """A scan loaded from a scan directory."""
+
+    metadata: dict
+    # RESULT_DTYPE records of all complete setpoints
+    results: np.ndarray
+    # records with the count and the raw samples of every setpoint
+    samples: np.ndarray
+
+
+def _open_records(path, dtype, n, mmap):
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+    return np.fromfile(path, dtype=dtype, count=n)
+
+
+def read_metadata(path):
+    """Read the metadata of a scan directory.
+
+    Args:
+        path (str or Path): the scan directory
+
+    Returns:
+        dict: the metadata, with n_setpoints set to the number of completely
+            written setpoints, 0 when the record files were never created
+    """
+    path = Path(path)
+    with open(path / "meta.json") as file:
+        metadata = json.load(file)
+    results_dtype, samples_dtype = _record_dtypes(metadata)
+    metadata["n_setpoints"] = min(
+        file_size(path / "results.bin") // results_dtype.itemsize,
+        file_size(path / "samples.bin") // samples_dtype.itemsize,
+    )
+    return metadata
+
+
+def file_size(path):
+    """Size of a file in bytes.
+
+    Args:
+        path (Path): the file
+
+    Returns:
+        int: the size, 0 when the file does not exist
+    """
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _record_dtypes(metadata):
+    return tuple(
+        np.lib.format.descr_to_dtype([tuple(field) for field in metadata[key]])
+        for key in ("results_dtype", "samples_dtype")
+    )
+
+
+def load_scan(path, mmap=True):
+    """Load a scan directory.
+
+    Setpoints that were not completely written, because the scan crashed, are
+    left out.
+
+    Args:
+        path (str or Path): the scan directory
+        mmap (bool, optional): memory-map the records instead of reading them.
+            Defaults to True.
+
+    Returns:
+        StoredScan: the metadata, results and samples
+    """
+    path = Path(path)
+    metadata = read_metadata(path)
+    results_dtype, samples_dtype = _record_dtypes(metadata)
+    n = metadata["n_setpoints"]
+    return StoredScan(
+        metadata,
+        _open_records(path / "results.bin", results_dtype, n, mmap),
+        _open_records(path / "samples.bin", samples_dtype, n, mmap),
+    )
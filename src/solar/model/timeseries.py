@@ -0,0 +1,373 @@
+"""Repeated scans of the same cell, stored compactly.
+
+A time series is a directory with all scans of one device with the same
+settings. Only the raw counts of every scan are stored, the quantities are
+computed from them when a curve is loaded. A curve is stored as the difference
+with the sample means of the previous curve when that is smaller, otherwise it
+is stored on its own as a keyframe. At least every KEYFRAME_INTERVAL-th curve
+is a keyframe, so loading a curve never decodes more than KEYFRAME_INTERVAL
+curves. The values are zigzag encoded, so small negative differences become
+small positive numbers, and split into byte planes before they are compressed
+with zlib, which compresses the high bytes almost completely.
+
+The p_max, open-circuit voltage, short-circuit current and fill factor of every
+curve are kept in a separate summary file with fixed-size records, so trends
+are read without decoding any curve:
+
+    meta.json    settings of the scans and the calibrations
+    curves.bin   the compressed curves, one after another
+    summary.bin  SUMMARY_DTYPE record of every curve
+
+A curve is only part of the series when its summary record is completely
+written, so a series stays readable when the program crashes while storing.
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from solar.controller.calibration import DeviceCalibration
+from solar.model.results import ScanResults
+from solar.model.statistics import Calibration, process_raw, sample_means
+from solar.model.storage import _write_json
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Most curves between two curves that are stored on their own
+KEYFRAME_INTERVAL = 32
+
+SUMMARY_DTYPE = np.dtype(
+    [
+        # seconds since the epoch at which the scan finished
+        ("time", np.float64),
+        ("p_max", np.float64),
+        ("v_oc", np.float64),
+        ("i_sc", np.float64),
+        ("fill_factor", np.float64),
+        # position and length of the compressed curve in curves.bin
+        ("offset", np.int64),
+        ("size", np.int64),
+        # False when the curve is stored relative to the previous curve
+        ("keyframe", np.bool_),
+    ]
+)
+
+
+def curve_summary(results):
+    """Compute the characteristics of an IV curve.
+
+    The open-circuit voltage and short-circuit current are estimated by the
+    highest PV voltage and the highest current of the scan, they are exact
+    when the scan reaches both ends of the curve.
+
+    Args:
+        results (np.ndarray or dict): RESULT_DTYPE records, or arrays for the
+            names in QUANTITIES
+
+    Returns:
+        tuple: p_max, v_oc, i_sc and fill_factor
+    """
+    currents = np.asarray(results["currents"])
+    if len(currents) == 0:
+        return np.nan, np.nan, np.nan, np.nan
+    p_max = np.fmax.reduce(np.asarray(results["pv_powers"]))
+    v_oc = np.nanmax(np.asarray(results["pv_voltages"]))
+    i_sc = np.nanmax(currents)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill_factor = p_max / (v_oc * i_sc)
+    return float(p_max), float(v_oc), float(i_sc), float(fill_factor)
+
+
+def _prediction(raw, counts):
+    # the previous curve predicts every sample by its rounded sample mean,
+    # which does not add the noise of the previous samples
+    means = sample_means(raw, counts)[0]
+    return np.rint(means)[:, np.newaxis, :].astype(np.int16)
+
+
+def _pack(counts, values):
+    # zigzag encoding maps small negative residuals to small positive
+    # numbers, so their high bytes are zero instead of 0xFF
+    values = values.astype(np.int16)
+    values = ((values << 1) ^ (values >> 15)).view(np.uint16)
+    # the channels one after another, then all low bytes before all high
+    # bytes, so zlib finds long runs of similar bytes
+    planes = np.ascontiguousarray(values.transpose(2, 0, 1), dtype="<u2")
+    planes = planes.view(np.uint8).reshape(-1, 2).T
+    return zlib.compress(counts.astype("<i4").tobytes() + planes.tobytes())
+
+
+def _unpack(blob, shape):
+    data = zlib.decompress(blob)
+    counts = np.frombuffer(data, dtype="<i4", count=shape[0])
+    planes = np.frombuffer(data, dtype=np.uint8, offset=counts.nbytes)
+    zigzag = np.ascontiguousarray(planes.reshape(2, -1).T).view("<u2")
+    zigzag = zigzag.astype(np.int32)
+    values = (zigzag >> 1) ^ -(zigzag & 1)
+    values = values.reshape(shape[2], shape[0], shape[1]).transpose(1, 2, 0)
+    return counts.astype(np.int64), values.astype(np.int16)
+
+
+class TimeSeries:
+    """A directory with repeated scans of one device."""
+
+    def __init__(self, path, metadata=None):
+        """Open a time series, or create it when metadata is given.
+
+        Args:
+            path (str or Path): the time series directory
+            metadata (dict, optional): settings of a new series, with at least
+                n_setpoints, sample_size and first_setting. Defaults to
+                opening an existing series.
+
+        Raises:
+            FileExistsError: when metadata is given for an existing series
+        """
+        self.path = Path(path)
+        if metadata is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            if (self.path / "meta.json").exists():
+                raise FileExistsError(f"{self.path} already has a time series")
+            self.metadata = {
+                "format": FORMAT_VERSION,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "keyframe_interval": KEYFRAME_INTERVAL,
+                **metadata,
+            }
+            _write_json(self.path / "meta.json", self.metadata)
+            (self.path / "curves.bin").touch()
+            (self.path / "summary.bin").touch()
+        else:
+            with open(self.path / "meta.json") as file:
+                self.metadata = json.load(file)
+        self.shape = (self.metadata["n_setpoints"], self.metadata["sample_size"], 2)
+        # raw counts of the last curve, the reference of the next curve
+        self._previous = None
+
+    def __len__(self):
+        return (self.path / "summary.bin").stat().st_size // SUMMARY_DTYPE.itemsize
+
+    @property
+    def summary(self):
+        """np.ndarray: SUMMARY_DTYPE record of every curve"""
+        return np.fromfile(self.path / "summary.bin", SUMMARY_DTYPE, count=len(self))
+
+    def append(self, raw, counts, results, timestamp=None):
+        """Store a curve.
+
+        Args:
+            raw (np.ndarray): raw counts with shape (n_setpoints, sample_size, 2)
+            counts (np.ndarray): number of valid samples of every setpoint
+            results (np.ndarray): RESULT_DTYPE records of the curve, used for
+                the summary
+            timestamp (float, optional): seconds since the epoch at which the
+                scan finished. Defaults to now.
+
+        Raises:
+            ValueError: when the curve has different settings than the series
+        """
+        raw = np.asarray(raw, dtype=np.int16)
+        counts = np.asarray(counts)
+        if raw.shape != self.shape:
+            raise ValueError(f"Expected raw counts with shape {self.shape}")
+        summary = self.summary
+        n = len(summary)
+
+        blob = _pack(counts, raw)
+        keyframe = True
+        keyframes = np.flatnonzero(summary["keyframe"])
+        if n and n - keyframes[-1] < self.metadata["keyframe_interval"]:
+            if self._previous is None:
+                self._previous = self.raw(n - 1)
+            delta = _pack(counts, raw - _prediction(*self._previous))
+            if len(delta) < len(blob):
+                blob, keyframe = delta, False
+
+        offset = 0 if n == 0 else int(summary["offset"][-1] + summary["size"][-1])
+        record = np.zeros(1, dtype=SUMMARY_DTYPE)
+        record["time"] = time.time() if timestamp is None else timestamp
+        record[["p_max", "v_oc", "i_sc", "fill_factor"]] = curve_summary(results)
+        record[["offset", "size", "keyframe"]] = (offset, len(blob), keyframe)
+
+        # the curve goes first, it only belongs to the series once its
+        # summary record is written
+        with open(self.path / "curves.bin", "r+b") as file:
+            file.seek(offset)
+            file.write(blob)
+            file.truncate()
+        with open(self.path / "summary.bin", "r+b") as file:
+            file.seek(n * SUMMARY_DTYPE.itemsize)
+            file.write(record.tobytes())
+            file.truncate()
+        self._previous = (raw, counts)
+
+    def raw(self, index):
+        """Decode the raw counts of a curve.
+
+        Args:
+            index (int): number of the curve, negative numbers count from the
+                end
+
+        Returns:
+            tuple: raw counts with shape (n_setpoints, sample_size, 2) and the
+                number of valid samples of every setpoint
+        """
+        summary = self.summary
+        index = range(len(summary))[index]
+        first = np.flatnonzero(summary["keyframe"][: index + 1])[-1]
+        with open(self.path / "curves.bin", "rb") as file:
+            file.seek(summary["offset"][first])
+            blobs = file.read(
+                summary["offset"][index] + summary["size"][index] - file.tell()
+            )
+
+        sizes = summary["size"][first : index + 1]
+        counts, values = _unpack(blobs[: sizes[0]], self.shape)
+        start = sizes[0]
+        # every following curve is stored relative to the one before it
+        for size in sizes[1:]:
+            delta_counts, delta = _unpack(blobs[start : start + size], self.shape)
+            values = delta + _prediction(values, counts)
+            counts = delta_counts
+            start += size
+        return values.astype(np.uint16), counts
+
+    def quantities(self, index, calibration=None):
+        """Compute the quantities of a curve from its raw counts.
+
+        Args:
+            index (int): number of the curve
+            calibration (Calibration, optional): conversion of the counts.
+                Defaults to the calibration the series was measured with.
+
+        Returns:
+            dict: array for every name in QUANTITIES
+        """
+        if calibration is None:
+            calibration = Calibration(**self.metadata["calibration"])
+        value_lut = None
+        device_calibration = self.metadata.get("device_calibration")
+        if device_calibration:
+            value_lut = DeviceCalibration(**device_calibration).value_lut
+        raw, counts = self.raw(index)
+        return process_raw(raw, counts, calibration, value_lut)
+
+    def results(self, index, calibration=None):
+        """Get the results of a curve.
+
+        Args:
+            index (int): number of the curve
+            calibration (Calibration, optional): conversion of the counts.
+                Defaults to the calibration the series was measured with.
+
+        Returns:
+            ScanResults: the results of every setpoint
+        """
+        settings = self.metadata["first_setting"] + np.arange(self.shape[0])
+        results = ScanResults(len(settings))
+        results.extend(settings, self.quantities(index, calibration))
+        return results
+
+
+def run_time_series(
+    experiment,
+    path,
+    port,
+    start,
+    stop,
+    sample_size,
+    interval,
+    repetitions=None,
+    stop_event=None,
+    **kwargs,
+):
+    """Scan a device at regular times and store the curves in a time series.
+
+    The series is created when it does not exist yet. An existing series is
+    continued, the settings, the calibrations and the other arguments of the
+    scans must be the same as those of the series. A scan that fails is logged
+    and left out of the series, it still counts as one of the repetitions.
+
+    Args:
+        experiment (SolarExperiment): performs the scans
+        path (str or Path): the time series directory
+        port (string): port of the device controlling the experiment
+        start (float): analog voltage at which the experiment starts.
+        stop (float): analog voltage at which the experiment stops.
+        sample_size (int): number of samples to take at each voltage level.
+        interval (float): seconds between the starts of the scans
+        repetitions (int, optional): number of scans. Defaults to scanning
+            until stop_event is set.
+        stop_event (threading.Event, optional): stops the series, also while
+            waiting for the next scan. Defaults to a new event.
+        **kwargs: other arguments of SolarExperiment.scan, except path
+
+    Raises:
+        TypeError: when path is given in kwargs, the scans are stored in the
+            series
+        ValueError: when an existing series was measured with other settings
+
+    Returns:
+        TimeSeries: the time series
+    """
+    if "path" in kwargs:
+        raise TypeError("The scans of a time series are stored in the series")
+    path = Path(path)
+    if stop_event is None:
+        stop_event = threading.Event()
+    metadata = _series_metadata(experiment, port, start, stop, sample_size, kwargs)
+    if (path / "meta.json").exists():
+        series = TimeSeries(path)
+        changed = sorted(
+            key for key, value in metadata.items() if series.metadata.get(key) != value
+        )
+        if changed:
+            raise ValueError(
+                f"The series in {path} was measured with other {', '.join(changed)}"
+            )
+    else:
+        series = TimeSeries(path, metadata)
+
+    done = 0
+    while not stop_event.is_set() and (repetitions is None or done < repetitions):
+        scan_start = time.monotonic()
+        try:
+            experiment.scan(port, start, stop, sample_size, **kwargs)
+        except Exception:
+            logger.exception("Scan %d of the series in %s failed", len(series), path)
+        else:
+            statistics = experiment.statistics
+            series.append(
+                statistics.raw, statistics.counts, experiment.results.to_array()
+            )
+        done += 1
+        if repetitions is None or done < repetitions:
+            stop_event.wait(max(0.0, scan_start + interval - time.monotonic()))
+    return series
+
+
+def _series_metadata(experiment, port, start, stop, sample_size, options):
+    # the settings every curve of a series must share, in the form in which
+    # they are stored in meta.json
+    with experiment.pool.acquire(port) as device:
+        first = device.analog_to_digital(start)
+        last = device.analog_to_digital(stop)
+        device_calibration = device.calibration.to_dict()
+    metadata = {
+        "port": port,
+        "start": start,
+        "stop": stop,
+        "sample_size": sample_size,
+        "n_setpoints": last - first + 1,
+        "first_setting": first,
+        "calibration": experiment.calibration._asdict(),
+        "device_calibration": device_calibration,
+        "scan_options": options,
+    }
+    return json.loads(json.dumps(metadata))
@@ -1,14 +1,17 @@
+import asyncio
 import gzip
+import importlib.resources
 import json
 import re
 import time
+from collections import deque
+from functools import lru_cache
 
-import pkg_resources
-
+import numpy as np
 import pyvisa
 
 # mimic errors attribute of pyvisa
-from pyvisa import errors
+from pyvisa import constants, errors
 
 
 SIM_DEVICES = {
@@ -21,6 +24,123 @@ SIM_DEVICES = {
 }
 
 
+class TransportModel:
+    """Timing and noise of the connection with a simulated device.
+
+    The default model is an ideal connection: responses are immediate and the
+    recorded data is played back unchanged.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        processing_time=0.0,
+        baud_rate=None,
+        jitter=0.0,
+        timeout_probability=0.0,
+        timeout=2.0,
+        noise=0.0,
+        seed=None,
+    ):
+        """Create the transport model.
+
+        Args:
+            latency (float, optional): round trip time in seconds of the
+                connection, without the transfer time. Pipelined commands only
+                pay it once. Defaults to 0.0.
+            processing_time (float, optional): time in seconds the device needs
+                to handle a command, commands are handled one after the other.
+                Defaults to 0.0.
+            baud_rate (int, optional): speed of the serial connection in bits
+                per second, every byte takes 10 bits. Defaults to unlimited.
+            jitter (float, optional): standard deviation of the latency in
+                seconds. Defaults to 0.0.
+            timeout_probability (float, optional): chance that a response gets
+                lost. Defaults to 0.0.
+            timeout (float, optional): time in seconds before a read of a lost
+                response fails. Defaults to 2.0, like pyvisa.
+            noise (float, optional): standard deviation of the noise added to
+                the measured values, in ADC counts. Defaults to 0.0.
+            seed (int, optional): seed of the random generator. Defaults to
+                a random seed.
+        """
+        self.latency = latency
+        self.processing_time = processing_time
+        self.baud_rate = baud_rate
+        self.jitter = jitter
+        self.timeout_probability = timeout_probability
+        self.timeout = timeout
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def is_instant(self):
+        """True when responses take no time and never get lost."""
+        return not (
+            self.latency
+            or self.processing_time
+            or self.baud_rate
+            or self.jitter
+            or self.timeout_probability
+        )
+
+    def transfer_time(self, message):
+        """Time needed to send a message including its termination.
+
+        Args:
+            message (str): the message
+
+        Returns:
+            float: time in seconds
+        """
+        if not self.baud_rate or message is None:
+            return 0.0
+        return (len(message) + 2) * 10 / self.baud_rate
+
+    def round_trip_latency(self):
+        """Round trip time of the connection, including the jitter.
+
+        Returns:
+            float: time in seconds
+        """
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.rng.normal(self.latency, self.jitter))
+
+    def is_lost(self):
+        """Decide if a response gets lost.
+
+        Returns:
+            bool: True if the response never arrives
+        """
+        return bool(self.timeout_probability) and (
+            self.rng.random() < self.timeout_probability
+        )
+
+    def add_noise(self, values):
+        """Add noise to measured values.
+
+        Args:
+            values (np.ndarray): integer ADC values
+
+        Returns:
+            np.ndarray: the values with noise, still valid ADC values
+        """
+        if not self.noise:
+            return values
+        noisy = values + np.rint(self.rng.normal(0, self.noise, np.shape(values)))
+        return np.clip(noisy, 0, 1023).astype(int)
+
+
+# Typical Arduino on a USB serial connection
+ARDUINO_SERIAL = TransportModel(
+    latency=0.004, processing_time=0.0002, baud_rate=115200, jitter=0.001
+)
+
+# Transport model of newly opened simulated devices
+default_transport = TransportModel()
+
+
 class ResourceManager(pyvisa.ResourceManager):
     """Fake PyVISA ResourceManager."""
 
@@ -50,11 +170,13 @@ class ResourceManager(pyvisa.ResourceManager):
 
         return tuple(resources)
 
-    def open_resource(self, resource, *args, **kwargs):
+    def open_resource(self, resource, *args, transport=None, **kwargs):
         """Open a VISA instrument.
 
         Args:
             resource (str): Name of the VISA resource
+            transport (TransportModel, optional): timing and noise of a
+                simulated device. Defaults to default_transport.
 
         Returns:
             Resource or SimulatedDevice: a VISA Resource or a SimulatedDevice
@@ -62,7 +184,91 @@ class ResourceManager(pyvisa.ResourceManager):
         if resource not in SIM_DEVICES.keys():
             return super().open_resource(resource, *args, **kwargs)
         else:
-            return SimulatedDevice(*SIM_DEVICES[resource])
+            return SimulatedDevice(*SIM_DEVICES[resource], transport=transport)
+
+
+def _sleep(seconds):
+    """Simulate a slow response, without the overhead of sleeping for nothing."""
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+@lru_cache(maxsize=None)
+def load_data(datafile):
+    """Load prerecorded experimental data as numpy arrays.
+
+    The data is loaded once and shared by all simulated devices.
+
+    Args:
+        datafile (str): Name of the file that contains the prerecorded
+            experimental data. The file must be included in this package.
+
+    Returns:
+        dict: for every channel number a tuple of an integer array with shape
+            (n_settings, n_samples) and an array with the number of recorded
+            samples for every setting
+    """
+    compressed_data = (importlib.resources.files(__package__) / datafile).read_bytes()
+    data = json.loads(gzip.decompress(compressed_data))
+    n_settings = max(int(setting) for setting in data) + 1
+
+    channels = {}
+    for setting, recorded in data.items():
+        for ch_idx, values in recorded.items():
+            channels.setdefault(int(ch_idx.removeprefix("ch")), {})[int(setting)] = values
+
+    arrays = {}
+    for channel, settings in channels.items():
+        lengths = np.zeros(n_settings, dtype=int)
+        values = np.zeros(
+            (n_settings, max(len(v) for v in settings.values())), dtype=int
+        )
+        for setting, recorded_values in settings.items():
+            lengths[setting] = len(recorded_values)
+            values[setting, : len(recorded_values)] = recorded_values
+        # make sure the shared data can't be changed by a device
+        values.flags.writeable = False
+        lengths.flags.writeable = False
+        arrays[channel] = (values, lengths)
+    return arrays
+
+
+# Commands of the firmware and the methods of SimulatedDevice handling them
+COMMANDS = [
+    (re.compile(r"\*IDN\?"), "_identify"),
+    (re.compile(r"OUT:CH0 (?P<value>\d+)"), "_set_output_value"),
+    (
+        re.compile(r"OUT:CH0:VOLT (?P<voltage>\d*\.?\d*|\d+)"),
+        "_set_output_voltage",
+    ),
+    (re.compile(r"OUT:CH0\?"), "_get_output_value"),
+    (re.compile(r"OUT:CH0:VOLT\?"), "_get_output_voltage"),
+    (
+        re.compile(r"MEAS:BLK\? (?P<samples>\d+),(?P<channels>\d+(,\d+)*)"),
+        "_measure_block",
+    ),
+    (re.compile(r"MEAS:CH(?P<channel>\d+)\?"), "_get_input_value"),
+    (re.compile(r"MEAS:CH(?P<channel>\d+):VOLT\?"), "_get_input_voltage"),
+]
+
+
+@lru_cache(maxsize=4096)
+def parse_command(query):
+    """Find the handler of a command.
+
+    The same commands are sent over and over again, so the results are cached.
+
+    Args:
+        query (str): the command sent to the device.
+
+    Returns:
+        tuple: name of the handler and a dict with its arguments, or
+            (None, None) for unknown commands
+    """
+    for pattern, handler in COMMANDS:
+        if match := pattern.match(query):
+            return handler, match.groupdict()
+    return None, None
 
 
 class SimulatedDevice:
@@ -72,7 +278,7 @@ class SimulatedDevice:
     input voltages are played back from the data.
     """
 
-    def __init__(self, description, datafile):
+    def __init__(self, description, datafile, transport=None):
         """Initialize the simulated device
 
         Args:
@@ -80,12 +286,22 @@ class SimulatedDevice:
                 included in the info string.
             datafile (str): Name of the file that contains the prerecorded
                 experimental data. The file must be included in this package.
+            transport (TransportModel, optional): timing and noise of the
+                connection. Defaults to default_transport.
         """
         self.description = description
-        compressed_data = pkg_resources.resource_string("nsp2visasim", datafile)
-        self.data = json.loads(gzip.decompress(compressed_data))
+        self.transport = default_transport if transport is None else transport
+        self.data = load_data(datafile)
         self.setting = 0
-        self.idxs = {}
+        # index of the next value to play back, for every channel and setting
+        self.idxs = {
+            channel: np.zeros(len(lengths), dtype=int)
+            for channel, (_, lengths) in self.data.items()
+        }
+        # responses of written commands which are not read yet, with the time
+        # at which they arrive
+        self._responses = deque()
+        self._busy_until = 0.0
         self.open()
 
     def open(self):
@@ -99,6 +315,40 @@ class SimulatedDevice:
     def query(self, query):
         """Write a command to the device and return the response.
 
+        Args:
+            query (str): the command to send to the device.
+
+        Returns:
+            str: the device's response.
+        """
+        if self.transport.is_instant and not self._responses:
+            # nothing to wait for
+            if not self._is_open:
+                raise errors.InvalidSession()
+            return self._respond(query)
+        self.write(query)
+        return self.read()
+
+    def write(self, command):
+        """Write a command to the device, the response can be read later.
+
+        Several commands can be written before reading the responses.
+
+        Args:
+            command (str): the command to send to the device.
+
+        Returns:
+            int: number of bytes written
+        """
+        if not self._is_open:
+            raise errors.InvalidSession()
+        _sleep(self.transport.transfer_time(command))
+        self._responses.append(self._handle(command))
+        return len(command)
+
+    async def query_async(self, query):
+        """Send a query and wait for the response without blocking the event loop.
+
         Args:
             query (str): the command to send to the device.
 
@@ -107,50 +357,141 @@ class SimulatedDevice:
         """
         if not self._is_open:
             raise errors.InvalidSession()
+        transport = self.transport
+        if transport.is_instant:
+            return self._respond(query)
+        await asyncio.sleep(transport.transfer_time(query))
+        arrival, response = self._handle(query)
+        if transport.is_lost():
+            await asyncio.sleep(transport.timeout)
+            raise errors.VisaIOError(constants.StatusCode.error_timeout)
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        return response
+
+    def _handle(self, command):
+        """Handle a command that arrived at the device.
 
-        if re.match("\*IDN\?", query):
-            return f"Simulated Arduino VISA firmware ({self.description})"
-        elif match := re.match("OUT:CH0 (?P<value>\d+)", query):
-            # set output value
-            self.setting = int(match["value"])
-            return match["value"]
-        elif match := re.match("OUT:CH0:VOLT (?P<voltage>\d*\.?\d*|\d+)", query):
-            # set output voltage
-            voltage = match["voltage"]
-            self.setting = int(1023 * float(voltage) / 3.3)
-            return voltage
-        elif match := re.match("OUT:CH0\?", query):
-            # get output value
-            return str(self.setting)
-        elif match := re.match("OUT:CH0:VOLT\?", query):
-            # get output voltage
-            return str(self.setting / 1023 * 3.3)
-        elif match := re.match("MEAS:CH(?P<channel>\d+)\?", query):
-            # get input value
-            return self._get_input_value(match["channel"])
-        elif match := re.match("MEAS:CH(?P<channel>\d+):VOLT\?", query):
-            # get input voltage
-            value = int(self._get_input_value(match["channel"]))
-            return f"{value / 1023 * 3.3:.4f}"
+        Args:
+            command (str): the command
+
+        Returns:
+            tuple: the time at which the response arrives and the response
+        """
+        transport = self.transport
+        response = self._respond(command)
+
+        # the device handles the commands one after the other, the connection
+        # latency is split over the way there and the way back
+        latency = transport.round_trip_latency()
+        start = max(time.perf_counter() + latency / 2, self._busy_until)
+        self._busy_until = start + transport.processing_time
+        arrival = self._busy_until + transport.transfer_time(response) + latency / 2
+        return arrival, response
+
+    def read(self):
+        """Read the response of the oldest unread command.
+
+        Returns:
+            str: the device's response.
+        """
+        if not self._is_open:
+            raise errors.InvalidSession()
+        try:
+            arrival, response = self._responses.popleft()
+        except IndexError:
+            _sleep(self.transport.timeout)
+            raise errors.VisaIOError(constants.StatusCode.error_timeout)
+        if self.transport.is_lost():
+            _sleep(self.transport.timeout)
+            raise errors.VisaIOError(constants.StatusCode.error_timeout)
+        _sleep(arrival - time.perf_counter())
+        return response
+
+    def clear(self):
+        """Discard the responses that were not read yet, like a device clear."""
+        if not self._is_open:
+            raise errors.InvalidSession()
+        self._responses.clear()
+
+    def _respond(self, query):
+        """Handle a command and create the response.
+
+        Args:
+            query (str): the command to send to the device.
+
+        Returns:
+            str: the device's response, None for unknown commands.
+        """
+        handler, arguments = parse_command(query)
+        if handler is None:
+            return None
+        return getattr(self, handler)(**arguments)
+
+    def _identify(self):
+        return f"Simulated Arduino VISA firmware ({self.description})"
+
+    def _set_output_value(self, value):
+        self.setting = int(value)
+        return value
+
+    def _set_output_voltage(self, voltage):
+        self.setting = int(1023 * float(voltage) / 3.3)
+        return voltage
+
+    def _get_output_value(self):
+        return str(self.setting)
+
+    def _get_output_voltage(self):
+        return str(self.setting / 1023 * 3.3)
+
+    def _measure_block(self, samples, channels):
+        # get several samples of several input values in one response
+        channels = [int(channel) for channel in channels.split(",")]
+        values = self.read_input_values(channels, int(samples))
+        return ",".join(map(str, values.ravel().tolist()))
+
+    def _get_input_voltage(self, channel):
+        value = int(self._get_input_value(channel))
+        return f"{value / 1023 * 3.3:.4f}"
 
     def _get_input_value(self, channel):
         """Simulate get value from input channel
 
         Args:
             channel (str): analog channel number
+
+        Returns:
+            str: the next recorded value
         """
-        ch_idx = f"ch{channel}"
-        idx = self.idxs.setdefault(self.setting, {}).setdefault(ch_idx, 0)
+        values, lengths = self.data[int(channel)]
+        idxs = self.idxs[int(channel)]
+        # the output value wraps after the last recorded setting
+        setting = self.setting % len(lengths)
+        idx = idxs[setting]
+        # start from the beginning when all recorded data is used
+        idxs[setting] = (idx + 1) % lengths[setting]
+        return str(self.transport.add_noise(values[setting, idx]))
 
-        setting_key = str(self.setting)
-        try:
-            value = self.data[setting_key][ch_idx][idx]
-        except IndexError:
-            value = self.data[setting_key][ch_idx][0]
-            self.idxs[self.setting][ch_idx] = 1
-        else:
-            self.idxs[self.setting][ch_idx] += 1
+    def read_input_values(self, channels, samples=1):
+        """Get the next samples of several input channels at once.
 
-        # simulate a slow response
-        # time.sleep(0.0000000005)
-        return value
+        This is the vectorized counterpart of measuring every value with a
+        separate command.
+
+        Args:
+            channels (list): the analog channel numbers
+            samples (int, optional): number of samples for each channel.
+                Defaults to 1.
+
+        Returns:
+            np.ndarray: integer array with shape (samples, len(channels))
+        """
+        result = np.empty((samples, len(channels)), dtype=int)
+        for column, channel in enumerate(channels):
+            values, lengths = self.data[channel]
+            idxs = self.idxs[channel]
+            setting = self.setting % len(lengths)
+            positions = (idxs[setting] + np.arange(samples)) % lengths[setting]
+            result[:, column] = values[setting, positions]
+            idxs[setting] = (idxs[setting] + samples) % lengths[setting]
+        return self.transport.add_noise(result)
@@ -0,0 +1,198 @@
+"""Delivery of scan results and device lists to the GUI thread.
+
+The scan runs in the worker thread of the ScanExecutor of the experiment. The
+worker only tells the bridge that new points exist, with a queued signal that
+is not repeated until the GUI thread picked up the points. The GUI thread then
+copies all new records at once into its own ScanResults, so plots never read
+results that are being written. Batches are delivered at most max_rate times a
+second; when points arrive slowly every point is delivered as soon as it
+exists, so the GUI never polls and redraws only when there is something new.
+"""
+import threading
+import time
+
+from PySide6 import QtCore
+from PySide6.QtCore import Signal, Slot
+
+from solar.model.results import ScanResults
+
+
+class ScanBridge(QtCore.QObject):
+    """Runs scans of an experiment and delivers their points to the GUI thread."""
+
+    # the new RESULT_DTYPE records, also added to results
+    points_ready = Signal(object)
+    # number of finished and total setpoints
+    progress = Signal(int, int)
+    # message of the exception that stopped the scan, empty if it didn't fail
+    finished = Signal(str)
+
+    # sent from the worker thread, so they are queued to the GUI thread
+    _points_available = Signal()
+    _scan_finished = Signal()
+
+    def __init__(self, experiment, max_rate=30, parent=None):
+        """Create the bridge in the GUI thread.
+
+        Args:
+            experiment (SolarExperiment): the experiment which performs the scans
+            max_rate (float, optional): most batches delivered per second.
+                Defaults to 30.
+            parent (QObject, optional): Qt parent of the bridge. Defaults to None.
+        """
+        super().__init__(parent)
+        self.experiment = experiment
+        self.min_interval = 1 / max_rate
+        # copy of the results of the scan, only used in the GUI thread
+        self.results = ScanResults()
+        self._pending = threading.Event()
+        self._last_delivery = 0.0
+        self._delivery_timer = QtCore.QTimer(self)
+        self._delivery_timer.setSingleShot(True)
+        self._delivery_timer.timeout.connect(self.deliver)
+
+        self._points_available.connect(self._schedule_delivery)
+        self._scan_finished.connect(self._finish)
+        executor = experiment.executor
+        point_done = self._point_done
+        scan_finished = lambda error: self._scan_finished.emit()  # noqa: E731
+        executor.progress_callbacks.append(point_done)
+        executor.finished_callbacks.append(scan_finished)
+        # stop listening when Qt deletes the bridge
+        self.destroyed.connect(
+            lambda: (
+                executor.progress_callbacks.remove(point_done),
+                executor.finished_callbacks.remove(scan_finished),
+            )
+        )
+
+    def start(self, port, start, stop, sample_size, **kwargs):
+        """Start a scan in the worker thread of the executor.
+
+        Scans must be started here instead of with the experiment, so the
+        results of the previous scan are removed.
+
+        Args:
+            port (string): port of the device controlling the experiment
+            start (float): analog voltage at which the experiment starts.
+            stop (float): analog voltage at which the experiment stops.
+            sample_size (int): number of samples to take at each voltage level.
+            **kwargs: other arguments of SolarExperiment.scan
+
+        Raises:
+            RuntimeError: when a scan is already running
+        """
+        self._delivery_timer.stop()
+        self._pending.clear()
+        self.results.reset()
+        self.experiment.start_scan(port, start, stop, sample_size, **kwargs)
+
+    def _point_done(self, done, total, point):
+        # worker thread: only signal when the GUI thread has no delivery planned
+        if not self._pending.is_set():
+            self._pending.set()
+            self._points_available.emit()
+
+    @Slot()
+    def _schedule_delivery(self):
+        wait = self._last_delivery + self.min_interval - time.perf_counter()
+        if wait > 0:
+            self._delivery_timer.start(int(wait * 1000) + 1)
+        else:
+            self.deliver()
+
+    @Slot()
+    def deliver(self):
+        """Copy the new points of the experiment and send them.
+
+        Called when points are available, and by hand after a scan that did not
+        run in the executor.
+        """
+        # clear first, so points finished while copying signal again
+        self._pending.clear()
+        self._last_delivery = time.perf_counter()
+        scan_results = self.experiment.results
+        if len(self.results) == 0 and self.results.capacity < scan_results.capacity:
+            self.results.reset(scan_results.capacity)
+        records = scan_results.records(len(self.results)).copy()
+        if len(records) == 0:
+            return
+        self.results.extend(records["setting"], records)
+        self.progress.emit(len(self.results), scan_results.capacity)
+        self.points_ready.emit(records)
+
+    @Slot()
+    def _finish(self):
+        self._delivery_timer.stop()
+        self.deliver()
+        error = self.experiment.executor.error
+        self.finished.emit("" if error is None else str(error))
+
+
+class DeviceListBridge(QtCore.QObject):
+    """Delivers the device lists of a DeviceRegistry to the GUI thread.
+
+    The registry only lists the devices again when it is asked to, so the
+    bridge refreshes it every ttl seconds of the registry. New devices then
+    show up without restarting the application.
+    """
+
+    # list of DeviceInfo
+    devices_changed = Signal(list)
+
+    def __init__(self, registry, parent=None):
+        """Listen to the registry.
+
+        Args:
+            registry (DeviceRegistry): the registry to listen to
+            parent (QObject, optional): Qt parent of the bridge. Defaults to None.
+        """
+        super().__init__(parent)
+        self.registry = registry
+        listener = self.devices_changed.emit
+        registry.listeners.append(listener)
+        # stop listening when Qt deletes the bridge
+        self.destroyed.connect(lambda: registry.listeners.remove(listener))
+        self._refresh_timer = QtCore.QTimer(self)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self._refresh_timer.start(int(registry.ttl * 1000))
+
+    def devices(self):
+        """Get the last known devices, they are refreshed when they are too old.
+
+        Returns:
+            list: DeviceInfo of every device, empty before the first refresh
+        """
+        return self.registry.devices()
+
+    @Slot()
+    def refresh(self):
+        """List the devices again in the background.
+
+        devices_changed is sent when the list changed.
+        """
+        self.registry.refresh()
+
+
+def show_devices(combo_box, devices):
+    """Show devices in a combo box, the selected port stays selected.
+
+    Args:
+        combo_box (QComboBox): the combo box with the ports
+        devices (list): DeviceInfo of the devices
+    """
+    selected = combo_box.currentText()
+    combo_box.blockSignals(True)
+    combo_box.clear()
+    for device in devices:
+        combo_box.addItem(device.port)
+        if device.identification:
+            combo_box.setItemData(
+                combo_box.count() - 1,
+                device.identification,
+                QtCore.Qt.ItemDataRole.ToolTipRole,
+            )
+    index = combo_box.findText(selected)
+    if index >= 0:
+        combo_box.setCurrentIndex(index)
+    combo_box.blockSignals(False)
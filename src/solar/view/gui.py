@@ -1,7 +1,12 @@
-from solar.model.solar_experiment import SolarExperiment, list_devices
+from solar.controller.arduino_device import load_visa
+from solar.controller.registry import default_registry
+from solar.model.archive import ScanArchive
+from solar.model.solar_experiment import SolarExperiment
+from solar.view.bridge import DeviceListBridge, ScanBridge, show_devices
+from solar.view.rendering import LodPlot
 import sys
-from PySide6 import QtWidgets, QtCore
-from PySide6.QtCore import Slot, QTimer
+from PySide6 import QtWidgets
+from PySide6.QtCore import Slot
 import pyqtgraph as pg
 import numpy as np
 import csv
@@ -13,6 +18,29 @@ pg.setConfigOption("background", "w")
 pg.setConfigOption("foreground", "k")
 
 
+def export_csv(experiment, filename, with_errors=True):
+    """Export the UI-characteristic of an experiment to a csv file.
+
+    The columns come from one snapshot of the results, so they match while a
+    scan is adding results.
+
+    Args:
+        experiment (SolarExperiment): the experiment with the results
+        filename (str): name of the csv file
+        with_errors (bool, optional): also export the errors. Defaults to True.
+    """
+    with open(filename, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(
+            ["Voltage (V)", "Current (A)", "Voltage error (V)", "Current error (A)"]
+        )
+        _, results = experiment.results.snapshot()
+        columns = [results["pv_voltages"], results["currents"]]
+        if with_errors:
+            columns += [results["pv_voltages_err"], results["currents_err"]]
+        writer.writerows(np.column_stack(columns).tolist())
+
+
 class UserInterface(QtWidgets.QMainWindow):
     """Creates user interface.
 
@@ -40,9 +68,14 @@ class UserInterface(QtWidgets.QMainWindow):
         hbox.addLayout(graph_box)
 
 
-        # add plot widget
+        # add plot widget with persistent plot items, they only get new data
+        # at the detail the zoom level needs
         self.plot_widget = pg.PlotWidget()
         vbox.addWidget(self.plot_widget)
+        self.lod_plot = LodPlot(
+            self.plot_widget.getPlotItem(), symbol="o", symbolSize=5, pen=None
+        )
+        self._plotted_version = None
 
         # add horizontal box
         hbox = QtWidgets.QHBoxLayout()
@@ -84,67 +117,117 @@ class UserInterface(QtWidgets.QMainWindow):
         port_box = QtWidgets.QVBoxLayout()
         port_label = QtWidgets.QLabel("Device")
         self.port = QtWidgets.QComboBox(self)
-        self.port.addItems(list_devices())
+        # the devices are listed in the background, the list is updated when
+        # they are found
+        self.device_list = DeviceListBridge(default_registry, parent=self)
+        self.device_list.devices_changed.connect(
+            lambda devices: show_devices(self.port, devices)
+        )
+        show_devices(self.port, self.device_list.devices())
         port_box.addWidget(port_label)
         port_box.addWidget(self.port)
         hbox.addLayout(port_box)
 
-        # add start and save button
+        # add start, save, pause and stop button
         button_box = QtWidgets.QVBoxLayout()
         start_button = QtWidgets.QPushButton("Start")
         save_button = QtWidgets.QPushButton("Save")
         button_box.addWidget(start_button)
         button_box.addWidget(save_button)
         hbox.addLayout(button_box)
+        scan_box = QtWidgets.QVBoxLayout()
+        self.pause_button = QtWidgets.QPushButton("Pause")
+        self.stop_button = QtWidgets.QPushButton("Stop")
+        scan_box.addWidget(self.pause_button)
+        scan_box.addWidget(self.stop_button)
+        hbox.addLayout(scan_box)
 
         # buttons to functions
         start_button.clicked.connect(self.run)
         save_button.clicked.connect(self.save_data)
+        self.pause_button.clicked.connect(self.pause)
+        self.stop_button.clicked.connect(self.stop)
         self.graph.currentIndexChanged.connect(self.change_plot)
 
         self.experiment = SolarExperiment()
+        # directory in which the scans are recorded, None to not record
+        self.record_dir = None
 
-        # Plot timer
-        self.plot_timer = QtCore.QTimer()
-        # Roep iedere 100 ms de plotfunctie aan
-        if self.graph.currentIndex() == 0:
-            self.plot_timer.timeout.connect(self.plot)
-            self.plot_timer.start(100)
-        else:
-            self.plot_timer.timeout.connect(self.pr_plot)
-            self.plot_timer.start(100)
-
-        self.change_plot()
+        # the running scan sends its new points to the GUI thread, the plot
+        # is only updated when they arrive
+        self.bridge = ScanBridge(self.experiment, parent=self)
+        self.bridge.points_ready.connect(self.update_plot)
+        self.bridge.progress.connect(self.show_progress)
+        self.bridge.finished.connect(self.scan_finished)
 
         # create menubar
         self._createActions()
         self._createMenubar()
         self._createStatusBar()
 
+        self.change_plot()
+
     @Slot()
     def change_plot(self):
-        # Plot timer
-        self.plot_timer = QtCore.QTimer()
-        # Roep iedere 100 ms de plotfunctie aan
+        """Show the selected characteristic."""
+        self._plotted_version = None
+        self.update_plot()
+
+    @Slot()
+    def update_plot(self):
+        """Plot the selected characteristic."""
         if self.graph.currentIndex() == 0:
-            self.plot_timer.timeout.connect(self.plot)
-            self.plot_timer.start(100)
+            self.plot()
         else:
-            self.plot_timer.timeout.connect(self.pr_plot)
-            self.plot_timer.start(100)
+            self.pr_plot()
+
+    @Slot(int, int)
+    def show_progress(self, done, total):
+        """Show the progress of the running scan.
+
+        Args:
+            done (int): number of finished setpoints
+            total (int): number of setpoints of the scan
+        """
+        state = "Paused" if self.experiment.executor.is_paused() else "Scanning"
+        message = f"{state}: {done}/{total}"
+        if self.experiment.telemetry.enabled:
+            message += f" ({self.experiment.telemetry.status_text()})"
+        self.statusbar.showMessage(message)
+
+    @Slot(str)
+    def scan_finished(self, error):
+        """Show how the scan ended.
+
+        Args:
+            error (str): message of the exception that stopped the scan, empty
+                if it didn't fail
+        """
+        self.pause_button.setText("Pause")
+        if error:
+            self.statusbar.showMessage(f"Scan failed: {error}")
+        else:
+            self.statusbar.showMessage("Done", 3000)
 
     @Slot()
     def run(self):
         """Starts a scanning process with threading."""
+        if self.experiment.executor.is_running():
+            self.statusbar.showMessage("A scan is already running", 3000)
+            return
         try:
-
-            self.experiment.start_scan(
-                self.port.currentText(),
+            port = self.port.currentText()
+            path = None
+            if self.record_dir is not None:
+                path = ScanArchive(self.record_dir).new_scan_path(port)
+            self.bridge.start(
+                port,
                 self.start_voltage.value(),
                 self.stop_voltage.value(),
                 self.measurements.value(),
+                path=path,
             )
-            self.statusbar.showMessage("Done", 3000)
+            self.update_plot()
         except Exception as e:
             print(e)
             error = QtWidgets.QMessageBox()
@@ -152,61 +235,77 @@ class UserInterface(QtWidgets.QMainWindow):
             error.setIcon(QtWidgets.QMessageBox.Icon.Critical)
             error.exec()
 
+    @Slot()
+    def pause(self):
+        """Pause or resume the running scan."""
+        executor = self.experiment.executor
+        if executor.is_paused():
+            executor.resume()
+            self.pause_button.setText("Pause")
+        elif executor.is_running():
+            executor.pause()
+            self.pause_button.setText("Resume")
+
+    @Slot()
+    def stop(self):
+        """Stop the running scan after the current setpoint."""
+        self.experiment.executor.cancel()
+
     @Slot()
     def plot(self):
         """Plot the results"""
-        self.plot_widget.clear()
-        x = np.array(self.experiment.pv_voltages)
-        y = np.array(self.experiment.currents)
-        x_err = np.array(self.experiment.pv_voltages_err)
-        y_err = np.array(self.experiment.currents_err)
-        self.plot_widget.plot(x, y, symbol="o", symbolSize=5, pen=None)
         self.plot_widget.setLabel("left", "I (A)")
         self.plot_widget.setLabel("bottom", "U (V)")
-        error_bars = pg.ErrorBarItem(x=x, y=y, width=2*x_err, height=2*y_err)
-        self.plot_widget.addItem(error_bars)
+        self._update_plot_items("pv_voltages", "currents")
 
     @Slot()
     def simple_plot(self):
-        self.experiment = SolarExperiment()
+        self.bridge.results.reset()
         self.experiment.scan(
             self.port.currentText(),
             self.start_voltage.value(),
             self.stop_voltage.value(),
             self.measurements.value(),
         )
-        self.plot_widget.clear()
-        x = np.array(self.experiment.pv_voltages)
-        y = np.array(self.experiment.currents)
-        x_err = np.array(self.experiment.pv_voltages_err)
-        y_err = np.array(self.experiment.currents_err)
-        self.plot_widget.plot(x, y, symbol="o", symbolSize=5, pen=None)
-        self.plot_widget.setLabel("left", "I (A)")
-        self.plot_widget.setLabel("bottom", "U (V)")
-        error_bars = pg.ErrorBarItem(x=x, y=y, width=x_err, height=y_err)
-        self.plot_widget.addItem(error_bars)
+        self.bridge.deliver()
+        self.plot()
+
+    def _update_plot_items(self, x_name, y_name):
+        """Give the plot items the results if they changed since the last plot.
+
+        Args:
+            x_name (str): name of the result on the x-axis
+            y_name (str): name of the result on the y-axis
+        """
+        version, results = self.bridge.results.snapshot()
+        if version == self._plotted_version:
+            return
+        self._plotted_version = version
+
+        self.lod_plot.live.set_data(
+            results[x_name],
+            results[y_name],
+            results[f"{x_name}_err"],
+            results[f"{y_name}_err"],
+        )
 
     @Slot()
     def save_data(self):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(filter="CSV files (*.csv)")
-        # Export to csv file
-        with open(filename, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(
-                ["Voltage (V)", "Current (A)", "Voltage error (V)", "Current error (A)"]
-            )
-            # remove error if only 1 measurement
-            if self.measurements.value() == 1:
-                for line in zip(self.experiment.pv_voltages, self.experiment.currents):
-                    writer.writerow(list(line))
-            else:
-                for line in zip(
-                    self.experiment.pv_voltages,
-                    self.experiment.currents,
-                    self.experiment.pv_voltages_err,
-                    self.experiment.currents_err,
-                ):
-                    writer.writerow(list(line))
+        if not filename:
+            return
+        # remove error if only 1 measurement
+        export_csv(
+            self.experiment, filename, with_errors=self.measurements.value() != 1
+        )
+
+    @Slot()
+    def choose_record_dir(self):
+        """Choose the directory in which scans are recorded while they run."""
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self)
+        self.record_dir = directory or None
+        if self.record_dir is not None:
+            self.statusbar.showMessage(f"Recording scans in {self.record_dir}", 3000)
 
     @Slot()
     def power(self):
@@ -215,21 +314,22 @@ class UserInterface(QtWidgets.QMainWindow):
     @Slot()
     def pr_plot(self):
         """Plot the results"""
-        self.plot_widget.clear()
-        x = np.array(self.experiment.fet_R)
-        y = np.array(self.experiment.pv_powers)
-        x_err = np.array(self.experiment.fet_R_err)
-        y_err = np.array(self.experiment.pv_powers_err)
-        self.plot_widget.plot(x, y, symbol="o", symbolSize=5, pen=None)
         self.plot_widget.setLabel("left", "P (W)")
         self.plot_widget.setLabel("bottom", "R (Ohm)")
-        error_bars = pg.ErrorBarItem(x=x, y=y, width=2*x_err, height=2*y_err)
-        self.plot_widget.addItem(error_bars)
+        self._update_plot_items("fet_R", "pv_powers")
+
+    def closeEvent(self, event):
+        """Stop a running scan before the window closes."""
+        self.experiment.executor.cancel()
+        self.experiment.executor.wait(timeout=1)
+        super().closeEvent(event)
 
     def _createActions(self):
         """Connect menubar to actions"""
         self.save_action = QAction("&Save", self)
         self.save_action.triggered.connect(self.save_data)
+        self.record_action = QAction("&Record scans...", self)
+        self.record_action.triggered.connect(self.choose_record_dir)
         self.exit_action = QAction("&Exit", self)
         self.exit_action.triggered.connect(self.close)
 
@@ -239,6 +339,7 @@ class UserInterface(QtWidgets.QMainWindow):
         fileMenu = QtWidgets.QMenu("&File", self)
         menuBar.addMenu(fileMenu)
         fileMenu.addAction(self.save_action)
+        fileMenu.addAction(self.record_action)
         fileMenu.addSeparator()
         fileMenu.addAction(self.exit_action)
 
@@ -250,6 +351,7 @@ class UserInterface(QtWidgets.QMainWindow):
 
 def main():
     app = QtWidgets.QApplication(sys.argv)
+    load_visa()
     ui = UserInterface()
     ui.show()
     sys.exit(app.exec())
@@ -1,12 +1,16 @@
 import sys
+from pathlib import Path
 
 from PySide6 import QtWidgets
-from PySide6.QtCore import Slot, QTimer
+from PySide6.QtCore import Slot
 from PySide6.QtGui import QAction
 import pyqtgraph as pg
+from solar.controller.arduino_device import load_visa
+from solar.controller.registry import default_registry
+from solar.model.archive import ArchivedScan, ScanArchive
 from solar.model.solar_experiment import SolarExperiment
-import numpy as np
-import pandas as pd
+from solar.view.bridge import DeviceListBridge, ScanBridge, show_devices
+from solar.view.rendering import LodPlot
 
 
 # PyQtGraph global options
@@ -29,6 +33,14 @@ class UserInterface(QtWidgets.QMainWindow):
 
         # Create plot widget
         self.plot_window = pg.PlotWidget()
+        self.plot_window.setLabel("left", "Current (A)")
+        self.plot_window.setLabel("bottom", "Volt (V)")
+
+        # the plot items are created once and updated with new data, the
+        # curves of opened scans are drawn behind the running scan
+        self.lod_plot = LodPlot(
+            self.plot_window.getPlotItem(), symbol="o", symbolSize=5, pen=None
+        )
 
         # Create central widget
         central_widget = QtWidgets.QWidget()
@@ -82,7 +94,13 @@ class UserInterface(QtWidgets.QMainWindow):
         self.device_box = QtWidgets.QVBoxLayout()
         device_label = QtWidgets.QLabel("Device")
         self.device_selection = QtWidgets.QComboBox()
-        self.device_selection.addItems(SolarExperiment().get_connected_devices())
+        # the devices are listed in the background, the list is updated when
+        # they are found
+        self.device_list = DeviceListBridge(default_registry, parent=self)
+        self.device_list.devices_changed.connect(
+            lambda devices: show_devices(self.device_selection, devices)
+        )
+        show_devices(self.device_selection, self.device_list.devices())
         self.device_box.addWidget(device_label)
         self.device_box.addWidget(self.device_selection)
 
@@ -93,10 +111,9 @@ class UserInterface(QtWidgets.QMainWindow):
         hbox.addLayout(self.device_box)
         hbox.addLayout(self.button_box)
 
-        # Create plot timer that plots every 100ms
-        self.plot_timer = QTimer()
-        self.plot_timer.timeout.connect(self.plot)
-        self.plot_timer.start(100)
+        # plot the points of the running scan when they arrive
+        self.bridge = ScanBridge(self.experiment, parent=self)
+        self.bridge.points_ready.connect(self.plot)
 
         # plot data on button click
         self.start_button.clicked.connect(self.run_measurement)
@@ -114,11 +131,11 @@ class UserInterface(QtWidgets.QMainWindow):
         if not self.experiment.is_scanning.is_set():
             try:
                 self.start_button.setEnabled(False)
-                self.experiment.start_scan(
+                self.bridge.start(
                     port=self.device_selection.currentText(),
                     start=self.start_input.value(),
                     stop=self.stop_input.value(),
-                    N=self.sample_input.value(),
+                    sample_size=self.sample_input.value(),
                 )
 
             except Exception as err:
@@ -128,45 +145,109 @@ class UserInterface(QtWidgets.QMainWindow):
             finally:
                 self.start_button.setEnabled(True)
 
+    @Slot()
     def plot(self):
         """Method used to plot the results of a running experiment.
 
-        This method will only print results while an experiment is running
+        This method is called when new results of the experiment arrive
         """
-        if self.experiment.is_scanning.is_set():
-            # Clear old results
-            self.plot_window.clear()
-
-            # Plot new result
-            self.plot_window.plot(
-                self.experiment.pv_voltages,
-                self.experiment.currents,
-                symbol="o",
-                symbolSize=5,
-                pen=None,
-            )
-            error_items = pg.ErrorBarItem(
-                y=np.array(self.experiment.currents),
-                x=np.array(self.experiment.pv_voltages),
-                width=2 * np.array(self.experiment.currents),
-                height=2 * np.array(self.experiment.pv_voltages_err),
-            )
+        _, results = self.bridge.results.snapshot()
+        self.lod_plot.live.set_data(
+            results["pv_voltages"],
+            results["currents"],
+            results["pv_voltages_err"],
+            results["currents_err"],
+        )
 
-            self.plot_window.addItem(error_items)
+    @Slot()
+    def open_scans(self):
+        """Method used to overlay stored scans on the plot.
+
+        A scan directory is opened directly, for an archive directory the scans
+        to overlay are chosen from its index.
+        """
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Open scans")
+        if not directory:
+            return
+        try:
+            if (Path(directory) / "meta.json").is_file():
+                scans = [ArchivedScan(directory)]
+            else:
+                archive = ScanArchive(directory)
+                scans = [
+                    archive.open(info) for info in self.choose_scans(archive.refresh())
+                ]
+        except (OSError, ValueError, KeyError) as err:
+            print(err)
+            self.create_pop_up("The selected directory contains no valid scans")
+            return
+        for scan in scans:
+            self.add_overlay(scan)
+
+    def choose_scans(self, infos):
+        """Method to let the user choose scans from an archive
 
-            self.plot_window.setLabel("left", "Current (A)")
-            self.plot_window.setLabel("bottom", "Volt (V)")
+        Args:
+            infos (list): ScanInfo of the scans in the archive
+
+        Returns:
+            list: ScanInfo of the chosen scans
+        """
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Open scans")
+        layout = QtWidgets.QVBoxLayout(dialog)
+        scan_list = QtWidgets.QListWidget()
+        scan_list.setSelectionMode(
+            QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection
+        )
+        for info in infos:
+            p_max = "unfinished" if info.p_max is None else f"{info.p_max:.3g} W"
+            scan_list.addItem(
+                f"{info.created}  {info.port}  {info.start}-{info.stop} V  "
+                f"N={info.sample_size}  {p_max}"
+            )
+        layout.addWidget(scan_list)
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.StandardButton.Open
+            | QtWidgets.QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        if not dialog.exec():
+            return []
+        return [infos[index.row()] for index in scan_list.selectedIndexes()]
+
+    def add_overlay(self, scan):
+        """Method to draw a stored scan behind the running scan
+
+        Args:
+            scan (ArchivedScan): the stored scan
+        """
+        overlays = self.lod_plot.static
+        color = pg.intColor(len(overlays), hues=12, alpha=160)
+        self.lod_plot.add_static(
+            scan.pv_voltages, scan.currents, pen=pg.mkPen(color), name=scan.info.name
+        )
+        self.statusbar.showMessage(f"{len(overlays)} stored scans shown")
 
     @Slot()
     def save_data(self):
         """Method used to save the experiment data"""
         file_name, _ = QtWidgets.QFileDialog.getSaveFileName(filter="CSV files (*.csv)")
+        if not file_name:
+            return
+        # pandas is slow to import, so it is only loaded when saving
+        import pandas as pd
+
+        # one snapshot, so the columns match while a scan is adding results
+        _, results = self.experiment.results.snapshot()
         pd.DataFrame(
             {
-                "Volt (V)": self.experiment.led_voltages,
-                "Volt error (V)": self.experiment.led_voltages_errors,
-                "Current (A)": self.experiment.currents,
-                "Current error (A)": self.experiment.currents_errors,
+                "Volt (V)": results["pv_voltages"],
+                "Volt error (V)": results["pv_voltages_err"],
+                "Current (A)": results["currents"],
+                "Current error (A)": results["currents_err"],
             }
         ).to_csv(file_name, index=False)
 
@@ -194,6 +275,7 @@ class UserInterface(QtWidgets.QMainWindow):
     def _createActions(self):
         """Method to create actions"""
         self.open_action = QAction("&Open", self)
+        self.open_action.triggered.connect(self.open_scans)
         self.save_action = QAction("&Save", self)
         self.save_action.triggered.connect(self.save_data)
         self.exit_action = QAction("&Exit", self)
@@ -206,6 +288,7 @@ class UserInterface(QtWidgets.QMainWindow):
 def main():
     """Main function initializing the app"""
     app = QtWidgets.QApplication(sys.argv)
+    load_visa()
     ui = UserInterface()
     ui.show()
     sys.exit(app.exec())
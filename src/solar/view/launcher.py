@@ -0,0 +1,51 @@
+"""Start the application with a splash screen.
+
+Importing the plotting libraries takes most of the startup time, so the
+launcher only imports Qt, shows a splash screen at once and starts listing the
+devices in the background. The main window is imported and built after that.
+"""
+import sys
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+
+def splash_screen():
+    """Create the splash screen shown while the application starts.
+
+    Returns:
+        QSplashScreen: the splash screen, not shown yet
+    """
+    pixmap = QtGui.QPixmap(360, 120)
+    pixmap.fill(QtGui.QColor("white"))
+    splash = QtWidgets.QSplashScreen(pixmap)
+    splash.showMessage(
+        "Starting solar experiment...",
+        QtCore.Qt.AlignmentFlag.AlignCenter,
+        QtGui.QColor("black"),
+    )
+    return splash
+
+
+def main():
+    app = QtWidgets.QApplication(sys.argv)
+    splash = splash_screen()
+    splash.show()
+    app.processEvents()
+
+    # listing the devices runs in the background while the window is built
+    from solar.controller.arduino_device import load_visa
+    from solar.controller.registry import default_registry
+
+    load_visa()
+    default_registry.refresh()
+
+    from solar.view.gui import UserInterface
+
+    ui = UserInterface()
+    ui.show()
+    splash.finish(ui)
+    sys.exit(app.exec())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Level-of-detail rendering of IV curves.
+
+Plot items only get the points that can be seen: points outside the visible
+x-range are left out once the user zoomed in, and when more points are visible
+than the plot can show, they are reduced to the minimum and maximum of small
+groups of points, so peaks stay visible. Error bars are the most expensive part
+of a plot, so only a limited number of them is drawn; zooming in shows more.
+
+Curves of completed scans do not change, they are cached by Qt and only get
+new data when a zoom changes the points they show. Only the live scan is
+redrawn when new results arrive.
+"""
+import math
+
+import numpy as np
+import pyqtgraph as pg
+from PySide6 import QtWidgets
+
+# Most points given to a plot item, about the width of a plot in pixels
+MAX_POINTS = 2000
+# Most error bars drawn for a curve
+MAX_ERROR_BARS = 200
+
+
+def visible_indices(x, y, x_range=None, max_points=MAX_POINTS):
+    """Select the points of a curve that need to be drawn.
+
+    Args:
+        x (np.ndarray): x-values of the curve
+        y (np.ndarray): y-values of the curve
+        x_range (tuple, optional): the visible x-range. Defaults to all points.
+        max_points (int, optional): most points to select. Defaults to
+            MAX_POINTS.
+
+    Returns:
+        np.ndarray: sorted indices of the selected points
+    """
+    if x_range is None:
+        indices = np.arange(len(x))
+    else:
+        # keep the first points outside the range, so lines reach the edges
+        visible = (x >= x_range[0]) & (x <= x_range[1])
+        visible[:-1] |= visible[1:]
+        visible[1:] |= visible[:-1]
+        indices = np.flatnonzero(visible)
+    if len(indices) <= max_points:
+        return indices
+
+    # the minimum and maximum of every group of points, the last group is
+    # filled up with the last point
+    n_groups = max_points // 2
+    group_size = math.ceil(len(indices) / n_groups)
+    padded = np.concatenate(
+        [indices, np.repeat(indices[-1], n_groups * group_size - len(indices))]
+    )
+    groups = y[padded].reshape(n_groups, group_size)
+    starts = np.arange(n_groups) * group_size
+    selected = np.concatenate(
+        [starts + np.argmin(groups, axis=1), starts + np.argmax(groups, axis=1)]
+    )
+    return np.unique(padded[selected])
+
+
+def error_bar_stride(n_points, max_bars=MAX_ERROR_BARS):
+    """Step between the drawn error bars.
+
+    Args:
+        n_points (int): number of visible points
+        max_bars (int, optional): most error bars to draw. Defaults to
+            MAX_ERROR_BARS.
+
+    Returns:
+        int: draw the error bar of every stride-th point
+    """
+    return max(1, math.ceil(n_points / max_bars))
+
+
+class CurveLayer:
+    """A curve with error bars, drawn at the detail the view needs."""
+
+    def __init__(self, plot_item, static=False, error_bars=True, **kwargs):
+        """Add the plot items of the curve.
+
+        Args:
+            plot_item (pg.PlotItem): the plot to draw on
+            static (bool, optional): the data of the curve does not change,
+                so Qt caches its drawing. Defaults to False.
+            error_bars (bool, optional): draw error bars. Defaults to True.
+            **kwargs: style of the curve, like pen and symbol
+        """
+        self.plot_item = plot_item
+        self.static = static
+        self.curve = plot_item.plot([], [], **kwargs)
+        self.error_bars = None
+        if error_bars:
+            self.error_bars = pg.ErrorBarItem(x=np.empty(0), y=np.empty(0))
+            plot_item.addItem(self.error_bars)
+        if static:
+            cache = QtWidgets.QGraphicsItem.CacheMode.DeviceCoordinateCache
+            for item in (self.curve.curve, self.curve.scatter, self.error_bars):
+                if item is not None:
+                    item.setCacheMode(cache)
+        self._data = None
+        self._indices = None
+
+    def items(self):
+        """Get the plot items of the curve.
+
+        Returns:
+            list: the curve and the error bars
+        """
+        return [self.curve] + ([self.error_bars] if self.error_bars else [])
+
+    def set_data(self, x, y, x_err=None, y_err=None):
+        """Give the curve new data and draw it.
+
+        Args:
+            x (np.ndarray): x-values
+            y (np.ndarray): y-values
+            x_err (np.ndarray, optional): errors of the x-values
+            y_err (np.ndarray, optional): errors of the y-values
+        """
+        self._data = (x, y, x_err, y_err)
+        self._indices = None
+        self.render()
+
+    def render(self):
+        """Draw the points that are visible at the current zoom."""
+        if self._data is None:
+            return
+        x, y, x_err, y_err = self._data
+        view_box = self.plot_item.getViewBox()
+        # while the x-axis follows the data, all points are visible
+        x_range = None
+        if not view_box.autoRangeEnabled()[0]:
+            x_range = view_box.viewRange()[0]
+        indices = visible_indices(x, y, x_range)
+        if self._indices is not None and np.array_equal(indices, self._indices):
+            return
+        self._indices = indices
+
+        self.curve.setData(x[indices], y[indices])
+        if self.error_bars is None:
+            return
+        bars = indices[:: error_bar_stride(len(indices))]
+        self.error_bars.setData(
+            x=x[bars],
+            y=y[bars],
+            width=None if x_err is None else 2 * x_err[bars],
+            height=None if y_err is None else 2 * y_err[bars],
+        )
+
+    def remove(self):
+        """Remove the plot items from the plot."""
+        for item in self.items():
+            self.plot_item.removeItem(item)
+
+
+class LodPlot:
+    """Keeps a live curve and the curves of completed scans at the right detail."""
+
+    def __init__(self, plot_item, **kwargs):
+        """Add the live curve to a plot.
+
+        Args:
+            plot_item (pg.PlotItem): the plot to draw on
+            **kwargs: style of the live curve
+        """
+        self.plot_item = plot_item
+        self.live = CurveLayer(plot_item, **kwargs)
+        self.static = []
+        plot_item.getViewBox().sigXRangeChanged.connect(self._range_changed)
+
+    def add_static(self, x, y, x_err=None, y_err=None, **kwargs):
+        """Add the curve of a completed scan, drawn behind the live curve.
+
+        Args:
+            x (np.ndarray): x-values
+            y (np.ndarray): y-values
+            x_err (np.ndarray, optional): errors of the x-values
+            y_err (np.ndarray, optional): errors of the y-values
+            **kwargs: style of the curve, like pen
+
+        Returns:
+            CurveLayer: the curve
+        """
+        layer = CurveLayer(
+            self.plot_item,
+            static=True,
+            error_bars=x_err is not None or y_err is not None,
+            **kwargs,
+        )
+        for item in layer.items():
+            item.setZValue(-1)
+        layer.set_data(x, y, x_err, y_err)
+        self.static.append(layer)
+        return layer
+
+    def clear_static(self):
+        """Remove the curves of all completed scans."""
+        for layer in self.static:
+            layer.remove()
+        self.static = []
+
+    def _range_changed(self, view_box, x_range):
+        self.render()
+
+    def render(self):
+        """Draw all curves at the detail of the current zoom."""
+        self.live.render()
+        for layer in self.static:
+            layer.render()
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+
+from solar.model.archive import ScanArchive
+from solar.model.solar_experiment import SolarExperiment
+from solar.model.statistics import Calibration
+from solar.model.storage import ScanWriter
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_scans_are_indexed(tmp_path):
+    archive = ScanArchive(tmp_path)
+    experiment = SolarExperiment(show_progress=False)
+    experiment.scan(PORT, 0, 0.1, 3, path=archive.new_scan_path(PORT))
+    experiment.scan(PORT, 0, 0.2, 2, path=archive.new_scan_path(PORT))
+
+    first, second = archive.refresh()
+    assert first.name != second.name
+    assert (first.port, first.sample_size, first.stop) == (PORT, 3, 0.1)
+    assert second.p_max == experiment.p_max
+    assert second.n_setpoints == len(experiment.results)
+    assert second.complete
+    assert archive.scans(port="other") == []
+
+    # a new archive object lists the scans from the index
+    index = json.loads((tmp_path / "index.json").read_text())
+    assert set(index) == {first.name, second.name}
+    assert ScanArchive(tmp_path).scans() == [first, second]
+
+
+def test_archived_scan_has_experiment_views(tmp_path):
+    archive = ScanArchive(tmp_path)
+    experiment = SolarExperiment(show_progress=False)
+    experiment.scan(PORT, 0, 0.1, 3, path=archive.new_scan_path(PORT))
+
+    scan = archive.open(archive.scans()[0])
+    # nothing is mapped before the results are used
+    assert scan._stored is None
+    np.testing.assert_array_equal(scan.pv_voltages, experiment.pv_voltages)
+    np.testing.assert_array_equal(scan.currents_err, experiment.currents_err)
+    assert isinstance(scan.stored.results, np.memmap)
+    assert not scan.currents.flags.writeable
+    assert scan.p_max == experiment.p_max
+
+
+def test_reprocess_with_other_calibration(tmp_path):
+    archive = ScanArchive(tmp_path)
+    experiment = SolarExperiment(show_progress=False)
+    experiment.scan(PORT, 0, 0.1, 3, path=archive.new_scan_path(PORT))
+    scan = archive.open(archive.scans()[0])
+
+    quantities = scan.reprocess()
+    np.testing.assert_allclose(quantities["currents"], scan.currents)
+
+    calibration = Calibration(shunt_resistance=2 * 4.7)
+    experiment.recalibrate(calibration)
+    quantities = scan.reprocess(calibration)
+    np.testing.assert_allclose(quantities["currents"], scan.currents / 2)
+    np.testing.assert_allclose(experiment.currents, scan.currents / 2)
+    np.testing.assert_allclose(experiment.pv_voltages, scan.pv_voltages)
+    assert experiment.p_max == np.max(experiment.pv_powers)
+
+
+def test_new_archive_filters_scans(tmp_path):
+    archive = ScanArchive(tmp_path)
+    experiment = SolarExperiment(show_progress=False)
+    experiment.scan(PORT, 0, 0.1, 3, path=archive.new_scan_path(PORT))
+    other = "ASRL::SIMLED::INSTR"
+    experiment.scan(other, 0, 0.1, 3, path=archive.new_scan_path(other))
+
+    # the first call of a new archive object reads the index and filters
+    scans = ScanArchive(tmp_path).scans(port=PORT)
+    assert [info.port for info in scans] == [PORT]
+    assert ScanArchive(tmp_path).scans(complete=False) == []
+
+
+def test_scan_without_records_is_listed(tmp_path):
+    archive = ScanArchive(tmp_path)
+    writer = ScanWriter(archive.new_scan_path(PORT), 3, {"port": PORT})
+    writer.close(complete=False)
+    # a crash while the writer was created leaves only meta.json
+    (writer.path / "results.bin").unlink()
+    (writer.path / "samples.bin").unlink()
+
+    (info,) = ScanArchive(tmp_path).scans()
+    assert info.n_setpoints == 0
+    assert not info.complete
+
+
+def test_unfinished_scan_has_no_p_max(tmp_path):
+    archive = ScanArchive(tmp_path)
+    experiment = SolarExperiment(show_progress=False)
+    points = experiment.iter_scan(PORT, 0, 0.1, 3, path=archive.new_scan_path(PORT))
+    next(points)
+    points.close()
+
+    (info,) = ScanArchive(tmp_path).scans()
+    assert not info.complete
+    assert info.p_max is None
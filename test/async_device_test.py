@@ -0,0 +1,253 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from solar.controller.arduino_device import ArduinoVISADevice, block_support
+from solar.controller.async_device import AsyncArduinoDevice
+from solar.controller.pool import DevicePool
+from solar.controller.telemetry import Telemetry
+from solar.model.solar_experiment import SolarExperiment
+from solar.sims.sim_pyvisa import SimulatedDevice, TransportModel
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_measurements_match_blocking_device(monkeypatch):
+    # the firmware is only probed once per port, neither device takes a
+    # sample for it, so both start from the same sample
+    monkeypatch.setitem(block_support, PORT, True)
+
+    async def measure():
+        device = AsyncArduinoDevice(PORT)
+        await device.set_output_value(700)
+        values = await device.get_input_values((1, 2), samples=10)
+        device.close_device()
+        return device.measure_mode, values
+
+    blocking = ArduinoVISADevice(PORT)
+    blocking.set_output_value(700)
+    expected = blocking.get_input_values((1, 2), samples=10)
+    blocking.close_device()
+
+    mode, values = asyncio.run(measure())
+    assert mode == "compound"
+    np.testing.assert_array_equal(values, expected)
+
+
+def test_devices_wait_concurrently(monkeypatch):
+    transport = TransportModel(latency=0.02)
+    waiting = 0
+    most_waiting = 0
+    query_async = SimulatedDevice.query_async
+
+    async def count_waiting(self, query):
+        nonlocal waiting, most_waiting
+        waiting += 1
+        most_waiting = max(most_waiting, waiting)
+        try:
+            return await query_async(self, query)
+        finally:
+            waiting -= 1
+
+    monkeypatch.setattr(SimulatedDevice, "query_async", count_waiting)
+
+    async def identify_all():
+        devices = [AsyncArduinoDevice(PORT, transport=transport) for _ in range(10)]
+        for _ in range(5):
+            await asyncio.gather(*(device.get_indentification() for device in devices))
+
+    # one thread, but all devices wait for their responses at the same time
+    asyncio.run(identify_all())
+    assert most_waiting == 10
+
+
+def test_query_timeout():
+    # the simulator would only fail after an hour, the test only ends when
+    # the timeout of the device applies
+    transport = TransportModel(timeout_probability=1.0, timeout=3600)
+
+    async def lost_query():
+        device = AsyncArduinoDevice(PORT, timeout=0.05, transport=transport)
+        await device.get_indentification()
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(lost_query())
+
+
+def test_scan_async_matches_scan(monkeypatch):
+    monkeypatch.setitem(block_support, PORT, True)
+    # a new pool, so the simulated device starts playing back from the start
+    pool = DevicePool()
+    expected = SolarExperiment(pool=pool, show_progress=False)
+    expected.scan(PORT, 0, 0.2, 3)
+    pool.close_all()
+
+    async def scan_twice():
+        # every experiment has its own pool, so both devices start from the
+        # start and the scans run at the same time
+        experiments = [
+            SolarExperiment(pool=DevicePool(), show_progress=False) for _ in range(2)
+        ]
+        await asyncio.gather(
+            *(experiment.scan_async(PORT, 0, 0.2, 3) for experiment in experiments)
+        )
+        return experiments
+
+    for experiment in asyncio.run(scan_twice()):
+        np.testing.assert_array_equal(
+            experiment.results.to_array(), expected.results.to_array()
+        )
+        assert experiment.p_max == expected.p_max
+
+
+class SlowResource:
+    """A resource without query_async whose queries take 0.2 s."""
+
+    def __init__(self):
+        self.busy = False
+        self.overlapped = False
+
+    def query(self, query):
+        self.overlapped |= self.busy
+        self.busy = True
+        time.sleep(0.2)
+        self.busy = False
+        return "slow"
+
+    def close(self):
+        pass
+
+
+def test_timed_out_query_keeps_the_device():
+    resource = SlowResource()
+
+    class ResourceManager:
+        def open_resource(self, port, **kwargs):
+            return resource
+
+    async def query_after_timeout():
+        device = AsyncArduinoDevice(PORT, ResourceManager(), timeout=0.05)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            await device.get_indentification()
+        # the device is only given up when the resource is done with the query
+        assert not resource.busy
+        assert time.perf_counter() - start >= 0.2
+        response = await device.query("*IDN?", timeout=1)
+        device.close_device()
+        return response
+
+    assert asyncio.run(query_after_timeout()) == "slow"
+    assert not resource.overlapped
+
+
+def test_scan_async_skips_setpoint_telemetry():
+    telemetry = Telemetry(True)
+    experiment = SolarExperiment(show_progress=False, telemetry=telemetry)
+    asyncio.run(experiment.scan_async(PORT, 0, 0.2, 3))
+    assert len(experiment.results) == 63
+    assert telemetry.setpoints.n == 0
+    assert not experiment.is_scanning.is_set()
+
+
+def test_scan_async_waits_for_the_port():
+    pool = DevicePool()
+    experiment = SolarExperiment(pool=pool, show_progress=False)
+
+    async def scan_while_in_use():
+        async with pool.acquire_async(PORT) as device:
+            scan = asyncio.ensure_future(experiment.scan_async(PORT, 0, 0.1, 2))
+            await asyncio.sleep(0.05)
+            assert len(experiment.results) == 0
+            # a second scan of the experiment is refused
+            with pytest.raises(RuntimeError):
+                await experiment.scan_async(PORT, 0, 0.1, 2)
+            resource = device.device
+        await scan
+        return resource
+
+    resource = asyncio.run(scan_while_in_use())
+    assert len(experiment.results) == 32
+    # the scan used the resource that the pool keeps open
+    with pool.acquire(PORT) as device:
+        assert device.device is resource
+    pool.close_all()
+
+
+def test_acquire_async_does_not_block_the_loop(monkeypatch):
+    pool = DevicePool()
+    open_device = pool._open
+    loops = []
+
+    def open_while_loop_runs(port):
+        # the event loop must run while the device is opened
+        loop_ran = threading.Event()
+        loops[0].call_soon_threadsafe(loop_ran.set)
+        assert loop_ran.wait(timeout=5)
+        return open_device(port)
+
+    monkeypatch.setattr(pool, "_open", open_while_loop_runs)
+    released = threading.Event()
+
+    def hold_port(reserved):
+        with pool.reserve(PORT):
+            reserved.set()
+            released.wait(timeout=10)
+
+    async def identify():
+        async with pool.acquire_async(PORT) as device:
+            return await device.get_indentification()
+
+    async def acquire_after_thread():
+        loops.append(asyncio.get_running_loop())
+        reserved = threading.Event()
+        thread = threading.Thread(target=hold_port, args=(reserved,))
+        thread.start()
+        reserved.wait()
+        waiter = asyncio.ensure_future(identify())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        # the release in the other thread wakes up the coroutine
+        released.set()
+        identification = await asyncio.wait_for(waiter, timeout=10)
+        thread.join()
+        return identification
+
+    assert "Simulated" in asyncio.run(acquire_after_thread())
+    pool.close_all()
+
+
+def test_scan_async_adaptive_sampling(monkeypatch):
+    # the currents of the bright cell converge before all samples are taken
+    port = "ASRL::SIMPV_BRIGHT::INSTR"
+    monkeypatch.setitem(block_support, port, True)
+    pool = DevicePool()
+    expected = SolarExperiment(pool=pool, show_progress=False)
+    expected.scan(port, 2.5, 2.55, 20, target_rel_err=0.05)
+    pool.close_all()
+
+    experiment = SolarExperiment(pool=DevicePool(), show_progress=False)
+    asyncio.run(experiment.scan_async(port, 2.5, 2.55, 20, target_rel_err=0.05))
+    np.testing.assert_array_equal(
+        experiment.statistics.counts, expected.statistics.counts
+    )
+    assert np.any(experiment.statistics.counts < 20)
+    np.testing.assert_array_equal(
+        experiment.results.to_array(), expected.results.to_array()
+    )
+
+
+@pytest.mark.parametrize(
+    "settings", [{"min_samples": 0}, {"target_rel_err": 0}, {"target_rel_err": -0.1}]
+)
+def test_invalid_adaptive_sampling_is_refused(settings):
+    settings = {"target_rel_err": 0.05, **settings}
+    experiment = SolarExperiment(show_progress=False)
+    with pytest.raises(ValueError):
+        experiment.scan(PORT, 0, 0.1, 10, **settings)
+    with pytest.raises(ValueError):
+        asyncio.run(experiment.scan_async(PORT, 0, 0.1, 10, **settings))
+    assert not experiment.is_scanning.is_set()
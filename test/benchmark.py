@@ -0,0 +1,260 @@
+"""Benchmarks of the scan throughput and the GUI refresh cost.
+
+All benchmarks use the simulated devices, so they can run anywhere. The results
+are written as JSON, compare two versions with:
+
+    python test/benchmark.py --output before.json
+    python test/benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from solar.controller.pool import DevicePool
+from solar.model.solar_experiment import SolarExperiment
+from solar.model.statistics import QUANTITIES
+from solar.sims import sim_pyvisa
+
+# the benchmarks run against the simulated devices
+os.environ.setdefault("SOLAR_SIMULATOR", "1")
+PORT = "ASRL::SIMPV::INSTR"
+
+TRANSPORTS = {
+    "instant": sim_pyvisa.TransportModel(),
+    "arduino_serial": sim_pyvisa.ARDUINO_SERIAL,
+}
+
+
+class CountingResource:
+    """Wraps a VISA resource and counts the commands sent to it."""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.commands = 0
+
+    def query(self, query):
+        self.commands += 1
+        return self.resource.query(query)
+
+    def write(self, command):
+        self.commands += 1
+        return self.resource.write(command)
+
+    def read(self):
+        return self.resource.read()
+
+    def close(self):
+        self.resource.close()
+
+
+def open_device(pool, mode):
+    """Open the simulated device with the given measure mode."""
+    with pool.acquire(PORT) as device:
+        device.measure_mode = mode
+        device.device = CountingResource(device.device)
+        return device
+
+
+def bench_scan(transport, mode, stop, sample_size):
+    """Throughput of SolarExperiment.scan."""
+    pool = DevicePool(transport)
+    device = open_device(pool, mode)
+    experiment = SolarExperiment(pool=pool, show_progress=False)
+
+    start = time.perf_counter()
+    experiment.scan(PORT, 0, stop, sample_size)
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+
+    setpoints = len(experiment.results)
+    return {
+        "seconds": elapsed,
+        "setpoints": setpoints,
+        "queries": device.device.commands,
+        "setpoints_per_s": setpoints / elapsed,
+        "queries_per_s": device.device.commands / elapsed,
+    }
+
+
+def bench_sample_overhead(mode, samples):
+    """Time per sample spent in ArduinoVISADevice on top of the simulator."""
+    pool = DevicePool(TRANSPORTS["instant"])
+    device = open_device(pool, mode)
+    simulator = device.device.resource
+
+    start = time.perf_counter()
+    device.get_input_values((1, 2), samples)
+    device_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simulator.read_input_values([1, 2], samples)
+    simulator_time = time.perf_counter() - start
+    pool.close_all()
+
+    return {
+        "device_us_per_sample": device_time / samples * 1e6,
+        "simulator_us_per_sample": simulator_time / samples * 1e6,
+        "overhead_us_per_sample": (device_time - simulator_time) / samples * 1e6,
+    }
+
+
+# Starts the window like gui.main, without showing it
+STARTUP_CODE = """
+from PySide6 import QtWidgets
+app = QtWidgets.QApplication([])
+from solar.controller.arduino_device import load_visa
+load_visa()
+from solar.view.gui import UserInterface
+ui = UserInterface()
+"""
+
+
+def bench_startup(repeat):
+    """Time to start Python, import the main window and build it."""
+    env = {**os.environ, "QT_QPA_PLATFORM": "offscreen"}
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", STARTUP_CODE], env=env, capture_output=True
+        )
+        if process.returncode:
+            return {"skipped": process.stderr.decode().strip().splitlines()[-1]}
+        best = min(best, time.perf_counter() - start)
+    return {"seconds": best}
+
+
+def fill_results(experiment, n_points):
+    """Fill the results of an experiment with synthetic points."""
+    rng = np.random.default_rng(0)
+    experiment.results.reset(n_points)
+    for setting in range(n_points):
+        quantities = dict(zip(QUANTITIES, rng.uniform(0.1, 1.0, len(QUANTITIES))))
+        experiment.results.append(setting, quantities)
+
+
+def bench_gui(point_counts, repeat):
+    """Cost of a redraw of the plots and of the csv export."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PySide6 import QtWidgets
+
+        from solar.view.gui import UserInterface, export_csv
+    except ImportError as err:
+        return {"skipped": str(err)}
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    ui = UserInterface()
+    ui.show()
+
+    results = {}
+    for n_points in point_counts:
+        fill_results(ui.experiment, n_points)
+        # the plots show the results delivered to the GUI thread
+        ui.bridge.results.reset()
+        ui.bridge.deliver()
+        timings = {}
+        for name, plot in (("plot", ui.plot), ("pr_plot", ui.pr_plot)):
+            best = float("inf")
+            for _ in range(repeat):
+                # force a redraw as if new results arrived
+                ui._plotted_version = None
+                start = time.perf_counter()
+                plot()
+                ui.plot_widget.grab()
+                best = min(best, time.perf_counter() - start)
+            timings[f"{name}_ms"] = best * 1e3
+
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            start = time.perf_counter()
+            export_csv(ui.experiment, os.path.join(directory, "export.csv"))
+            timings["export_ms"] = (time.perf_counter() - start) * 1e3
+            timings["export_peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        results[str(n_points)] = timings
+
+    ui.close()
+    app.processEvents()
+    return results
+
+
+def run(quick=False):
+    """Run all benchmarks.
+
+    Args:
+        quick (bool, optional): use smaller scans. Defaults to False.
+
+    Returns:
+        dict: the results
+    """
+    stop = 0.3 if quick else 3.3
+    sample_size = 5 if quick else 20
+    serial_stop = 0.02 if quick else 0.1
+
+    scans = {}
+    for mode in ("compound", "pipelined", "query"):
+        scans[f"instant/{mode}"] = bench_scan(
+            TRANSPORTS["instant"], mode, stop, sample_size
+        )
+        scans[f"arduino_serial/{mode}"] = bench_scan(
+            TRANSPORTS["arduino_serial"], mode, serial_stop, sample_size
+        )
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "quick": quick,
+        "scan": scans,
+        "sample_overhead": {
+            mode: bench_sample_overhead(mode, 1000 if quick else 10000)
+            for mode in ("compound", "pipelined", "query")
+        },
+        "gui": bench_gui([100, 1000] if quick else [100, 1000, 10000], repeat=3),
+        "startup": bench_startup(repeat=1 if quick else 3),
+    }
+
+
+def compare(new, old, path=""):
+    """Print the ratio new / old of every timing and rate in the results."""
+    for key, value in new.items():
+        name = f"{path}/{key}" if path else key
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            compare(value, old[key], name)
+        elif (
+            isinstance(value, float)
+            and isinstance(old.get(key), float)
+            and old[key] != 0
+        ):
+            print(f"{name}: {value:.4g} ({value / old[key]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark.json", help="JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    parser.add_argument("--quick", action="store_true", help="smaller scans")
+    args = parser.parse_args()
+
+    results = run(quick=args.quick)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+
+from solar.controller.pool import DevicePool  # noqa: E402
+from solar.controller.registry import DeviceRegistry  # noqa: E402
+from solar.model.solar_experiment import SolarExperiment  # noqa: E402
+from solar.view.bridge import DeviceListBridge, ScanBridge  # noqa: E402
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def wait_for(bridge, timeout=10):
+    """Run the Qt event loop until the scan of the bridge is finished."""
+    errors = []
+    bridge.finished.connect(errors.append)
+    deadline = time.monotonic() + timeout
+    while not errors and time.monotonic() < deadline:
+        QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 10)
+    assert errors, "scan did not finish"
+    return errors[0]
+
+
+def test_points_are_delivered_in_batches():
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    experiment = SolarExperiment(show_progress=False)
+    bridge = ScanBridge(experiment, max_rate=20)
+    batches = []
+    bridge.points_ready.connect(batches.append)
+
+    bridge.start(PORT, 0, 1.0, 5)
+    assert wait_for(bridge) == ""
+
+    np.testing.assert_array_equal(bridge.results.to_array(), experiment.results.to_array())
+    np.testing.assert_array_equal(np.concatenate(batches), experiment.results.to_array())
+    # the points are coalesced instead of sent one by one
+    assert len(batches) < len(experiment.results)
+
+    # a deleted bridge no longer listens to the executor
+    bridge.deleteLater()
+    QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+    assert experiment.executor.progress_callbacks == []
+    assert experiment.executor.finished_callbacks == []
+    assert app is not None
+
+
+def test_device_list_is_refreshed_periodically():
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    registry = DeviceRegistry(pool=DevicePool(), ttl=0.05, probe=False)
+    bridge = DeviceListBridge(registry)
+    lists = []
+    bridge.devices_changed.connect(lists.append)
+
+    # nobody asks for the devices, the bridge refreshes the registry by itself
+    deadline = time.monotonic() + 10
+    while not lists and time.monotonic() < deadline:
+        QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 10)
+    assert PORT in [device.port for device in lists[0]]
+    assert bridge.devices() == lists[0]
+    assert app is not None
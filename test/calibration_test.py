@@ -0,0 +1,69 @@
+import numpy as np
+
+from solar.controller.arduino_device import ArduinoVISADevice
+from solar.controller.calibration import (
+    IDEAL_CALIBRATION,
+    DeviceCalibration,
+    calibration_for,
+    load_calibrations,
+    save_calibrations,
+)
+from solar.controller.pool import DevicePool
+from solar.model.solar_experiment import SolarExperiment
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_ideal_conversion_is_unchanged():
+    calibration = DeviceCalibration()
+    values = np.arange(1024)
+    np.testing.assert_array_equal(calibration.to_voltages(values), values * (3.3 / 1023))
+    for value in (0, 1, 511, 1023):
+        assert calibration.output_value(value / 1023 * 3.3) == value
+    assert calibration.output_value(10.0) == 1023
+
+
+def test_gain_offset_and_inl_tables():
+    inl = np.zeros(1024)
+    inl[100] = 0.5
+    calibration = DeviceCalibration(
+        input_gain=1.01, input_offset=0.02, input_inl=inl, output_gain=0.98
+    )
+    assert not calibration.is_ideal
+    assert calibration.value_lut is calibration.input_values
+    assert IDEAL_CALIBRATION.value_lut is None
+    expected = (np.array([99, 100]) + [0, 0.5]) * (3.3 / 1023) * 1.01 + 0.02
+    np.testing.assert_allclose(calibration.to_voltages(np.array([99, 100])), expected)
+
+    # the output value is the inverse of the output voltage
+    values = np.array([0, 10, 500, 1023])
+    np.testing.assert_array_equal(
+        calibration.output_value(calibration.output_voltage(values)), values
+    )
+
+
+def test_calibrations_are_stored_per_port(tmp_path, monkeypatch):
+    path = tmp_path / "calibration.json"
+    save_calibrations({PORT: DeviceCalibration(input_gain=1.1)}, path)
+    assert load_calibrations(path)[PORT].input_gain == 1.1
+    assert calibration_for("other", path).is_ideal
+
+    monkeypatch.setenv("SOLAR_CALIBRATION", str(path))
+    device = ArduinoVISADevice(PORT)
+    assert device.calibration.input_gain == 1.1
+    device.close_device()
+
+
+def test_scan_uses_device_calibration():
+    pool = DevicePool()
+    with pool.acquire(PORT) as device:
+        ideal = device.calibration
+        device.calibration = DeviceCalibration(input_gain=1.1, input_offset=0.01)
+    experiment = SolarExperiment(pool=pool, show_progress=False)
+    experiment.scan(PORT, 0.5, 0.55, 3)
+    raw = experiment.statistics.raw
+
+    pv_voltages = ideal.to_voltages(raw[..., 0]).mean(axis=1) * 3
+    # the offset is added before the 3:1 divider is taken into account
+    np.testing.assert_allclose(experiment.pv_voltages, pv_voltages * 1.1 + 0.01 * 3)
+    pool.close_all()
@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from solar.model.archive import ScanArchive
+from solar.model.campaign import Campaign, CampaignScan, load_campaign, run_campaign
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def write_campaign(path, **settings):
+    path.write_text(json.dumps(settings))
+    return path
+
+
+def test_load_campaign_uses_defaults(tmp_path):
+    path = write_campaign(
+        tmp_path / "campaign.json",
+        repetitions=3,
+        sample_size=4,
+        scans=[
+            {"port": PORT, "start": 0, "stop": 1},
+            {"port": PORT, "start": 0, "stop": 2, "sample_size": 2},
+        ],
+    )
+    campaign = load_campaign(path)
+    assert campaign.scans == [
+        CampaignScan(PORT, 0, 1, 4),
+        CampaignScan(PORT, 0, 2, 2),
+    ]
+    assert (campaign.repetitions, campaign.interval) == (3, 0.0)
+    assert campaign.archive == str(tmp_path / "scans")
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"scans": []},
+        {"scans": [{"port": PORT, "start": 0, "stop": 1}]},
+        {"sample_size": 2, "scans": [{"port": PORT, "start": 0, "stop": 1, "x": 1}]},
+        {"colour": "red", "scans": [{"port": PORT, "start": 0, "stop": 1}]},
+    ],
+)
+def test_invalid_campaigns(tmp_path, settings):
+    with pytest.raises(ValueError):
+        load_campaign(write_campaign(tmp_path / "campaign.json", **settings))
+
+
+def test_campaign_stores_every_round(tmp_path):
+    campaign = Campaign(
+        [CampaignScan(PORT, 0, 0.2, 2), CampaignScan("ASRL::NONE::INSTR", 0, 0.2, 2)],
+        repetitions=2,
+        archive=str(tmp_path),
+    )
+    events = []
+    assert run_campaign(campaign, events.append, progress_interval=0) == 2
+
+    scans = ScanArchive(tmp_path).refresh()
+    assert len(scans) == 2
+    assert all(scan.complete and scan.n_setpoints > 0 for scan in scans)
+    kinds = [event["event"] for event in events]
+    assert kinds.count("scan_finished") == 2
+    assert kinds.count("scan_failed") == 2
+    assert kinds[-1] == "campaign_finished"
+    last_progress = [event for event in events if event["event"] == "progress"][-1]
+    assert last_progress["done"] == last_progress["total"] == scans[-1].n_setpoints
+
+
+def test_cli_prints_json_without_qt(tmp_path):
+    path = write_campaign(
+        tmp_path / "campaign.json",
+        sample_size=2,
+        scans=[{"port": PORT, "start": 0, "stop": 0.1}],
+    )
+    code = (
+        "import sys; from solar.cli import main; code = main(sys.argv[1:]); "
+        "assert not any(name.startswith('PySide6') for name in sys.modules); "
+        "sys.exit(code)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code, str(path)], capture_output=True, text=True
+    )
+    assert output.returncode == 0, output.stderr
+    events = [json.loads(line) for line in output.stdout.splitlines()]
+    assert events[-1] == {**events[-1], "event": "campaign_finished", "failed": 0}
+    assert len(ScanArchive(tmp_path / "scans").refresh()) == 1
@@ -0,0 +1,4 @@
+import os
+
+# the tests run against the simulated devices
+os.environ.setdefault("SOLAR_SIMULATOR", "1")
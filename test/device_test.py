@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+import pytest
+from pyvisa import errors
+
+from solar.controller import arduino_device
+from solar.controller.arduino_device import ArduinoVISADevice, load_visa
+from solar.sims.sim_pyvisa import SimulatedDevice, TransportModel
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def measure(mode):
+    device = ArduinoVISADevice(PORT)
+    device.measure_mode = mode
+    device.set_output_value(700)
+    values = device.get_input_values((1, 2), samples=10)
+    device.close_device()
+    return values
+
+
+def test_simulator_must_be_enabled(monkeypatch):
+    monkeypatch.delenv("SOLAR_SIMULATOR")
+    assert load_visa().__name__ == "pyvisa"
+    assert load_visa(simulator=True).__name__ == "solar.sims.sim_pyvisa"
+
+
+def test_compound_mode_is_detected_once(monkeypatch):
+    monkeypatch.setattr(arduino_device, "block_support", {})
+    device = ArduinoVISADevice(PORT)
+    device.get_input_values((1,))
+    assert device.measure_mode == "compound"
+
+    # a reopened device does not probe the firmware again
+    device = ArduinoVISADevice(PORT)
+    queries = []
+    device.query = lambda query: queries.append(query) or "1,2"
+    device.get_input_values((1, 2))
+    assert device.measure_mode == "compound"
+    assert queries == ["MEAS:BLK? 1,1,2"]
+
+
+@pytest.mark.parametrize("mode", ["compound", "pipelined"])
+def test_batched_modes_match_single_queries(mode):
+    expected = measure("query")
+    assert expected.shape == (10, 2)
+    np.testing.assert_array_equal(measure(mode), expected)
+
+
+class LoseThirdResponse(TransportModel):
+    """An instant transport that loses only the third response."""
+
+    def __init__(self):
+        super().__init__(timeout=0)
+        self.responses = 0
+
+    def is_lost(self):
+        self.responses += 1
+        return self.responses == 3
+
+
+def test_pipelined_mode_recovers_from_a_lost_response():
+    device = ArduinoVISADevice(PORT, transport=LoseThirdResponse())
+    device.measure_mode = "pipelined"
+    device.set_output_value(700)
+    with pytest.raises(errors.VisaIOError):
+        device.get_input_values((1, 2), samples=10)
+    values = device.get_input_values((1, 2), samples=10)
+    device.close_device()
+
+    # the failed chunk used the first three samples of the recording
+    expected = ArduinoVISADevice(PORT)
+    expected.measure_mode = "query"
+    expected.set_output_value(700)
+    expected.get_input_values((1, 2), samples=3)
+    np.testing.assert_array_equal(values, expected.get_input_values((1, 2), 10))
+    expected.close_device()
+
+
+def test_simulator_bulk_read_matches_queries():
+    single = SimulatedDevice("pv", "sim_pv.json.gz")
+    bulk = SimulatedDevice("pv", "sim_pv.json.gz")
+    single.query("OUT:CH0 600")
+    bulk.query("OUT:CH0 600")
+
+    # more samples than recorded, so the playback wraps around
+    expected = [
+        [int(single.query(f"MEAS:CH{channel}?")) for channel in (1, 2)]
+        for _ in range(150)
+    ]
+    np.testing.assert_array_equal(bulk.read_input_values([1, 2], 150), expected)
+
+
+def test_transport_latency_is_paid_once_when_pipelined():
+    transport = TransportModel(latency=0.01)
+    device = SimulatedDevice("pv", "sim_pv.json.gz", transport=transport)
+
+    start = time.perf_counter()
+    for _ in range(5):
+        device.query("MEAS:CH1?")
+    queries = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(5):
+        device.write("MEAS:CH1?")
+    for _ in range(5):
+        device.read()
+    pipelined = time.perf_counter() - start
+
+    assert queries >= 0.05
+    assert pipelined < 0.03
+
+
+def test_transport_timeouts_and_noise():
+    transport = TransportModel(timeout_probability=1, timeout=0, noise=50, seed=1)
+    device = SimulatedDevice("pv", "sim_pv.json.gz", transport=transport)
+    with pytest.raises(errors.VisaIOError):
+        device.query("MEAS:CH1?")
+
+    exact = SimulatedDevice("pv", "sim_pv.json.gz")
+    noisy = device.read_input_values([1, 2], 100)
+    assert np.any(noisy != exact.read_input_values([1, 2], 100))
+    assert noisy.min() >= 0 and noisy.max() <= 1023
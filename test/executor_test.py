@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from solar.model.solar_experiment import SolarExperiment
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_scan_reports_progress():
+    experiment = SolarExperiment()
+    progress = []
+    experiment.executor.progress_callbacks.append(
+        lambda done, total, point: progress.append((done, total))
+    )
+    experiment.start_scan(PORT, 0, 0.1, 2)
+    assert experiment.executor.wait(timeout=10)
+    assert progress[-1] == (32, 32)
+    assert experiment.executor.error is None
+    assert not experiment.is_scanning.is_set()
+
+
+def test_only_one_scan_at_a_time():
+    experiment = SolarExperiment()
+    experiment.start_scan(PORT, 0, 3.3, 2)
+    experiment.executor.pause()
+    with pytest.raises(RuntimeError):
+        experiment.start_scan(PORT, 0, 3.3, 2)
+    experiment.executor.cancel()
+    assert experiment.executor.wait(timeout=10)
+
+
+def test_no_second_scan_while_scanning():
+    experiment = SolarExperiment()
+    experiment.start_scan(PORT, 0, 3.3, 2)
+    experiment.executor.pause()
+    with pytest.raises(RuntimeError):
+        experiment.scan("ASRL::SIMLED::INSTR", 0, 0.1, 2)
+    with pytest.raises(RuntimeError):
+        next(experiment.iter_scan(PORT, 0, 0.1, 2))
+    with pytest.raises(RuntimeError):
+        experiment.track_mpp(PORT, 0, 0.1, 2)
+
+    async def ascan():
+        async for _ in experiment.ascan(PORT, 0, 0.1, 2):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ascan())
+    with pytest.raises(RuntimeError):
+        asyncio.run(experiment.scan_async(PORT, 0, 0.1, 2))
+
+    # the refused scans leave the running scan alone
+    assert experiment.is_scanning.is_set()
+    experiment.executor.resume()
+    assert experiment.executor.wait(timeout=30)
+    assert experiment.executor.error is None
+    assert len(experiment.results) == experiment.results.capacity
+    assert not experiment.is_scanning.is_set()
+
+
+def test_pause_resume_and_cancel():
+    experiment = SolarExperiment()
+    executor = experiment.executor
+    executor.start(PORT, 0, 3.3, 2)
+    executor.pause()
+    time.sleep(0.05)
+    assert executor.is_paused()
+    paused_at = len(experiment.results)
+    time.sleep(0.05)
+    assert len(experiment.results) == paused_at
+
+    executor.resume()
+    executor.cancel()
+    assert executor.wait(timeout=10)
+    assert len(experiment.results) < 1024
+    assert not experiment.is_scanning.is_set()
+
+
+def test_error_is_kept():
+    experiment = SolarExperiment()
+    experiment.start_scan("ASRL::NOT_THERE::INSTR", 0, 0.1, 2)
+    assert experiment.executor.wait(timeout=10)
+    assert experiment.executor.error is not None
+    assert not experiment.is_scanning.is_set()
+
+
+def test_no_scan_while_a_coroutine_scans():
+    experiment = SolarExperiment()
+
+    async def scan_and_start():
+        scan = asyncio.ensure_future(experiment.scan_async(PORT, 0, 0.1, 2))
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            experiment.start_scan(PORT, 0, 0.1, 2)
+        await scan
+
+    asyncio.run(scan_and_start())
+    assert not experiment.executor.is_running()
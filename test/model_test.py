@@ -2,7 +2,7 @@ from solar.model.solar_experiment import SolarExperiment
 import matplotlib.pyplot as plt
 
 experiment = SolarExperiment()
-experiment.scan(port="ASRL::SIMPV_BRIGHT::INSTR")
+experiment.scan(port="ASRL::SIMPV_BRIGHT::INSTR", start=0, stop=3.3, sample_size=5)
 
 U_data = experiment.pv_voltages
 I_data = experiment.currents
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from solar.controller.pool import DevicePool
+from solar.model.mppt import find_maximum, golden_section_search
+from solar.model.solar_experiment import SolarExperiment
+from solar.model.statistics import Calibration
+
+
+def test_golden_section_finds_integer_maximum():
+    def f(x):
+        return -((x - 317) ** 2)
+
+    assert golden_section_search(f, 0, 1023) == 317
+    assert find_maximum(f, 0, 1023) == 317
+
+
+def test_mpp_close_to_full_scan():
+    port = "ASRL::SIMPV_BRIGHT::INSTR"
+    experiment = SolarExperiment()
+    experiment.scan(port, 0, 3.3, 20)
+    full_max = np.argmax(experiment.pv_powers)
+    full_setting = experiment.results.view("setting")[full_max]
+
+    mpp = experiment.track_mpp(port, 0, 3.3, 20)
+    assert len(experiment.results) <= 1024 / 10
+    assert abs(mpp.setting - full_setting) <= 20
+    assert mpp.power == experiment.p_max
+
+    # the tracked setpoints keep their raw counts
+    currents = experiment.currents.copy()
+    experiment.recalibrate(Calibration(shunt_resistance=2 * 4.7))
+    np.testing.assert_allclose(experiment.currents, currents / 2)
+
+
+
+def test_golden_section_measures_once_per_step():
+    for maximum in (0, 12, 317, 500, 1023):
+        measured = set()
+
+        def f(x):
+            measured.add(x)
+            return -((x - maximum) ** 2)
+
+        assert golden_section_search(f, 0, 1023) == maximum
+        # one value per step and the last few values, two values per step
+        # took up to 23
+        assert len(measured) <= 17
+
+
+def test_empty_range_is_refused():
+    with pytest.raises(ValueError, match="start must not exceed stop"):
+        find_maximum(lambda x: x, 10, 5)
+
+    pool = DevicePool()
+    experiment = SolarExperiment(pool=pool, show_progress=False)
+    with pool.acquire("ASRL::SIMPV::INSTR"):
+        pass
+    with pytest.raises(ValueError, match="start must not exceed stop"):
+        experiment.track_mpp("ASRL::SIMPV::INSTR", 0.2, 0.1, 3)
+    assert pool.is_open("ASRL::SIMPV::INSTR")
+    pool.close_all()
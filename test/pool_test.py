@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from pyvisa import constants, errors
+
+from solar.controller.pool import DevicePool
+from solar.model.solar_experiment import SolarExperiment
+from solar.sims.sim_pyvisa import TransportModel
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_device_is_reused():
+    pool = DevicePool()
+    with pool.acquire(PORT) as first:
+        pass
+    with pool.acquire(PORT) as second:
+        pass
+    assert first is second
+    pool.close_all()
+    assert not pool.is_open(PORT)
+
+
+def test_devices_use_the_transport_of_the_pool():
+    transport = TransportModel(latency=0.01)
+    pool = DevicePool(transport)
+    with pool.acquire(PORT) as device:
+        assert device.device.transport is transport
+    pool.close_all()
+
+
+def test_broken_device_is_discarded():
+    pool = DevicePool()
+    with pytest.raises(errors.VisaIOError):
+        with pool.acquire(PORT):
+            raise errors.VisaIOError(constants.StatusCode.error_timeout)
+    assert not pool.is_open(PORT)
+    pool.close_all()
+
+
+def test_other_errors_keep_the_device():
+    pool = DevicePool()
+    with pytest.raises(ValueError):
+        with pool.acquire(PORT) as first:
+            raise ValueError("not a valid setting")
+    with pool.acquire(PORT) as second:
+        assert second is first
+    pool.close_all()
+
+
+def test_port_is_not_shared_within_a_thread():
+    pool = DevicePool()
+    first = SolarExperiment(pool=pool, show_progress=False)
+    second = SolarExperiment(pool=pool, show_progress=False)
+    points = first.iter_scan(PORT, 0, 0.1, 2)
+    next(points)
+    with pytest.raises(RuntimeError):
+        next(second.iter_scan(PORT, 0, 0.1, 2))
+    points.close()
+
+    async def acquire_in_loop():
+        async with pool.acquire_async(PORT):
+            with pytest.raises(RuntimeError):
+                with pool.acquire(PORT):
+                    pass
+
+    asyncio.run(acquire_in_loop())
+    with pool.acquire(PORT):
+        pass
+    pool.close_all()
+
+
+def test_experiment_keeps_device_open():
+    pool = DevicePool()
+    experiment = SolarExperiment(pool=pool)
+    assert "Simulated" in experiment.get_identification(PORT)
+    experiment.scan(PORT, 0, 0.05, 2)
+    assert pool.is_open(PORT)
+    assert len(experiment.pv_voltages) == 17
+    experiment.close(PORT)
+    assert not pool.is_open(PORT)
+    pool.close_all()
@@ -4,5 +4,5 @@ import matplotlib.pyplot as plt
 print(list_devices())
 experiment = SolarExperiment()
 
-experiment.scan("ASRL::SIMPV::INSTR")
+experiment.scan("ASRL::SIMPV::INSTR", 0, 3.3, 5)
 plt.plot(experiment.pv_voltages, experiment.currents, ".")
@@ -0,0 +1,75 @@
+from solar.controller.pool import DevicePool
+from solar.controller.registry import DeviceRegistry
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_devices_are_listed_in_the_background():
+    registry = DeviceRegistry(pool=DevicePool())
+    updates = []
+    registry.listeners.append(updates.append)
+
+    # nothing is known yet, the first call starts the refresh
+    assert registry.devices() == []
+    assert registry.wait(timeout=10)
+
+    devices = {device.port: device for device in registry.devices()}
+    assert "Simulated" in devices[PORT].identification
+    assert len(updates) == 1
+
+    # a refresh without changes doesn't call the listeners
+    registry.refresh()
+    assert registry.wait(timeout=10)
+    assert len(updates) == 1
+
+
+def test_open_devices_are_not_probed():
+    pool = DevicePool()
+    registry = DeviceRegistry(pool=pool, ttl=0)
+    with pool.acquire(PORT):
+        registry.refresh()
+        assert registry.wait(timeout=10)
+    devices = {device.port: device for device in registry.devices()}
+    assert devices[PORT].identification is None
+
+    # the list is too old, so it is refreshed and the closed device is probed
+    pool.close(PORT)
+    registry.devices()
+    assert registry.wait(timeout=10)
+    devices = {device.port: device for device in registry.devices()}
+    assert devices[PORT].identification is not None
+
+
+def test_devices_are_probed_once():
+    pool = DevicePool()
+    registry = DeviceRegistry(pool=pool, ttl=0)
+    registry.refresh()
+    assert registry.wait(timeout=10)
+
+    opened = []
+    resource_manager = pool.resource_manager
+    open_resource = resource_manager.open_resource
+    resource_manager.open_resource = lambda port, **kwargs: (
+        opened.append(port) or open_resource(port, **kwargs)
+    )
+    registry.refresh()
+    assert registry.wait(timeout=10)
+    assert opened == []
+    devices = {device.port: device for device in registry.devices()}
+    assert "Simulated" in devices[PORT].identification
+
+
+def test_failed_listing_keeps_the_devices():
+    pool = DevicePool()
+    registry = DeviceRegistry(pool=pool)
+    registry.refresh()
+    assert registry.wait(timeout=10)
+    devices = registry.devices()
+
+    def list_resources():
+        raise OSError("no backend")
+
+    pool.resource_manager.list_resources = list_resources
+    registry.refresh()
+    assert registry.wait(timeout=10)
+    assert registry.devices() == devices
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyqtgraph")
+
+from solar.view.rendering import error_bar_stride, visible_indices  # noqa: E402
+
+
+def test_small_curves_are_drawn_completely():
+    x = np.linspace(0, 1, 50)
+    np.testing.assert_array_equal(visible_indices(x, x), np.arange(50))
+
+
+def test_zoom_keeps_visible_points_and_their_neighbours():
+    x = np.linspace(0, 1, 101)
+    indices = visible_indices(x, x, x_range=(0.5, 0.6))
+    np.testing.assert_array_equal(indices, np.arange(49, 62))
+
+
+def test_downsampling_keeps_peaks():
+    rng = np.random.default_rng(0)
+    x = np.arange(100_000.0)
+    y = rng.normal(size=len(x))
+    y[12_345] = 100
+    y[54_321] = -100
+
+    indices = visible_indices(x, y, max_points=1000)
+    assert len(indices) <= 1000
+    assert np.all(np.diff(indices) > 0)
+    assert 12_345 in indices and 54_321 in indices
+
+
+def test_error_bars_are_decimated():
+    assert error_bar_stride(100, max_bars=200) == 1
+    assert error_bar_stride(1000, max_bars=200) == 5
@@ -0,0 +1,79 @@
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from solar.model.results import ScanResults
+from solar.model.statistics import QUANTITIES
+
+
+def quantities(value):
+    return {name: value for name in QUANTITIES}
+
+
+def test_views_cover_filled_prefix():
+    results = ScanResults(4)
+    results.append(10, quantities(1.0))
+    results.append(11, quantities(2.0))
+
+    assert len(results) == 2
+    np.testing.assert_array_equal(results.view("setting"), [10, 11])
+    np.testing.assert_array_equal(results.view("currents"), [1.0, 2.0])
+    with pytest.raises(ValueError):
+        results.view("currents")[0] = 5.0
+
+
+def test_version_changes_with_data():
+    results = ScanResults(1)
+    version = results.version
+    results.append(0, quantities(1.0))
+    assert results.version > version
+
+    version, columns = results.snapshot()
+    assert results.version == version
+    assert {len(column) for column in columns.values()} == {1}
+
+    results.reset()
+    assert results.version > version
+    assert len(results.view("fet_R")) == 0
+
+
+def test_store_grows_beyond_capacity():
+    results = ScanResults(1)
+    old_view = None
+    for value in range(40):
+        results.append(value, quantities(float(value)))
+        if value == 0:
+            old_view = results.view("pv_powers")
+
+    np.testing.assert_array_equal(results.view("setting"), np.arange(40))
+    np.testing.assert_array_equal(old_view, [0.0])
+
+
+def test_snapshot_during_resets():
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    results = ScanResults()
+    stop = threading.Event()
+
+    def scan():
+        while not stop.is_set():
+            results.reset()
+            for value in range(1, 50):
+                results.append(value, quantities(float(value)))
+
+    writer = threading.Thread(target=scan)
+    writer.start()
+    try:
+        for _ in range(2000):
+            _, columns = results.snapshot()
+            # every snapshot row was completely written by the same scan
+            np.testing.assert_array_equal(
+                columns["setting"], np.arange(1, len(columns["setting"]) + 1)
+            )
+            np.testing.assert_array_equal(columns["currents"], columns["setting"])
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(switch_interval)
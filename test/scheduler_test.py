@@ -0,0 +1,36 @@
+import pytest
+
+from solar.model.archive import port_slug
+from solar.model.scheduler import MultiDeviceScheduler
+from solar.model.storage import load_scan
+
+PORTS = ["ASRL::SIMPV::INSTR", "ASRL::SIMPV_BRIGHT::INSTR"]
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_all_devices_are_scanned(use_processes):
+    scheduler = MultiDeviceScheduler(PORTS, use_processes=use_processes)
+    scans = scheduler.run(0, 0.1, 2)
+
+    assert list(scans) == PORTS
+    for port, scan in scans.items():
+        assert scan.port == port
+        assert scan.error is None
+        assert len(scan.results) == 32
+        assert scan.p_max == scan.results["pv_powers"].max()
+
+
+def test_failing_device_does_not_stop_others():
+    scans = MultiDeviceScheduler(PORTS + ["ASRL::NOT_THERE::INSTR"]).run(0, 0.1, 2)
+    assert scans["ASRL::NOT_THERE::INSTR"].error is not None
+    assert len(scans["ASRL::NOT_THERE::INSTR"].results) == 0
+    assert scans[PORTS[0]].error is None
+
+
+def test_every_device_is_stored_in_its_own_directory(tmp_path):
+    scans = MultiDeviceScheduler(PORTS).run(0, 0.1, 2, path=tmp_path)
+    for port, scan in scans.items():
+        assert scan.error is None
+        stored = load_scan(tmp_path / port_slug(port))
+        assert stored.metadata["port"] == port
+        assert len(stored.results) == 32
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("pyqtgraph")
+
+# Libraries that are only needed after the window is shown
+LAZY_MODULES = ["pandas", "rich", "pyvisa", "solar.sims.sim_pyvisa"]
+# Libraries of the GUI
+GUI_MODULES = ["PySide6", "pyqtgraph", "pandas"]
+
+
+def imported_modules(module):
+    """Import a module in a new interpreter and list the modules it loaded."""
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return set(output.split())
+
+
+@pytest.mark.parametrize("module", ["solar.view.gui", "solar.view.gui_V2"])
+def test_gui_does_not_import_lazy_modules(module):
+    modules = imported_modules(module)
+    assert modules.isdisjoint(LAZY_MODULES), modules.intersection(LAZY_MODULES)
+
+
+def test_launcher_only_imports_qt():
+    modules = imported_modules("solar.view.launcher")
+    assert "PySide6" in modules
+    assert modules.isdisjoint(["pyqtgraph", "pandas", "solar.view.gui"])
+
+
+def test_cli_does_not_import_the_gui():
+    modules = imported_modules("solar.cli")
+    assert modules.isdisjoint(GUI_MODULES), modules.intersection(GUI_MODULES)
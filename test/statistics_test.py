@@ -0,0 +1,115 @@
+import numpy as np
+
+from solar.model.statistics import (
+    Calibration,
+    RunningStats,
+    ScanStatistics,
+    propagate_errors,
+    sample_means,
+)
+
+
+def reference(pv_volt, I_volt):
+    """The per-setpoint calculation as it used to be done in the scan loop."""
+    n = len(pv_volt)
+    pv_err = np.std(pv_volt) / np.sqrt(n)
+    I_err = np.std(I_volt) / np.sqrt(n)
+    fet = np.mean(pv_volt) - np.mean(I_volt)
+    fet_err = (pv_err**2 + I_err**2) ** 0.5
+    current = np.mean(I_volt) / 4.7
+    current_err = I_err / 4.7
+    power = np.mean(pv_volt) * current
+    power_err = (
+        (current * pv_err) ** 2 + (np.mean(pv_volt) * current_err) ** 2
+    ) ** 0.5
+    fet_R = fet / current
+    fet_R_err = (
+        (fet_err / current) ** 2
+        + (fet * np.log(current + 0.000001) * current_err) ** 2
+    ) ** 0.5
+    return [
+        np.mean(pv_volt), pv_err, np.mean(I_volt), I_err, fet, fet_err,
+        current, current_err, power, power_err, fet_R, fet_R_err,
+    ]
+
+
+def derive_quantities(samples, counts=None, shunt_resistance=4.7):
+    """The quantities of voltage samples, without a conversion of counts."""
+    return propagate_errors(*sample_means(samples, counts), shunt_resistance)
+
+
+def test_batched_matches_reference():
+    rng = np.random.default_rng(1)
+    stats = ScanStatistics(20, 7)
+    stats.raw[:] = rng.integers(30, 1000, size=stats.raw.shape)
+
+    batched = stats.compute()
+    for row in range(stats.n_setpoints):
+        expected = reference(stats.samples[row, :, 0], stats.samples[row, :, 1])
+        np.testing.assert_allclose(
+            [batched[name][row] for name in batched], expected
+        )
+        np.testing.assert_allclose(list(stats.add_row(row).values()), expected)
+
+
+def test_zero_current_gives_infinite_resistance():
+    samples = np.zeros((1, 3, 2))
+    samples[..., 0] = 1.0
+    quantities = derive_quantities(samples)
+    assert np.isinf(quantities["fet_R"][0])
+
+
+def test_running_stats_match_numpy():
+    rng = np.random.default_rng(2)
+    samples = rng.normal(1.0, 0.1, size=(25, 2))
+    running = RunningStats()
+    running.update(samples[:3])
+    for sample in samples[3:]:
+        running.update(sample[np.newaxis])
+
+    np.testing.assert_allclose(running.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(
+        running.std_err, samples.std(axis=0) / np.sqrt(len(samples))
+    )
+    assert running.converged(0.1)
+    assert not running.converged(0.001)
+
+
+def test_identical_counts_are_not_converged():
+    running = RunningStats()
+    running.update(np.array([[500, 3], [500, 3]]))
+    assert np.all(running.std_err == 0)
+    # the rounding of the ADC limits the precision of the means
+    assert not running.converged(0.01)
+    assert running.converged(0.1)
+    running.update(np.full((998, 2), [500, 3]))
+    assert running.converged(0.01)
+
+
+def test_batched_with_early_stopped_rows():
+    rng = np.random.default_rng(3)
+    stats = ScanStatistics(5, 8)
+    stats.raw[:] = rng.integers(30, 1000, size=stats.raw.shape)
+    stats.counts[:] = [8, 2, 5, 3, 8]
+
+    batched = stats.compute()
+    for row, count in enumerate(stats.counts):
+        expected = derive_quantities(stats.samples[row, :count])
+        for name, values in batched.items():
+            np.testing.assert_allclose(values[row], expected[name])
+
+
+def test_recalibration_matches_converted_samples():
+    rng = np.random.default_rng(4)
+    stats = ScanStatistics(10, 6)
+    stats.raw[:] = rng.integers(30, 1000, size=stats.raw.shape)
+    calibration = Calibration(adc_reference=5.0, shunt_resistance=10.0)
+
+    recomputed = stats.compute(calibration=calibration)
+    voltages = stats.raw * (5.0 / 1023)
+    voltages[..., 0] *= 3
+    expected = derive_quantities(voltages, shunt_resistance=10.0)
+    for name, values in recomputed.items():
+        np.testing.assert_allclose(values, expected[name])
+    # the default calibration of the statistics is not changed
+    np.testing.assert_allclose(stats.samples[..., 1], stats.raw[..., 1] * 3.3 / 1023)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from solar.controller.pool import DevicePool
+from solar.model.solar_experiment import SolarExperiment
+from solar.model.storage import load_scan
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_scan_is_stored_while_scanning(tmp_path):
+    path = tmp_path / "scan"
+    experiment = SolarExperiment()
+    for point in experiment.iter_scan(PORT, 0, 0.1, 4, path=path):
+        # every finished setpoint is already on disk
+        assert len(load_scan(path).results) == len(experiment.results)
+        assert not load_scan(path).metadata["complete"]
+
+    scan = load_scan(path)
+    assert scan.metadata["complete"]
+    assert scan.metadata["port"] == PORT
+    assert scan.metadata["p_max"] == experiment.p_max
+    assert isinstance(scan.results, np.memmap)
+    np.testing.assert_array_equal(scan.results, experiment.results.to_array())
+    np.testing.assert_array_equal(scan.samples["samples"], experiment.statistics.raw)
+    assert np.all(scan.samples["count"] == 4)
+
+
+def test_reversed_range_is_an_empty_scan(tmp_path):
+    path = tmp_path / "scan"
+    experiment = SolarExperiment(show_progress=False)
+    experiment.scan(PORT, 0.2, 0.1, 4, path=path)
+    assert len(experiment.results) == 0
+    assert experiment.p_max == 0
+
+    scan = load_scan(path)
+    assert scan.metadata["complete"]
+    assert len(scan.results) == 0
+
+
+def test_incomplete_setpoint_is_ignored(tmp_path):
+    path = tmp_path / "scan"
+    SolarExperiment().scan(PORT, 0, 0.1, 2, path=path)
+    with open(path / "results.bin", "ab") as file:
+        # a setpoint that was being written during a crash
+        file.write(b"\0" * 10)
+
+    scan = load_scan(path, mmap=False)
+    assert len(scan.results) == 32
+    assert len(scan.samples) == 32
+
+
+def test_stopped_scans_are_not_complete(tmp_path):
+    experiment = SolarExperiment(show_progress=False)
+    points = experiment.iter_scan(PORT, 0, 0.1, 2, path=tmp_path / "cancelled")
+    next(points)
+    points.close()
+    metadata = load_scan(tmp_path / "cancelled").metadata
+    assert not metadata["complete"]
+    assert metadata["p_max"] is None
+    assert metadata["error"] == "cancelled"
+
+    def fail(*args):
+        raise OSError("device lost")
+
+    experiment = SolarExperiment(pool=DevicePool(), show_progress=False)
+    with experiment.pool.acquire(PORT) as device:
+        device.get_input_values = fail
+    with pytest.raises(OSError):
+        experiment.scan(PORT, 0, 0.1, 2, path=tmp_path / "failed")
+    metadata = load_scan(tmp_path / "failed").metadata
+    assert not metadata["complete"]
+    assert metadata["p_max"] is None
+    assert metadata["error"] == "device lost"
@@ -0,0 +1,42 @@
+import asyncio
+
+from solar.model.results import ScanPoint
+from solar.model.solar_experiment import SolarExperiment
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_iter_scan_yields_every_setpoint():
+    experiment = SolarExperiment()
+    points = list(experiment.iter_scan(PORT, 0, 0.1, 3))
+
+    assert len(points) == 32
+    assert all(isinstance(point, ScanPoint) for point in points)
+    assert [point.setting for point in points] == list(range(32))
+    assert points[-1].current == experiment.currents[-1]
+    assert not experiment.is_scanning.is_set()
+
+
+def test_iter_scan_stops_when_consumer_stops():
+    experiment = SolarExperiment()
+    for point in experiment.iter_scan(PORT, 0, 3.3, 3):
+        if point.setting == 4:
+            break
+    assert len(experiment.results) == 5
+    assert not experiment.is_scanning.is_set()
+
+
+def test_ascan_yields_every_setpoint():
+    async def consume(experiment, stop_at=None):
+        settings = []
+        async for point in experiment.ascan(PORT, 0, 0.1, 3, buffer=2):
+            settings.append(point.setting)
+            if point.setting == stop_at:
+                break
+        return settings
+
+    experiment = SolarExperiment()
+    assert asyncio.run(consume(experiment)) == list(range(32))
+    assert asyncio.run(consume(experiment, stop_at=3)) == list(range(4))
+    assert len(experiment.results) <= 4 + 2 + 1
+    assert not experiment.is_scanning.is_set()
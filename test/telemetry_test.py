@@ -0,0 +1,41 @@
+import math
+
+from solar.controller.pool import DevicePool
+from solar.controller.telemetry import LatencyHistogram, Telemetry
+from solar.model.solar_experiment import SolarExperiment
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    histogram.add(0.001, n=99)
+    histogram.add(1.0)
+    assert histogram.n == 100
+    assert 0.001 <= histogram.percentile(50) < 0.002
+    assert histogram.percentile(100) >= 1.0
+    assert math.isclose(histogram.summary()["mean"], (0.099 + 1.0) / 100)
+
+
+def test_disabled_telemetry_records_nothing():
+    telemetry = Telemetry()
+    experiment = SolarExperiment(pool=DevicePool(), telemetry=telemetry)
+    experiment.scan(PORT, 0, 0.05, 2)
+    assert telemetry.summary()["setpoints"]["n"] == 0
+
+
+def test_scan_is_recorded():
+    telemetry = Telemetry(enabled=True)
+    pool = DevicePool()
+    with pool.acquire(PORT) as device:
+        device.telemetry = telemetry
+    experiment = SolarExperiment(pool=pool, telemetry=telemetry)
+    experiment.scan(PORT, 0, 0.05, 3)
+
+    summary = telemetry.summary()
+    assert summary["setpoints"]["n"] == 17
+    assert summary["samples"] == 17 * 3
+    # one query to set the output and one for the samples of every setpoint
+    assert summary["queries"]["n"] >= 2 * 17
+    assert summary["samples_per_s"] > 0
+    assert "samples/s" in telemetry.status_text()
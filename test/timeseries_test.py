@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+import pytest
+
+from solar.model import timeseries
+from solar.model.results import RESULT_DTYPE
+from solar.model.solar_experiment import SolarExperiment
+from solar.model.timeseries import TimeSeries, curve_summary, run_time_series
+
+PORT = "ASRL::SIMPV::INSTR"
+
+
+def test_quiet_curves_are_stored_as_deltas(tmp_path, monkeypatch):
+    monkeypatch.setattr(timeseries, "KEYFRAME_INTERVAL", 3)
+    series = TimeSeries(
+        tmp_path, {"n_setpoints": 200, "sample_size": 8, "first_setting": 0}
+    )
+    rng = np.random.default_rng(1)
+    curve = np.linspace(0, 1000, 400).reshape(200, 1, 2)
+    curves = []
+    for _ in range(7):
+        raw = np.clip(curve + rng.normal(0, 1, (200, 8, 2)), 0, 1023).round()
+        counts = rng.integers(1, 9, 200)
+        series.append(raw, counts, np.zeros(200, dtype=RESULT_DTYPE))
+        curves.append((raw, counts))
+
+    assert list(series.summary["keyframe"]) == [1, 0, 0, 1, 0, 0, 1]
+    assert (series.summary["size"][1:3] < series.summary["size"][0]).all()
+    # a reopened series decodes every curve exactly
+    series = TimeSeries(tmp_path)
+    for index, (raw, counts) in enumerate(curves):
+        decoded, decoded_counts = series.raw(index)
+        np.testing.assert_array_equal(decoded, raw)
+        np.testing.assert_array_equal(decoded_counts, counts)
+
+
+def test_scans_are_continued_and_summarized(tmp_path):
+    experiment = SolarExperiment(show_progress=False)
+    run_time_series(experiment, tmp_path, PORT, 0, 3.3, 5, 0, repetitions=2)
+    series = run_time_series(experiment, tmp_path, PORT, 0, 3.3, 5, 0, repetitions=1)
+    assert len(series) == 3
+    assert series.summary["size"].sum() < 3 * experiment.statistics.raw.nbytes / 2
+    # the curves of a real scan are smaller as deltas than as keyframes
+    assert list(series.summary["keyframe"]) == [1, 0, 0]
+    assert (series.summary["size"][1:] < series.summary["size"][0]).all()
+
+    raw, counts = series.raw(-1)
+    np.testing.assert_array_equal(raw, experiment.statistics.raw)
+    np.testing.assert_array_equal(
+        series.results(-1).to_array(), experiment.results.to_array()
+    )
+
+    summary = series.summary[-1]
+    assert summary["p_max"] == experiment.p_max
+    p_max, v_oc, i_sc, fill_factor = curve_summary(experiment.results.to_array())
+    assert (summary["v_oc"], summary["i_sc"]) == (v_oc, i_sc)
+    assert summary["fill_factor"] == pytest.approx(fill_factor)
+    assert 0 < fill_factor < 1
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"start": 1.0, "stop": 1.2},
+        {"sample_size": 3},
+        {"target_rel_err": 0.01},
+    ],
+)
+def test_other_settings_are_refused(tmp_path, settings):
+    experiment = SolarExperiment(show_progress=False)
+    run_time_series(experiment, tmp_path, PORT, 0, 0.2, 2, 0, repetitions=1)
+    kwargs = {"start": 0, "stop": 0.2, "sample_size": 2, **settings}
+    experiment.clear()
+    with pytest.raises(ValueError):
+        run_time_series(experiment, tmp_path, PORT, interval=0, repetitions=1, **kwargs)
+    # the scan did not run
+    assert len(experiment.results) == 0
+    assert len(TimeSeries(tmp_path)) == 1
+
+
+def test_stop_event_ends_the_wait(tmp_path):
+    stop_event = threading.Event()
+    threading.Timer(0.2, stop_event.set).start()
+    series = run_time_series(
+        SolarExperiment(show_progress=False),
+        tmp_path,
+        PORT,
+        0,
+        0.1,
+        2,
+        interval=60,
+        stop_event=stop_event,
+    )
+    assert len(series) == 1
+
+
+def test_failed_scan_is_left_out(tmp_path, monkeypatch, caplog):
+    experiment = SolarExperiment(show_progress=False)
+    scan = experiment.scan
+    calls = []
+
+    def fail_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OSError("lost connection")
+        scan(*args, **kwargs)
+
+    monkeypatch.setattr(experiment, "scan", fail_once)
+    series = run_time_series(experiment, tmp_path, PORT, 0, 0.1, 2, 0, repetitions=3)
+    assert len(calls) == 3
+    assert len(series) == 2
+    assert "lost connection" in caplog.text
+
+
+def test_path_is_refused(tmp_path):
+    with pytest.raises(TypeError):
+        run_time_series(
+            SolarExperiment(show_progress=False),
+            tmp_path,
+            PORT,
+            0,
+            0.1,
+            2,
+            0,
+            repetitions=1,
+            path=tmp_path / "scan",
+        )